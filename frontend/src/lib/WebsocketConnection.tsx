@@ -114,6 +114,16 @@ interface MessageQueue {
  *                    :
  *   <ANY_STATE> ──────────────> DISCONNECTED_FOREVER
  */
+/**
+ * What we need to resume our server-side session if our connection drops.
+ */
+interface SessionResumeInfo {
+  sessionId: string
+  resumeToken: string
+  /** The index of the session's initialize message among our messages. */
+  initializeMessageIndex: number
+}
+
 type Event =
   | "INITIALIZED"
   | "CONNECTION_CLOSED"
@@ -158,6 +168,13 @@ export class WebsocketConnection {
    */
   private messageQueue: MessageQueue = {}
 
+  /**
+   * Set once the server tells us how to resume our session. When we
+   * reconnect, we ask the server to resume it, so that it can send us just
+   * the messages we missed instead of starting over.
+   */
+  private sessionResumeInfo?: SessionResumeInfo
+
   /**
    * The current state of this object's state machine.
    */
@@ -317,11 +334,27 @@ export class WebsocketConnection {
   }
 
   private connectToWebSocket(): void {
-    const uri = buildWsUri(
+    let uri = buildWsUri(
       this.args.baseUriPartsList[this.uriIndex],
       WEBSOCKET_STREAM_PATH
     )
 
+    if (this.sessionResumeInfo != null) {
+      const {
+        sessionId,
+        resumeToken,
+        initializeMessageIndex,
+      } = this.sessionResumeInfo
+      const params = new URLSearchParams({
+        resumeSessionId: sessionId,
+        resumeToken,
+        numMessagesReceived: String(
+          this.nextMessageIndex - initializeMessageIndex
+        ),
+      })
+      uri = `${uri}?${params.toString()}`
+    }
+
     if (this.websocket != null) {
       // This should never happen. We set the websocket to null in both FSM
       // nodes that lead to this one.
@@ -465,6 +498,17 @@ export class WebsocketConnection {
 
     const resultArray = new Uint8Array(result)
     const msg = ForwardMsg.decode(resultArray)
+
+    if (msg.type === "initialize" && msg.initialize != null) {
+      const { sessionId, sessionResumeToken } = msg.initialize
+      if (sessionId && sessionResumeToken) {
+        this.sessionResumeInfo = {
+          sessionId,
+          resumeToken: sessionResumeToken,
+          initializeMessageIndex: messageIndex,
+        }
+      }
+    }
     this.messageQueue[messageIndex] = await this.cache.processMessagePayload(
       msg
     )
@@ -32,7 +32,7 @@ from streamlit.ReportThread import get_report_ctx
 from streamlit.errors import DuplicateWidgetID
 from streamlit.errors import StreamlitAPIException
 from streamlit.errors import NoSessionContext
-from streamlit.file_util import get_encoded_file_data
+from streamlit.file_util import get_encoded_uploaded_file
 from streamlit.js_number import JSNumber
 from streamlit.js_number import JSNumberBoundsException
 from streamlit.proto import Alert_pb2
@@ -2101,16 +2101,18 @@ class DeltaGenerator(object):
 
         Returns
         -------
-        BytesIO or StringIO or or list of BytesIO/StringIO or None
+        UploadedFile or StringIO or list of UploadedFile/StringIO or None
             If no file has been uploaded, returns None. Otherwise, returns
             the data for the uploaded file(s):
             - If the file is in a well-known textual format (or if the encoding
             parameter is set), the file data is a StringIO.
-            - Otherwise the file data is BytesIO.
+            - Otherwise the file data is an UploadedFile: a read-only binary
+            file object that also supports BytesIO's getvalue() and
+            getbuffer(). Large files are read lazily from disk.
             - If multiple_files is True, a list of file data will be returned.
 
-            Note that BytesIO/StringIO are "file-like", which means you can
-            pass them anywhere where a file is expected!
+            Note that UploadedFile/StringIO are "file-like", which means you
+            can pass them anywhere where a file is expected!
 
         Examples
         --------
@@ -2145,7 +2147,7 @@ class DeltaGenerator(object):
         if files is None:
             return NoValue
 
-        file_datas = [get_encoded_file_data(file.data, encoding) for file in files]
+        file_datas = [get_encoded_uploaded_file(file, encoding) for file in files]
         return file_datas if accept_multiple_files else file_datas[0]
 
     @_with_element
@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gzip
 import hashlib
-from typing import MutableMapping, TYPE_CHECKING
+from collections import OrderedDict
+from typing import Any, Dict, List, MutableMapping, Optional, Set, Tuple, Union
+from typing import TYPE_CHECKING
 from weakref import WeakKeyDictionary
 
 from streamlit import config
@@ -33,7 +36,7 @@ def populate_hash_if_needed(msg):
 
     Parameters
     ----------
-    msg : ForwardMsg
+    msg : ForwardMsg | ForwardMsgEnvelope
 
     Returns
     -------
@@ -43,21 +46,158 @@ def populate_hash_if_needed(msg):
         to do this.)
 
     """
-    if msg.hash == "":
-        # Move the message's metadata aside. It's not part of the
-        # hash calculation.
-        metadata = msg.metadata
-        msg.ClearField("metadata")
+    return ForwardMsgEnvelope.wrap(msg).hash
+
+
+class ForwardMsgEnvelope(object):
+    """A ForwardMsg, along with its serialized body and content hash.
+
+    The body and hash are computed at most once, and then reused for size
+    checks, hashing, caching, and sending, so that a message is encoded only
+    one time no matter how many of these steps it goes through.
+
+    The body is the serialized message *without* its metadata and hash
+    fields. Since protobuf messages can be concatenated on the wire, the
+    full message is serialized as the body followed by a small "trailer"
+    message holding just the hash and metadata. This means the metadata can
+    still change (e.g. `metadata.cacheable` is set by the server) after the
+    body has been computed. The rest of the message must not.
+
+    """
 
-        # MD5 is good enough for what we need, which is uniqueness.
-        hasher = hashlib.md5()
-        hasher.update(msg.SerializeToString())
-        msg.hash = hasher.hexdigest()
+    def __init__(self, msg):
+        """Constructor.
+
+        Parameters
+        ----------
+        msg : ForwardMsg
+
+        """
+        self.msg = msg
+        self._body = None  # type: Optional[Union[bytes, memoryview]]
+        self._is_detached = False
 
-        # Restore metadata.
-        msg.metadata.CopyFrom(metadata)
+        # The last (trailer, full message) that serialize() returned, so
+        # that serializing again with the same metadata doesn't copy the
+        # body again.
+        self._serialized = None  # type: Optional[Tuple[bytes, bytes]]
+
+    @staticmethod
+    def wrap(msg):
+        """Return the given ForwardMsg in an envelope. If it's already an
+        envelope, it's returned as-is.
+
+        Parameters
+        ----------
+        msg : ForwardMsg | ForwardMsgEnvelope
+
+        Returns
+        -------
+        ForwardMsgEnvelope
+
+        """
+        if isinstance(msg, ForwardMsgEnvelope):
+            return msg
+        return ForwardMsgEnvelope(msg)
+
+    @property
+    def body(self):
+        # type: () -> Union[bytes, memoryview]
+        """The serialized message, minus its metadata and hash."""
+        if self._body is None:
+            msg = self.msg
+            metadata = msg.metadata
+            msg_hash = msg.hash
+            msg.ClearField("metadata")
+            msg.ClearField("hash")
+
+            self._body = msg.SerializeToString()
+
+            msg.hash = msg_hash
+            msg.metadata.CopyFrom(metadata)
+
+        return self._body
+
+    @property
+    def body_size(self):
+        # type: () -> int
+        """The size of the serialized body, in bytes."""
+        return len(self.body)
+
+    @property
+    def hash(self):
+        # type: () -> str
+        """The message's hash. It will be computed and assigned to the
+        message if it doesn't have one yet."""
+        if self.msg.hash == "":
+            # MD5 is good enough for what we need, which is uniqueness.
+            self.msg.hash = hashlib.md5(self.body).hexdigest()
+        msg_hash = self.msg.hash  # type: str
+        return msg_hash
+
+    def serialize(self):
+        # type: () -> bytes
+        """Return the full serialized message.
+
+        Joining the body and trailer copies the body, so the result is kept
+        and returned again as long as the metadata doesn't change. (Cached
+        envelopes are detached, so their metadata never does.)
+        """
+        trailer = ForwardMsg()
+        trailer.hash = self.hash
+        trailer.metadata.CopyFrom(self.msg.metadata)
+        trailer_str = trailer.SerializeToString()
+
+        serialized = self._serialized
+        if serialized is None or serialized[0] != trailer_str:
+            serialized = (trailer_str, b"".join((self.body, trailer_str)))
+            self._serialized = serialized
+        return serialized[1]
+
+    def detach(self):
+        # type: () -> ForwardMsgEnvelope
+        """Return an envelope that shares this one's serialized body, but
+        doesn't hold on to the original ForwardMsg object.
+
+        The detached envelope's `msg` only contains the hash and metadata.
+        Use `decode()` to get the full message back.
+
+        Since its metadata can't change, the detached envelope keeps just
+        the full serialized message, and its body is a view into it. This
+        envelope reuses the same bytes, if it's serialized with the same
+        metadata.
+        """
+        shell = ForwardMsg()
+        shell.hash = self.hash
+        shell.metadata.CopyFrom(self.msg.metadata)
+
+        body_size = self.body_size
+        msg_str = self.serialize()
+
+        detached = ForwardMsgEnvelope(shell)
+        detached._serialized = self._serialized
+        detached._body = memoryview(msg_str)[:body_size]
+        detached._is_detached = True
+        return detached
+
+    def share_body(self, other):
+        # type: (ForwardMsgEnvelope) -> None
+        """Replace this envelope's body with the identical body of another
+        envelope, so that only one copy of the bytes is kept around.
+        """
+        assert self.hash == other.hash, "Can only share identical bodies"
+        self._body = other.body
+        self._serialized = None
 
-    return msg.hash
+    def decode(self):
+        # type: () -> ForwardMsg
+        """Return the full ForwardMsg held by this envelope."""
+        if not self._is_detached:
+            return self.msg
+
+        msg = ForwardMsg()
+        msg.ParseFromString(self.serialize())
+        return msg
 
 
 def create_reference_msg(msg):
@@ -92,6 +232,19 @@ class ForwardMsgCache(object):
     rather than the message itself, to a client. Clients can then
     request messages from this cache via another endpoint.
 
+    The total size of the cached messages is bounded by
+    `global.maxMessageCacheSize`. When the cache grows past that budget, the
+    least-recently-used entries are evicted, regardless of which sessions
+    reference them. This is safe with respect to the client-side reference
+    protocol: once an entry is evicted, `has_message_reference` returns False
+    for every session, so the server falls back to sending the full message
+    instead of a reference.
+
+    Entries are process-wide and content-addressed: a message's payload is
+    stored once, in serialized form, no matter how many sessions send it.
+    Entries don't hold on to the ForwardMsg objects they were created from,
+    and sessions that send an identical payload reuse the stored bytes.
+
     This cache is *not* thread safe. It's intended to only be accessed by
     the server thread.
 
@@ -105,13 +258,19 @@ class ForwardMsgCache(object):
 
         """
 
-        def __init__(self, msg):
-            self.msg = msg
+        def __init__(self, envelope):
+            self.envelope = envelope.detach()
+            self.size = envelope.body_size
+
+            # The gzipped serialized message, once a client fetched it
+            # compressed. It counts toward the entry's size.
+            self.gzipped = None  # type: Optional[bytes]
             self._session_report_run_counts = (
                 WeakKeyDictionary()
             )  # type: MutableMapping[ReportSession, int]
 
         def add_session_ref(self, session, report_run_count):
+            # type: (ReportSession, int) -> int
             """Adds a reference to a ReportSession that has referenced
             this Entry's message.
 
@@ -121,6 +280,12 @@ class ForwardMsgCache(object):
             report_run_count : int
                 The session's run count at the time of the call
 
+            Returns
+            -------
+            int
+                The run count that the reference was recorded with. It's
+                never lower than the one the session referenced it at before.
+
             """
             prev_run_count = self._session_report_run_counts.get(session, 0)
             if report_run_count < prev_run_count:
@@ -130,10 +295,27 @@ class ForwardMsgCache(object):
                 )
                 report_run_count = prev_run_count
             self._session_report_run_counts[session] = report_run_count
+            return report_run_count
 
         def has_session_ref(self, session):
             return session in self._session_report_run_counts
 
+        def get_session_ref_run_count(self, session):
+            # type: (ReportSession) -> Optional[int]
+            """The session's run count when it last referenced this Entry,
+            or None if it has no reference to it.
+
+            """
+            return self._session_report_run_counts.get(session, None)
+
+        def get_session_refs(self):
+            # type: () -> List[Tuple[ReportSession, int]]
+            """A list of (session, report_run_count) for every ReportSession
+            that references this Entry.
+
+            """
+            return list(self._session_report_run_counts.items())
+
         def get_session_ref_age(self, session, report_run_count):
             """The age of the given session's reference to the Entry,
             given a new report_run_count.
@@ -152,7 +334,25 @@ class ForwardMsgCache(object):
             return len(self._session_report_run_counts) > 0
 
     def __init__(self):
-        self._entries = {}  # Map: hash -> Entry
+        # Map: hash -> Entry, ordered from least- to most-recently used.
+        self._entries = OrderedDict()  # type: OrderedDict[str, ForwardMsgCache.Entry]
+        self._total_size = 0
+
+        # Reverse index of each session's references, bucketed by the run
+        # count at which the session last referenced each message. This lets
+        # us expire a session's references without scanning every entry.
+        # Map: session -> report_run_count -> set of hashes
+        self._session_refs = (
+            WeakKeyDictionary()
+        )  # type: MutableMapping[ReportSession, Dict[int, Set[str]]]
+
+        # Stats
+        self._ref_hits = 0
+        self._ref_misses = 0
+        self._fetch_hits = 0
+        self._fetch_misses = 0
+        self._evictions = 0
+        self._shared_payloads = 0
 
     def add_message(self, msg, session, report_run_count):
         """Add a ForwardMsg to the cache.
@@ -163,18 +363,67 @@ class ForwardMsgCache(object):
 
         Parameters
         ----------
-        msg : ForwardMsg
+        msg : ForwardMsg | ForwardMsgEnvelope
         session : ReportSession
         report_run_count : int
             The number of times the session's report has run
 
         """
-        populate_hash_if_needed(msg)
-        entry = self._entries.get(msg.hash, None)
+        envelope = ForwardMsgEnvelope.wrap(msg)
+        msg_hash = envelope.hash
+        entry = self._entries.get(msg_hash, None)
         if entry is None:
-            entry = ForwardMsgCache.Entry(msg)
-            self._entries[msg.hash] = entry
-        entry.add_session_ref(session, report_run_count)
+            entry = ForwardMsgCache.Entry(envelope)
+
+            max_size = _get_max_cache_size()
+            if max_size > 0 and entry.size > max_size:
+                # The message would evict everything else from the cache,
+                # and then itself. Don't cache it; the server will always send
+                # it in full.
+                LOGGER.debug(
+                    "Not caching oversized message [hash=%s, size=%s]",
+                    msg_hash,
+                    entry.size,
+                )
+                return
+
+            self._entries[msg_hash] = entry
+            self._total_size += entry.size
+            self._evict_if_needed()
+        else:
+            # Another message with this payload has been cached already,
+            # possibly by another session. Keep only one copy of its bytes.
+            if envelope.body is not entry.envelope.body:
+                envelope.share_body(entry.envelope)
+                self._shared_payloads += 1
+            self._entries.move_to_end(msg_hash)
+
+        prev_run_count = entry.get_session_ref_run_count(session)
+        new_run_count = entry.add_session_ref(session, report_run_count)
+
+        if prev_run_count != new_run_count:
+            if prev_run_count is not None:
+                self._discard_session_ref(session, prev_run_count, msg_hash)
+            session_refs = self._session_refs.setdefault(session, {})
+            session_refs.setdefault(new_run_count, set()).add(msg_hash)
+
+    def has_message(self, hash):
+        """True if the message with the given ID is in the cache.
+
+        Unlike get_message(), this doesn't count as a fetch, or make the
+        message more recently used.
+
+        Parameters
+        ----------
+        hash : string
+            The id of the message to look for.
+
+        Returns
+        -------
+        bool
+
+        """
+        return hash in self._entries
 
     def get_message(self, hash):
         """Return the message with the given ID if it exists in the cache.
@@ -188,16 +437,73 @@ class ForwardMsgCache(object):
         -------
         ForwardMsg | None
 
+        """
+        envelope = self.get_envelope(hash)
+        return envelope.decode() if envelope else None
+
+    def get_envelope(self, hash):
+        """Return the serialized message with the given ID, if it exists in
+        the cache.
+
+        Parameters
+        ----------
+        hash : string
+            The id of the message to retrieve.
+
+        Returns
+        -------
+        ForwardMsgEnvelope | None
+
         """
         entry = self._entries.get(hash, None)
-        return entry.msg if entry else None
+        if entry is None:
+            self._fetch_misses += 1
+            return None
+
+        self._fetch_hits += 1
+        self._entries.move_to_end(hash)
+        return entry.envelope
+
+    def get_gzipped_message(self, hash, msg_str, compresslevel):
+        # type: (str, bytes, int) -> bytes
+        """Return the given serialized message, gzipped.
+
+        The compressed bytes are kept with the message's cache entry, so
+        that a message that's fetched again isn't compressed again. They
+        count toward the cache's size.
+
+        Parameters
+        ----------
+        hash : string
+            The id of the message.
+        msg_str : bytes
+            The serialized message, as returned by serialize_forward_msg().
+        compresslevel : int
+            The gzip compression level.
+
+        Returns
+        -------
+        bytes
+
+        """
+        entry = self._entries.get(hash, None)
+        if entry is not None and entry.gzipped is not None:
+            return entry.gzipped
+
+        gzipped = gzip.compress(msg_str, compresslevel=compresslevel)
+        if entry is not None:
+            entry.gzipped = gzipped
+            entry.size += len(gzipped)
+            self._total_size += len(gzipped)
+            self._evict_if_needed()
+        return gzipped
 
     def has_message_reference(self, msg, session, report_run_count):
         """Return True if a session has a reference to a message.
 
         Parameters
         ----------
-        msg : ForwardMsg
+        msg : ForwardMsg | ForwardMsgEnvelope
         session : ReportSession
         report_run_count : int
             The number of times the session's report has run
@@ -207,20 +513,32 @@ class ForwardMsgCache(object):
         bool
 
         """
-        populate_hash_if_needed(msg)
+        msg_hash = populate_hash_if_needed(msg)
 
-        entry = self._entries.get(msg.hash, None)
+        entry = self._entries.get(msg_hash, None)
         if entry is None or not entry.has_session_ref(session):
+            self._ref_misses += 1
             return False
 
         # Ensure we're not expired
         age = entry.get_session_ref_age(session, report_run_count)
-        return age <= config.get_option("global.maxCachedMessageAge")
+        if age > config.get_option("global.maxCachedMessageAge"):
+            self._ref_misses += 1
+            return False
+
+        # The client is about to be sent a reference to this entry, and may
+        # fetch it from us. Mark it as recently used so it's not evicted
+        # from under the client.
+        self._ref_hits += 1
+        self._entries.move_to_end(msg_hash)
+        return True
 
     def remove_expired_session_entries(self, session, report_run_count):
         """Remove any cached messages that have expired from the given session.
 
         This should be called each time a ReportSession finishes executing.
+        Its cost is proportional to the number of the session's expired
+        references, not to the size of the cache.
 
         Parameters
         ----------
@@ -229,28 +547,119 @@ class ForwardMsgCache(object):
             The number of times the session's report has run
 
         """
+        session_refs = self._session_refs.get(session, None)
+        if session_refs is None:
+            return
+
         max_age = config.get_option("global.maxCachedMessageAge")
+        expired_run_counts = [
+            run_count
+            for run_count in session_refs
+            if report_run_count - run_count > max_age
+        ]
+
+        for run_count in expired_run_counts:
+            self._remove_session_refs(session, session_refs.pop(run_count))
+
+    def remove_session_entries(self, session):
+        """Remove all of the given session's references to cached messages.
+
+        Entries that are no longer referenced by any session are removed.
+        The session will be sent any of these messages in full again.
+
+        Parameters
+        ----------
+        session : ReportSession
+
+        """
+        session_refs = self._session_refs.pop(session, None)
+        if session_refs is None:
+            return
+
+        for msg_hashes in session_refs.values():
+            self._remove_session_refs(session, msg_hashes)
 
-        # Operate on a copy of our entries dict.
-        # We may be deleting from it.
-        for msg_hash, entry in self._entries.copy().items():
-            if not entry.has_session_ref(session):
+    def _remove_session_refs(self, session, msg_hashes):
+        for msg_hash in msg_hashes:
+            entry = self._entries.get(msg_hash, None)
+            if entry is None or not entry.has_session_ref(session):
                 continue
 
-            age = entry.get_session_ref_age(session, report_run_count)
-            if age > max_age:
-                LOGGER.debug(
-                    "Removing expired entry [session=%s, hash=%s, age=%s]",
-                    id(session),
-                    msg_hash,
-                    age,
-                )
-                entry.remove_session_ref(session)
-                if not entry.has_refs():
-                    # The entry has no more references. Remove it from
-                    # the cache completely.
-                    del self._entries[msg_hash]
+            LOGGER.debug(
+                "Removing session ref [session=%s, hash=%s]", id(session), msg_hash,
+            )
+            entry.remove_session_ref(session)
+            if not entry.has_refs():
+                # The entry has no more references. Remove it from
+                # the cache completely.
+                self._remove_entry(msg_hash)
+
+    def _remove_entry(self, msg_hash):
+        entry = self._entries.pop(msg_hash)
+        self._total_size -= entry.size
+
+        # Drop the entry from the reverse index of any sessions that still
+        # reference it (which is only the case if it's being evicted).
+        for session, run_count in entry.get_session_refs():
+            self._discard_session_ref(session, run_count, msg_hash)
+
+    def _discard_session_ref(self, session, report_run_count, msg_hash):
+        session_refs = self._session_refs.get(session, None)
+        if session_refs is None:
+            return
+
+        msg_hashes = session_refs.get(report_run_count, None)
+        if msg_hashes is None:
+            return
+
+        msg_hashes.discard(msg_hash)
+        if len(msg_hashes) == 0:
+            del session_refs[report_run_count]
+
+    def _evict_if_needed(self):
+        """Evict least-recently-used entries until the cache fits within
+        its size budget.
+
+        The most-recently-used entry is never evicted here.
+        """
+        max_size = _get_max_cache_size()
+        if max_size <= 0:
+            return
+
+        while self._total_size > max_size and len(self._entries) > 1:
+            msg_hash = next(iter(self._entries))
+            LOGGER.debug("Evicting cached message [hash=%s]", msg_hash)
+            self._remove_entry(msg_hash)
+            self._evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return a dict of the cache's size and hit statistics.
+
+        "ref_hit_ratio" is the fraction of cacheable messages that were sent
+        to a client as a reference rather than in full. "shared_payloads" is
+        the number of cached messages whose payload was already stored.
+        """
+        num_refs = self._ref_hits + self._ref_misses
+        return {
+            "num_entries": len(self._entries),
+            "total_size": self._total_size,
+            "max_size": _get_max_cache_size(),
+            "evictions": self._evictions,
+            "shared_payloads": self._shared_payloads,
+            "ref_hits": self._ref_hits,
+            "ref_misses": self._ref_misses,
+            "ref_hit_ratio": self._ref_hits / num_refs if num_refs > 0 else 0.0,
+            "fetch_hits": self._fetch_hits,
+            "fetch_misses": self._fetch_misses,
+        }
 
     def clear(self):
         """Remove all entries from the cache"""
         self._entries.clear()
+        self._session_refs.clear()
+        self._total_size = 0
+
+
+def _get_max_cache_size():
+    """The cache's size budget, in bytes. 0 means unbounded."""
+    return config.get_option("global.maxMessageCacheSize")
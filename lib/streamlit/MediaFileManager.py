@@ -14,13 +14,21 @@
 
 """Provides global MediaFileManager object as `media_file_manager`."""
 
-from typing import Dict, DefaultDict
+from typing import Any, Dict, DefaultDict, Iterator, Optional, Tuple
 from weakref import WeakValueDictionary
+import atexit
 import collections
 import datetime as dt
 import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import threading
 import time
+import weakref
 
+from streamlit import config
 from streamlit.ReportThread import get_report_ctx
 from streamlit.logger import get_logger
 
@@ -28,6 +36,13 @@ LOGGER = get_logger(__name__)
 
 STATIC_MEDIA_ENDPOINT = "/media"
 
+# Size of the chunks in which we read files from disk to hash them.
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Number of files added from paths that are kept alive after no session uses
+# them anymore, so a rerun that shows the same file again doesn't copy it.
+_MAX_RECENT_PATH_FILES = 16
+
 
 def _get_session_id():
     """Semantic wrapper to retrieve current ReportSession ID."""
@@ -60,13 +75,61 @@ def _calculate_file_id(data, mimetype):
     return filehash.hexdigest()
 
 
+def _copy_file_and_calculate_id(path, mimetype, directory):
+    """Copy the file at the given path into the given directory, without
+    reading the whole file into memory.
+
+    Returns
+    -------
+    (str, str)
+        The path of the copy, and the same ID as _calculate_file_id for its
+        contents. The ID is computed from the bytes that were copied, so the
+        two always match, even if the original changes while it's copied.
+
+    """
+    filehash = hashlib.new("sha224")
+    fd, copy_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as dst, open(path, "rb") as src:
+            for chunk in iter(lambda: src.read(_HASH_CHUNK_SIZE), b""):
+                filehash.update(chunk)
+                dst.write(chunk)
+    except BaseException:
+        _remove_file_quietly(copy_path)
+        raise
+    filehash.update(bytes(mimetype.encode()))
+
+    return copy_path, filehash.hexdigest()
+
+
+def _remove_file_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
 class MediaFile(object):
-    """Abstraction for audiovisual/image file objects."""
+    """Abstraction for audiovisual/image file objects.
+
+    A MediaFile's content is either held in memory, or lives in a file on
+    disk that the MediaFileManager owns: either one it "spilled" the content
+    to, or a copy of a file the user pointed us to. Either way, the file
+    never changes, and is deleted when the MediaFile is garbage-collected.
+    """
 
-    def __init__(self, file_id=None, content=None, mimetype=None):
+    def __init__(self, file_id=None, content=None, mimetype=None, path=None):
         self._file_id = file_id
-        self._content = content
+        self._content = content  # type: Optional[bytes]
         self._mimetype = mimetype
+        self._path = path  # type: Optional[str]
+
+        if content is not None:
+            self._size = len(content)
+        elif path is not None:
+            self._size = os.path.getsize(path)
+        else:
+            self._size = 0
 
     @property
     def url(self):
@@ -80,12 +143,69 @@ class MediaFile(object):
 
     @property
     def content(self):
-        return self._content
+        """The file's full content, read from disk if it has been spilled."""
+        content = self._content
+        if content is not None:
+            return content
+
+        assert self._path is not None
+        with open(self._path, "rb") as f:
+            return f.read()
 
     @property
     def mimetype(self):
         return self._mimetype
 
+    @property
+    def size(self):
+        """The size of the file's content, in bytes."""
+        return self._size
+
+    @property
+    def is_spilled(self):
+        """True if the file's content lives on disk rather than in memory."""
+        return self._content is None
+
+    def read_chunks(self, start, end, chunk_size):
+        # type: (int, int, int) -> Iterator[bytes]
+        """Yield the file's content from start to end, in chunks.
+
+        Spilled files are memory-mapped, so only the requested range is
+        paged in.
+        """
+        content = self._content
+        if content is not None:
+            for chunk_start in range(start, end, chunk_size):
+                yield content[chunk_start : min(chunk_start + chunk_size, end)]
+            return
+
+        if start >= end:
+            return
+
+        assert self._path is not None
+        with open(self._path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for chunk_start in range(start, end, chunk_size):
+                    yield mapped[chunk_start : min(chunk_start + chunk_size, end)]
+
+    def spill(self, directory):
+        """Move the file's content from memory to a file in the given
+        directory.
+        """
+        content = self._content
+        if content is None:
+            return
+
+        fd, path = tempfile.mkstemp(dir=directory, prefix=self._file_id)
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+
+        # Readers may be running on other threads. Set the path before
+        # dropping the content, so one of the two is always available.
+        self._path = path
+        self._content = None
+        weakref.finalize(self, _remove_file_quietly, path)
+
 
 class MediaFileManager(object):
     """In-memory file manager for MediaFile objects.
@@ -104,6 +224,12 @@ class MediaFileManager(object):
       where the file's coordinates keep changing for some reason, though! e.g.
       if new elements keep being prepended to the app. Unlikely to happen, but
       we should address it at some point.)
+
+    To bound the server's memory, files larger than
+    `global.mediaFileSpillSize` are written to a temporary directory right
+    away, and when the in-memory files add up to more than
+    `global.maxMediaFileMemorySize`, the least-recently-used ones are spilled
+    to disk too. Spilled files are served straight from disk.
     """
 
     def __init__(self):
@@ -121,6 +247,31 @@ class MediaFileManager(object):
         # _files_by_session_and_coord it automatically gets removed from
         # _files_by_id.
 
+        # IDs and sizes of the files whose content is held in memory, from
+        # least- to most-recently used. This must not hold references to the
+        # MediaFiles themselves, or they'd never be garbage-collected.
+        self._in_memory_sizes = (
+            collections.OrderedDict()
+        )  # type: collections.OrderedDict[str, int]
+        self._memory_size = 0
+        self._num_spills = 0
+
+        # Protects the above. Reentrant because a MediaFile's finalizer may
+        # run (on garbage collection) while the lock is held.
+        self._lock = threading.RLock()
+
+        # Created on first use.
+        self._spill_dir = None  # type: Optional[str]
+
+        # Dict[(path, mimetype)] -> (size, mtime, MediaFile) for the files
+        # most recently added from paths, from least- to most-recently used,
+        # so we only copy and hash a file again if it has changed on disk.
+        # These are strong references: each script run clears its session's
+        # files before adding them again, which would otherwise release them.
+        self._recent_path_files = (
+            collections.OrderedDict()
+        )  # type: collections.OrderedDict[Tuple[str, str], Tuple[int, int, MediaFile]]
+
     def clear_session_files(self, session_id=None):
         """Clears all stored files for a given ReportSession id.
 
@@ -174,9 +325,87 @@ class MediaFileManager(object):
         if mf is None:
             LOGGER.debug("Adding media file %s", file_id)
             mf = MediaFile(file_id=file_id, content=content, mimetype=mimetype)
+            self._store(mf)
         else:
             LOGGER.debug("Overwriting media file %s", file_id)
+            self._touch(mf)
+
+        return self._register(mf, coordinates)
+
+    def add_file(self, path, mimetype, coordinates):
+        """Adds a new MediaFile backed by the file at the given path; returns
+        the object.
+
+        Unlike add(), this doesn't read the file into memory. Instead, it's
+        copied to our spill directory and served from there, since file IDs
+        are immutable and the script may later rewrite or delete the
+        original. The file is only copied and hashed when it's first added or
+        has changed (by size or mtime) since, so adding the same unchanged
+        file again only costs a stat.
+
+        Parameters
+        ----------
+        path : str
+            Path to the file. OS errors (e.g. a missing file) are raised.
+        mimetype : str
+            The mime type for the media file. E.g. "video/mp4"
+        coordinates : str
+            Unique string identifying an element's location.
+
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, mimetype)
+
+        with self._lock:
+            cached = self._recent_path_files.get(key, None)
+            if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                self._recent_path_files.move_to_end(key)
+                mf = cached[2]
+            else:
+                mf = None
+
+        if mf is not None:
+            LOGGER.debug("Overwriting media file %s", mf.id)
+            self._touch(mf)
+            return self._register(mf, coordinates)
+
+        copy_path, file_id = _copy_file_and_calculate_id(
+            path, mimetype, self._get_spill_dir()
+        )
 
+        mf = self._files_by_id.get(file_id, None)
+        if mf is None:
+            LOGGER.debug("Adding media file %s from %s", file_id, path)
+            mf = MediaFile(file_id=file_id, mimetype=mimetype, path=copy_path)
+            weakref.finalize(mf, _remove_file_quietly, copy_path)
+        else:
+            LOGGER.debug("Overwriting media file %s", file_id)
+            _remove_file_quietly(copy_path)
+            self._touch(mf)
+
+        # Only remember the file if it didn't change while we copied it. This
+        # replaces the copy of an older version of the file, if any.
+        new_stat = os.stat(path)
+        if (new_stat.st_size, new_stat.st_mtime_ns) == (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            self._remember_path_file(key, stat, mf)
+
+        return self._register(mf, coordinates)
+
+    def _remember_path_file(self, key, stat, mf):
+        """Keep a MediaFile that was added from a path alive, evicting the
+        least-recently-used ones past _MAX_RECENT_PATH_FILES."""
+        with self._lock:
+            self._recent_path_files.pop(key, None)
+            self._recent_path_files[key] = (stat.st_size, stat.st_mtime_ns, mf)
+            while len(self._recent_path_files) > _MAX_RECENT_PATH_FILES:
+                self._recent_path_files.popitem(last=False)
+
+    def _register(self, mf, coordinates):
+        """Register the current session as a user of the given MediaFile."""
         session_id = _get_session_id()
         self._files_by_id[mf.id] = mf
         self._files_by_session_and_coord[session_id][coordinates] = mf
@@ -194,7 +423,122 @@ class MediaFileManager(object):
 
         Raises KeyError if not found.
         """
-        return self._files_by_id[mediafile_or_id]
+        mf = self._files_by_id[mediafile_or_id]
+        self._touch(mf)
+        return mf
+
+    def _store(self, mf):
+        """Start tracking a new MediaFile's memory, spilling it to disk if
+        it's too large or we're over our memory budget."""
+        if mf.size >= config.get_option("global.mediaFileSpillSize"):
+            self._spill(mf)
+            return
+
+        with self._lock:
+            self._in_memory_sizes[mf.id] = mf.size
+            self._memory_size += mf.size
+        weakref.finalize(mf, self._on_file_released, mf.id)
+
+        self._spill_if_needed()
+
+    def _touch(self, mf):
+        """Mark an in-memory MediaFile as recently used."""
+        with self._lock:
+            if mf.id in self._in_memory_sizes:
+                self._in_memory_sizes.move_to_end(mf.id)
+
+    def _on_file_released(self, file_id):
+        """Called when an in-memory MediaFile is garbage-collected."""
+        with self._lock:
+            size = self._in_memory_sizes.pop(file_id, None)
+            if size is not None:
+                self._memory_size -= size
+
+    def _spill_if_needed(self):
+        """Spill least-recently-used files to disk until the in-memory files
+        fit within our memory budget."""
+        max_memory_size = config.get_option("global.maxMediaFileMemorySize")
+        if max_memory_size <= 0:
+            return
+
+        while True:
+            with self._lock:
+                if self._memory_size <= max_memory_size:
+                    return
+                file_id, size = self._in_memory_sizes.popitem(last=False)
+                self._memory_size -= size
+                mf = self._files_by_id.get(file_id, None)
+
+            if mf is not None:
+                self._spill(mf)
+
+    def _get_spill_dir(self):
+        with self._lock:
+            if self._spill_dir is None:
+                self._spill_dir = tempfile.mkdtemp(prefix="streamlit-media-")
+                atexit.register(shutil.rmtree, self._spill_dir, ignore_errors=True)
+            return self._spill_dir
+
+    def _spill(self, mf):
+        spill_dir = self._get_spill_dir()
+        with self._lock:
+            self._num_spills += 1
+
+        LOGGER.debug("Spilling media file %s to disk (%s bytes)", mf.id, mf.size)
+        mf.spill(spill_dir)
+
+    def spill_session_files(self, session_id):
+        # type: (str) -> None
+        """Spill all of the in-memory files used by the given session to
+        disk. The files keep being served, so a browser that is still
+        showing them isn't affected."""
+        files = {
+            mf.id: mf
+            for mf in list(
+                self._files_by_session_and_coord.get(session_id, {}).values()
+            )
+        }
+        for mf in files.values():
+            with self._lock:
+                size = self._in_memory_sizes.pop(mf.id, None)
+                if size is None:
+                    continue
+                self._memory_size -= size
+            self._spill(mf)
+
+    def get_session_memory_size(self, session_id):
+        # type: (str) -> int
+        """Return the total size of the in-memory files used by the given
+        session, in bytes. (Files that are spilled to disk, or were added from
+        a path, aren't counted.)"""
+        files = {
+            mf.id: mf
+            for mf in list(
+                self._files_by_session_and_coord.get(session_id, {}).values()
+            )
+        }
+        with self._lock:
+            return sum(
+                mf.size for mf in files.values() if mf.id in self._in_memory_sizes
+            )
+
+    def get_stats(self):
+        # type: () -> Dict[str, Any]
+        """Return a dict of statistics about the files in the manager."""
+        files = list(self._files_by_id.values())
+        spilled_files = [mf for mf in files if mf.is_spilled]
+
+        with self._lock:
+            return {
+                "num_files": len(files),
+                "num_sessions": len(self._files_by_session_and_coord),
+                "num_in_memory": len(self._in_memory_sizes),
+                "memory_size": self._memory_size,
+                "max_memory_size": config.get_option("global.maxMediaFileMemorySize"),
+                "num_on_disk": len(spilled_files),
+                "disk_size": sum(mf.size for mf in spilled_files),
+                "num_spills": self._num_spills,
+            }
 
     def __contains__(self, mediafile_or_id):
         return mediafile_or_id in self._files_by_id
@@ -204,3 +548,17 @@ class MediaFileManager(object):
 
 
 media_file_manager = MediaFileManager()
+
+
+def get_media_file_manager():
+    """Return the MediaFileManager that the current script run adds its
+    media files to.
+
+    This is the ReportContext's media_file_mgr, if it has one (e.g. in a
+    script worker process, where media files are sent to the server
+    process), or else the global media_file_manager.
+    """
+    ctx = get_report_ctx()
+    if ctx is not None and ctx.media_file_mgr is not None:
+        return ctx.media_file_mgr
+    return media_file_manager
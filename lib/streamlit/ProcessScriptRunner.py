@@ -0,0 +1,736 @@
+# Copyright 2018-2020 Streamlit Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs scripts in worker processes, so that scripts from different sessions
+can use more than one core.
+
+The ScriptRunner in the server process (a ProcessScriptRunner) still
+processes its session's ScriptRequestQueue and waits for the
+ScriptRunScheduler, but hands each run to a worker process from the
+ScriptProcessPool. Over a pipe, it sends the worker the script path, the
+widget states, the session's uploaded files and any STOP requests, and the
+worker sends back the run's ForwardMsgs, media files and ScriptRunnerEvents,
+and finally the new widget states.
+
+Uploaded files that were spooled to disk are sent as paths, which the worker
+opens, rather than as data. Media files are stored and served by the server
+process only: the worker's script adds them to a _MediaFileSink, which sends
+them on.
+
+The script's modules are loaded in the worker, so the worker reports them to
+the server's source_watch_registry, which watches their files. When one
+changes, the registry records the modules that the change made stale, and
+each worker unloads them before its next run.
+
+In the worker, the script is run by a regular ScriptRunner.
+"""
+
+import collections
+import multiprocessing
+import multiprocessing.connection
+import pickle
+import queue
+import signal
+import sys
+import threading
+from contextlib import contextmanager
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional, Set
+
+from streamlit import config
+from streamlit.ConfigOption import ConfigOption
+from streamlit.MediaFileManager import MediaFile
+from streamlit.MediaFileManager import _calculate_file_id
+from streamlit.MediaFileManager import media_file_manager
+from streamlit.ReportThread import get_report_ctx
+from streamlit.ScriptRequestQueue import RerunData
+from streamlit.ScriptRequestQueue import ScriptRequest
+from streamlit.ScriptRequestQueue import ScriptRequestQueue
+from streamlit.ScriptRunner import ScriptRunner
+from streamlit.ScriptRunner import ScriptRunnerEvent
+from streamlit.UploadedFileManager import UploadedFile
+from streamlit.UploadedFileManager import UploadedFileManager
+from streamlit.logger import get_logger
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.Widget_pb2 import WidgetStates
+from streamlit.watcher.LocalSourcesWatcher import _get_module_file
+from streamlit.watcher.LocalSourcesWatcher import _unload_module
+from streamlit.watcher.LocalSourcesWatcher import source_watch_registry
+
+LOGGER = get_logger(__name__)
+
+# How long to wait for a worker process to exit when it's shut down.
+WORKER_SHUTDOWN_TIMEOUT = 5
+
+# The server's __main__ module. ScriptRunners replace it with the script's
+# module while they run. See _original_main_module().
+_server_main_module = sys.modules.get("__main__")
+
+# Stand-in for the Report that the worker's ScriptRunner needs.
+_WorkerReport = collections.namedtuple("_WorkerReport", ["script_path"])
+
+
+class ProcessScriptRunner(ScriptRunner):
+    """A ScriptRunner that runs its script in a worker process.
+
+    It's created in place of a ScriptRunner when `global.numScriptProcesses`
+    is set, and behaves the same from the ReportSession's point of view.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ProcessScriptRunner, self).__init__(*args, **kwargs)
+
+        # While the script runs on a worker, the write end of a pipe that
+        # wakes up the relay loop when a request is enqueued.
+        self._wakeup_conn = None  # type: Optional[Connection]
+        self._wakeup_lock = threading.Lock()
+
+    def on_request_enqueued(self):
+        super(ProcessScriptRunner, self).on_request_enqueued()
+
+        with self._wakeup_lock:
+            if self._wakeup_conn is not None:
+                self._wakeup_conn.send_bytes(b"")
+
+    def _run_script(self, rerun_data):
+        """Run our script on a worker process.
+
+        Parameters
+        ----------
+        rerun_data: RerunData
+            The RerunData to use.
+
+        """
+        assert self._is_in_script_thread()
+
+        LOGGER.debug("Running script %s in a worker process", rerun_data)
+
+        # Reset media files. (The deltas are reset in the worker.)
+        media_file_manager.clear_session_files()
+        get_report_ctx().reset()
+
+        if rerun_data.widget_state is not None:
+            self._widgets.set_state(rerun_data.widget_state)
+
+        worker = script_process_pool.acquire(self._session_id)
+        try:
+            rerun_with_data = self._run_script_on_worker(worker)
+        finally:
+            script_process_pool.release(worker)
+
+        if rerun_with_data is not None:
+            self._run_script(rerun_with_data)
+
+    def _run_script_on_worker(self, worker):
+        """Run our script on the given worker and relay what it sends us,
+        until the run is done.
+
+        Returns
+        -------
+        RerunData | None
+            The data of a rerun that interrupted the script, if any.
+
+        """
+        rerun_with_data = None
+        is_stopping = False
+        is_started = False
+
+        wakeup_reader, wakeup_writer = multiprocessing.Pipe(duplex=False)
+        with self._wakeup_lock:
+            self._wakeup_conn = wakeup_writer
+
+        try:
+            (
+                generation,
+                modules_to_unload,
+            ) = source_watch_registry.get_worker_modules_to_unload(
+                worker.unload_generation
+            )
+            worker.unload_generation = generation
+
+            worker.send(
+                (
+                    "run",
+                    self._session_id,
+                    self._report.script_path,
+                    self._widgets.get_state().SerializeToString(),
+                    self._get_uploaded_files(),
+                    modules_to_unload,
+                )
+            )
+
+            while True:
+                # Forward at most one request to the worker, like
+                # maybe_handle_execution_control_request() would. Later
+                # requests are handled once the run is done.
+                if not is_stopping and self._request_queue.has_request:
+                    request, data = self._request_queue.dequeue()
+                    LOGGER.debug("Received ScriptRequest: %s", request)
+                    if request == ScriptRequest.SHUTDOWN:
+                        self._shutdown_requested = True
+                    elif request == ScriptRequest.RERUN:
+                        rerun_with_data = data
+                    elif request != ScriptRequest.STOP:
+                        raise RuntimeError("Unrecognized ScriptRequest: %s" % request)
+
+                    worker.send(("stop",))
+                    is_stopping = True
+
+                ready = multiprocessing.connection.wait([worker, wakeup_reader])
+                if wakeup_reader in ready:
+                    while wakeup_reader.poll():
+                        wakeup_reader.recv_bytes()
+                if worker not in ready:
+                    continue
+
+                response = worker.recv()
+                kind = response[0]
+                if kind == "msg":
+                    self._enqueue_forward_msg(ForwardMsg.FromString(response[1]))
+                elif kind == "media":
+                    media_file_manager.add(*response[1:])
+                elif kind == "media_file":
+                    worker.send(("media_file_added",) + _add_media_file(*response[1:]))
+                elif kind == "modules":
+                    source_watch_registry.add_worker_modules(response[1])
+                elif kind == "event":
+                    event = ScriptRunnerEvent(response[1])
+                    if event == ScriptRunnerEvent.SCRIPT_STARTED:
+                        is_started = True
+                    if event == ScriptRunnerEvent.SCRIPT_STOPPED_WITH_COMPILE_ERROR:
+                        self.on_event.send(event, exception=response[2])
+                    else:
+                        self.on_event.send(event)
+                elif kind == "done":
+                    self._widgets.set_state(WidgetStates.FromString(response[1]))
+                    return rerun_with_data
+                else:
+                    raise RuntimeError("Unrecognized worker message: %s" % kind)
+
+        except (EOFError, OSError) as e:
+            LOGGER.error("Script worker process died: %s", e)
+            worker.is_broken = True
+            self._on_worker_died(is_started)
+
+        finally:
+            with self._wakeup_lock:
+                self._wakeup_conn = None
+            wakeup_writer.close()
+            wakeup_reader.close()
+
+        return rerun_with_data
+
+    def _on_worker_died(self, is_started):
+        """Finish the run that the worker was in the middle of, showing an
+        error in the report."""
+        if not is_started:
+            self.on_event.send(ScriptRunnerEvent.SCRIPT_STARTED)
+
+        import streamlit as st
+
+        # This is OK because we're in the script thread.
+        st.exception(
+            RuntimeError("The process running the script exited unexpectedly.")
+        )
+
+        self._widgets.reset_triggers()
+        self.on_event.send(ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS)
+
+    def _get_uploaded_files(self):
+        """Return the session's uploaded files, in a form that can be sent to
+        the worker: each file's name, and either the path of the temporary
+        file holding its data or, if it's in memory, its data."""
+        if self._uploaded_file_mgr is None:
+            return []
+
+        return [
+            (
+                file_list.widget_id,
+                [
+                    (f.name, f.path, f.getvalue() if f.path is None else None)
+                    for f in file_list.files
+                ],
+            )
+            for file_list in self._uploaded_file_mgr.get_session_files(self._session_id)
+        ]
+
+
+def _add_media_file(path, mimetype, coordinates):
+    """Add a media file that the script in a worker pointed us to.
+
+    Returns
+    -------
+    (str | None, Exception | None)
+        The file's ID, or the error to raise in the script.
+
+    """
+    try:
+        return media_file_manager.add_file(path, mimetype, coordinates).id, None
+    except Exception as e:
+        return None, _make_picklable(e)
+
+
+class ScriptProcessPool(object):
+    """The worker processes that ProcessScriptRunners run scripts on.
+
+    Up to `global.numScriptProcesses` workers are started as they're needed.
+    A run waits if all of them are busy. Each session's runs go to the worker
+    that ran the session last, if it's free, so that they're more likely to
+    hit that worker's st.cache.
+    """
+
+    def __init__(self):
+        # Idle workers, from least- to most-recently used.
+        self._idle_workers = []  # type: List[_ScriptWorkerHandle]
+
+        # Workers that are running a script.
+        self._busy_workers = set()  # type: Set[_ScriptWorkerHandle]
+        self._num_workers = 0
+        self._num_workers_started = 0
+        self._num_runs = 0
+        self._num_crashes = 0
+
+        # Protects all of the above, and is notified when a worker is
+        # released.
+        self._cond = threading.Condition()
+
+        # "spawn" rather than "fork", because the server process has threads
+        # (and a Tornado IOLoop) that a forked child would inherit in an
+        # arbitrary state.
+        self._mp_context = multiprocessing.get_context("spawn")
+
+    def acquire(self, session_id):
+        """Return a worker to run the given session's script on, waiting
+        until one is free. The worker must be passed to release() after the
+        run.
+
+        Parameters
+        ----------
+        session_id : str
+            The ID of the session whose script will run.
+
+        Returns
+        -------
+        _ScriptWorkerHandle
+
+        """
+        worker = None  # type: Optional[_ScriptWorkerHandle]
+        with self._cond:
+            while True:
+                # Drop workers that died while idle.
+                for dead_worker in [w for w in self._idle_workers if not w.is_alive()]:
+                    LOGGER.warning("Idle script worker process died")
+                    self._idle_workers.remove(dead_worker)
+                    self._num_workers -= 1
+                    self._num_crashes += 1
+                    dead_worker.close()
+
+                if self._idle_workers:
+                    worker = next(
+                        (
+                            w
+                            for w in reversed(self._idle_workers)
+                            if w.last_session_id == session_id
+                        ),
+                        self._idle_workers[-1],
+                    )
+                    self._idle_workers.remove(worker)
+                    break
+
+                max_workers = max(1, config.get_option("global.numScriptProcesses"))
+                if self._num_workers < max_workers:
+                    # Start a new worker, outside the lock.
+                    self._num_workers += 1
+                    break
+
+                self._cond.wait()
+
+            self._num_runs += 1
+
+        if worker is None:
+            try:
+                worker = _ScriptWorkerHandle(self._mp_context)
+            except BaseException:
+                with self._cond:
+                    self._num_workers -= 1
+                    self._cond.notify()
+                raise
+
+            with self._cond:
+                self._num_workers_started += 1
+
+        with self._cond:
+            self._busy_workers.add(worker)
+
+        worker.last_session_id = session_id
+        return worker
+
+    def release(self, worker):
+        """Return a worker to the pool after a run. Broken workers, and
+        workers that were busy when the pool was shut down, are shut down.
+        They're replaced when they're next needed."""
+        with self._cond:
+            self._busy_workers.discard(worker)
+            must_close = worker.is_broken or worker.close_on_release
+            if must_close:
+                self._num_workers -= 1
+                if worker.is_broken:
+                    self._num_crashes += 1
+            else:
+                self._idle_workers.append(worker)
+            self._cond.notify()
+
+        if must_close:
+            worker.close()
+
+    def shutdown(self):
+        """Shut down all workers: the idle ones now, and the busy ones as
+        soon as their runs are done. Called when the server stops."""
+        with self._cond:
+            workers = self._idle_workers
+            self._idle_workers = []
+            self._num_workers -= len(workers)
+            for busy_worker in self._busy_workers:
+                busy_worker.close_on_release = True
+
+        for worker in workers:
+            worker.close()
+
+    def get_stats(self):
+        # type: () -> Dict[str, Any]
+        """Return a dict of statistics about the pool's workers."""
+        with self._cond:
+            return {
+                "num_workers": self._num_workers,
+                "num_idle": len(self._idle_workers),
+                "max_workers": config.get_option("global.numScriptProcesses"),
+                "num_workers_started": self._num_workers_started,
+                "num_runs": self._num_runs,
+                "num_crashes": self._num_crashes,
+            }
+
+
+class _ScriptWorkerHandle(object):
+    """The server process's end of a worker process."""
+
+    def __init__(self, mp_context):
+        self._conn, child_conn = mp_context.Pipe()
+        self._process = mp_context.Process(
+            target=_worker_main,
+            args=(child_conn, _get_config_overrides()),
+            name="ScriptProcessPool.worker",
+            daemon=True,
+        )
+        with _original_main_module():
+            self._process.start()
+        child_conn.close()
+
+        LOGGER.debug("Started script worker process %s", self._process.pid)
+
+        # The ID of the session that last ran on this worker.
+        self.last_session_id = None  # type: Optional[str]
+
+        # Set when the worker died or can't be talked to anymore.
+        self.is_broken = False
+
+        # Set when the pool was shut down while the worker was busy.
+        self.close_on_release = False
+
+        # The source_watch_registry's unload generation that the worker has
+        # caught up with. A new worker starts from 0, and so unloads some
+        # modules it hasn't loaded, which is harmless.
+        self.unload_generation = 0
+
+    def send(self, request):
+        self._conn.send(request)
+
+    def fileno(self):
+        """Our end of the pipe, so that the worker can be passed to
+        multiprocessing.connection.wait()."""
+        return self._conn.fileno()
+
+    def recv(self):
+        return self._conn.recv()
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def close(self):
+        """Shut down the worker process."""
+        self._conn.close()
+        self._process.terminate()
+        self._process.join(WORKER_SHUTDOWN_TIMEOUT)
+
+
+@contextmanager
+def _original_main_module():
+    """A context that puts the server's __main__ module back in place.
+
+    The "spawn" start method re-imports the parent's __main__ module in the
+    child, so if a ScriptRunner has replaced it with the script's module,
+    starting a worker would run the script in it.
+    """
+    script_main_module = sys.modules.get("__main__")
+    if _server_main_module is not None:
+        sys.modules["__main__"] = _server_main_module
+    try:
+        yield
+    finally:
+        if script_main_module is not None:
+            sys.modules["__main__"] = script_main_module
+
+
+def _get_config_overrides():
+    """Return the config options that weren't left at their defaults, so the
+    worker uses the same values (including ones set by command-line flags)."""
+    return {
+        key: option.value
+        for key, option in config._config_options.items()
+        if option.where_defined != ConfigOption.DEFAULT_DEFINITION
+    }
+
+
+def _worker_main(conn, config_overrides):
+    """The entry point of a worker process."""
+    # Ctrl-C in the terminal is the server's to handle. It shuts us down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    config.parse_config_file()
+    for key, value in config_overrides.items():
+        config._set_option(key, value, "the server process")
+
+    # Scheduling happens in the server process, and workers don't have
+    # workers of their own.
+    config._set_option("global.maxConcurrentScriptRuns", 0, "the server process")
+    config._set_option("global.numScriptProcesses", 0, "the server process")
+
+    _ScriptWorker(conn).run()
+
+
+class _ScriptWorker(object):
+    """The worker process's end: runs scripts as the server process asks."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+        # Messages are sent from the script thread, and possibly from other
+        # threads that the script starts.
+        self._send_lock = threading.Lock()
+
+        self._scriptrunner = None  # type: Optional[ScriptRunner]
+        self._request_queue = None  # type: Optional[ScriptRequestQueue]
+        self._session_id = None  # type: Optional[str]
+        self._uploaded_file_mgr = None  # type: Optional[UploadedFileManager]
+
+        # The server process's replies to our "media_file" messages. Only one
+        # of those can be waiting for its reply at a time.
+        self._media_file_replies = queue.Queue()  # type: queue.Queue[Any]
+        self._media_file_lock = threading.Lock()
+
+        # Dict[module name] -> id of the module, for the modules in our
+        # sys.modules that we've reported to the server process.
+        self._reported_modules = {}  # type: Dict[str, int]
+
+    def run(self):
+        """Handle requests from the server process until it goes away."""
+        while True:
+            try:
+                request = self._conn.recv()
+            except (EOFError, OSError):
+                LOGGER.debug("Server process is gone; exiting")
+                return
+
+            if request[0] == "run":
+                self._start_run(*request[1:])
+            elif request[0] == "stop":
+                self._stop_run()
+            elif request[0] == "media_file_added":
+                self._media_file_replies.put(request[1:])
+            else:
+                raise RuntimeError("Unrecognized worker request: %s" % request[0])
+
+    def _start_run(
+        self, session_id, script_path, widget_states, uploaded_files, modules_to_unload
+    ):
+        # Unload the modules whose source files changed, so the script
+        # imports them again.
+        for module_name in modules_to_unload:
+            _unload_module(module_name)
+            self._reported_modules.pop(module_name, None)
+
+        uploaded_file_mgr = UploadedFileManager()
+        for widget_id, files in uploaded_files:
+            uploaded_file_mgr.add_files(
+                session_id,
+                widget_id,
+                [
+                    f
+                    for f in (_open_uploaded_file(*file) for file in files)
+                    if f is not None
+                ],
+            )
+        self._session_id = session_id
+        self._uploaded_file_mgr = uploaded_file_mgr
+
+        self._request_queue = ScriptRequestQueue()
+        self._request_queue.enqueue(ScriptRequest.RERUN, RerunData(widget_state=None))
+
+        self._scriptrunner = ScriptRunner(
+            session_id=session_id,
+            report=_WorkerReport(script_path),
+            enqueue_forward_msg=self._enqueue,
+            widget_states=WidgetStates.FromString(widget_states),
+            request_queue=self._request_queue,
+            uploaded_file_mgr=uploaded_file_mgr,
+            media_file_mgr=_MediaFileSink(self),
+        )
+        self._scriptrunner.on_event.connect(self._on_scriptrunner_event)
+        self._scriptrunner.start()
+
+    def _stop_run(self):
+        # If the run is already done, this is a no-op: its ScriptRunner is
+        # shut down, and the next run gets a new request queue.
+        scriptrunner = self._scriptrunner
+        request_queue = self._request_queue
+        if scriptrunner is not None and request_queue is not None:
+            request_queue.enqueue(ScriptRequest.STOP)
+            scriptrunner.on_request_enqueued()
+
+    def _enqueue(self, msg):
+        # Like ReportSession.enqueue(), give the ScriptRunner a chance to
+        # stop the script first.
+        scriptrunner = self._scriptrunner
+        if scriptrunner is not None:
+            scriptrunner.maybe_handle_execution_control_request()
+
+        self._send(("msg", msg.SerializeToString()))
+
+    def _on_scriptrunner_event(self, event, exception=None, widget_states=None):
+        if event == ScriptRunnerEvent.SHUTDOWN:
+            # Close the run's uploaded files.
+            if self._uploaded_file_mgr is not None and self._session_id is not None:
+                self._uploaded_file_mgr.remove_session_files(self._session_id)
+            self._send(("done", widget_states.SerializeToString()))
+            return
+
+        if event != ScriptRunnerEvent.SCRIPT_STARTED:
+            # The server updates the session's watched modules when the
+            # script stops, so they must be reported before the event.
+            self._report_modules()
+        self._send(("event", event.value, _make_picklable(exception)))
+
+    def _report_modules(self):
+        """Send the server process the files of the modules that were loaded
+        since our last report, so that it watches them."""
+        modules = []
+        for name, module in list(sys.modules.items()):
+            if name == "__main__" or self._reported_modules.get(name) == id(module):
+                continue
+            self._reported_modules[name] = id(module)
+
+            filepath = _get_module_file(module)
+            if filepath is not None:
+                modules.append((name, filepath, _get_module_package(module)))
+
+        if modules:
+            self._send(("modules", modules))
+
+    def add_media(self, content, mimetype, coordinates):
+        """Send a media file's content to the server process."""
+        self._send(("media", content, mimetype, coordinates))
+
+    def add_media_file(self, path, mimetype, coordinates):
+        """Have the server process add a media file from a path, and return
+        its ID. The server snapshots the file, so it decides the ID. Errors
+        (e.g. a missing file) are raised, like MediaFileManager.add_file()
+        would."""
+        with self._media_file_lock:
+            self._send(("media_file", path, mimetype, coordinates))
+            file_id, exception = self._media_file_replies.get()
+        if exception is not None:
+            raise exception
+        return file_id
+
+    def _send(self, message):
+        with self._send_lock:
+            self._conn.send(message)
+
+
+class _MediaFileSink(object):
+    """Takes the place of the MediaFileManager in a worker's script run.
+
+    Media files are sent to the server process, which stores and serves
+    them. The sink keeps nothing, so the worker doesn't hold on to the media
+    files of the sessions it runs, and each run gets a new sink.
+    """
+
+    def __init__(self, worker):
+        self._worker = worker
+
+    def add(self, content, mimetype, coordinates):
+        self._worker.add_media(content, mimetype, coordinates)
+        file_id = _calculate_file_id(content, mimetype)
+        return MediaFile(file_id=file_id, mimetype=mimetype)
+
+    def add_file(self, path, mimetype, coordinates):
+        file_id = self._worker.add_media_file(path, mimetype, coordinates)
+        return MediaFile(file_id=file_id, mimetype=mimetype)
+
+    def clear_session_files(self, session_id=None):
+        # The server process clears the session's files before each run.
+        pass
+
+
+def _open_uploaded_file(name, path, data):
+    """Return an UploadedFile for a file sent by the server process: from
+    the temporary file at the given path, or else from the given data.
+
+    Returns None if the temporary file was removed since (e.g. because the
+    user replaced the upload), in which case another run will follow.
+    """
+    if path is None:
+        return UploadedFile(name, data)
+
+    try:
+        return UploadedFile(name, open(path, "rb"))
+    except FileNotFoundError:
+        LOGGER.debug("Uploaded file %s was removed before the run", path)
+        return None
+
+
+def _get_module_package(module):
+    """Return the name of the module's package, if it can be told."""
+    try:
+        spec = getattr(module, "__spec__", None)
+        if spec is not None:
+            return spec.parent
+        return getattr(module, "__package__", None)
+    except Exception:
+        # Some modules' attributes are dynamic properties, which can crash.
+        return None
+
+
+def _make_picklable(exception):
+    """Return the exception, or a RuntimeError describing it if it can't be
+    sent to the server process."""
+    if exception is None:
+        return None
+    try:
+        pickle.dumps(exception)
+        return exception
+    except Exception:
+        return RuntimeError("%s: %s" % (type(exception).__name__, exception))
+
+
+script_process_pool = ScriptProcessPool()
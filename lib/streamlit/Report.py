@@ -19,6 +19,7 @@ import uuid
 from typing import Any, Dict
 
 from streamlit import config
+from streamlit import metrics
 from streamlit.ReportQueue import ReportQueue
 from streamlit import net_util
 
@@ -98,6 +99,11 @@ class Report(object):
         return {"master queue": self._master_queue.get_debug()}
 
     def enqueue(self, msg):
+        if msg.HasField("delta"):
+            metrics.Client.get("streamlit_enqueue_deltas_total").labels(
+                _get_delta_type(msg.delta)
+            ).inc()
+
         self._master_queue.enqueue(msg)
         self._browser_queue.enqueue(msg)
 
@@ -111,6 +117,18 @@ class Report(object):
 
         self._browser_queue.clear()
 
+    def browser_queue_is_empty(self) -> bool:
+        return self._browser_queue.is_empty()
+
+    def get_memory_size(self) -> int:
+        """Estimate the memory used by the report's messages, in bytes.
+
+        Every message is enqueued on both queues, and the browser queue is
+        only ever cleared on its own, so its messages are also in the master
+        queue and only the master queue is counted.
+        """
+        return self._master_queue.get_byte_size()
+
     def flush_browser_queue(self):
         """Clears our browser queue and returns the messages it contained.
 
@@ -275,3 +293,12 @@ def _get_browser_address_bar_port():
     ):
         return 3000
     return config.get_option("browser.serverPort")
+
+
+def _get_delta_type(delta):
+    """Return the type of a Delta, for metrics: the element type for new
+    elements, and the delta type otherwise."""
+    delta_type = delta.WhichOneof("type")
+    if delta_type == "new_element":
+        return delta.new_element.WhichOneof("type")
+    return delta_type
@@ -41,6 +41,9 @@ class ReportQueue(object):
             # where delta_path = (container, parent block path as a string)
             self._delta_index_map = dict()
 
+            # Total serialized size of the messages in _queue, in bytes.
+            self._byte_size = 0
+
     def get_debug(self):
         from google.protobuf.json_format import MessageToDict
 
@@ -52,7 +55,7 @@ class ReportQueue(object):
     def __iter__(self):
         return iter(self._queue)
 
-    def is_empty(self):
+    def is_empty(self) -> bool:
         return len(self._queue) == 0
 
     def get_initial_msg(self):
@@ -60,6 +63,12 @@ class ReportQueue(object):
             return self._queue[0]
         return None
 
+    def get_byte_size(self) -> int:
+        """Return the total serialized size of the queued messages, in
+        bytes. This is kept up to date as messages are enqueued, so it's
+        cheap to call."""
+        return self._byte_size
+
     def enqueue(self, msg):
         """Add message into queue, possibly composing it with another message.
 
@@ -71,6 +80,7 @@ class ReportQueue(object):
             # Optimize only if it's a delta message
             if not msg.HasField("delta"):
                 self._queue.append(msg)
+                self._byte_size += msg.ByteSize()
             else:
                 # Deltas are uniquely identified by the combination of their
                 # container and ID.
@@ -89,11 +99,13 @@ class ReportQueue(object):
                     new_msg.delta.CopyFrom(composed_delta)
                     new_msg.metadata.CopyFrom(msg.metadata)
                     self._queue[index] = new_msg
+                    self._byte_size += new_msg.ByteSize() - old_msg.ByteSize()
                 else:
                     # Append this message to the queue, and store its index
                     # for future combining.
                     self._delta_index_map[delta_key] = len(self._queue)
                     self._queue.append(msg)
+                    self._byte_size += msg.ByteSize()
 
     def clone(self):
         """Return the elements of this ReportQueue as a collections.deque."""
@@ -102,12 +114,14 @@ class ReportQueue(object):
         with self._lock:
             r._queue = list(self._queue)
             r._delta_index_map = dict(self._delta_index_map)
+            r._byte_size = self._byte_size
 
         return r
 
     def _clear(self):
         self._queue = []
         self._delta_index_map = dict()
+        self._byte_size = 0
 
     def clear(self):
         """Clear this queue."""
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import secrets
 import sys
 import uuid
 from enum import Enum
@@ -23,12 +24,16 @@ from streamlit import __installation_id__
 from streamlit import __version__
 from streamlit import caching
 from streamlit import config
+from streamlit import metrics
 from streamlit import url_util
 from streamlit.MediaFileManager import media_file_manager
+from streamlit.ProcessScriptRunner import ProcessScriptRunner
 from streamlit.Report import Report
+from streamlit.ScriptCache import script_cache
 from streamlit.ScriptRequestQueue import RerunData
 from streamlit.ScriptRequestQueue import ScriptRequest
 from streamlit.ScriptRequestQueue import ScriptRequestQueue
+from streamlit.ScriptRequestQueue import coalesce_rerun_data
 from streamlit.ScriptRunner import ScriptRunner
 from streamlit.ScriptRunner import ScriptRunnerEvent
 from streamlit.UploadedFileManager import UploadedFileManager
@@ -83,6 +88,11 @@ class ReportSession(object):
         # Each ReportSession has a unique string ID.
         self.id = str(uuid.uuid4())
 
+        # Secret that a browser must present to resume this session after
+        # its websocket connection drops. (Unlike the ID, this is never
+        # shared with anything but the session's own browser.)
+        self.resume_token = secrets.token_urlsafe(32)
+
         self._ioloop = ioloop
         self._report = Report(script_path, command_line)
         self._uploaded_file_mgr = uploaded_file_manager
@@ -96,6 +106,7 @@ class ReportSession(object):
         self._sent_initialize_message = False
         self._storage = None
         self._maybe_reuse_previous_run = False
+        self._skip_rerun_if_widgets_unchanged = False
         self._run_on_save = config.get_option("server.runOnSave")
 
         # The ScriptRequestQueue is the means by which we communicate
@@ -104,6 +115,15 @@ class ReportSession(object):
 
         self._scriptrunner = None
 
+        # A widget rerun that's being held back while the script runs, and
+        # the IOLoop timeout that requests it. See _maybe_debounce_rerun().
+        self._debounced_rerun_data = None
+        self._debounce_timeout = None
+
+        # The debounce window the browser asked for, in milliseconds, or
+        # None to use runner.rerunDebounceMs.
+        self._rerun_debounce_ms = None
+
         LOGGER.debug("ReportSession initialized (id=%s)", self.id)
 
     def flush_browser_queue(self):
@@ -137,9 +157,63 @@ class ReportSession(object):
             if self._scriptrunner is not None:
                 self._enqueue_script_request(ScriptRequest.SHUTDOWN)
 
+            self._cancel_debounce_timeout()
+            self._debounced_rerun_data = None
+
             self._state = ReportSessionState.SHUTDOWN_REQUESTED
             self._local_sources_watcher.close()
 
+    @property
+    def is_script_running(self):
+        """True if the session's script is running, or a ScriptRunner is
+        starting up or shutting down."""
+        return (
+            self._state == ReportSessionState.REPORT_IS_RUNNING
+            or self._scriptrunner is not None
+        )
+
+    def get_memory_size(self):
+        """Estimate the memory used by this session's report, in-memory
+        media files and uploaded files, in bytes.
+
+        Returns
+        -------
+        int
+
+        """
+        return (
+            self._report.get_memory_size()
+            + media_file_manager.get_session_memory_size(self.id)
+            + self._uploaded_file_mgr.get_session_size(self.id)
+        )
+
+    def hibernate(self):
+        """Free the memory used by this session's report and media files.
+
+        Only the state needed to rerun the script is kept: the widget states
+        and uploaded files. The browser keeps showing the report, and the
+        next rerun regenerates it. Its media files are spilled to disk rather
+        than dropped, since the browser may still request them.
+
+        Returns
+        -------
+        bool
+            False if the script is running, or has messages waiting to be
+            sent to the browser, in which case nothing is freed.
+
+        """
+        if (
+            self._state != ReportSessionState.REPORT_NOT_RUNNING
+            or self._scriptrunner is not None
+            or not self._report.browser_queue_is_empty()
+        ):
+            return False
+
+        LOGGER.debug("Hibernating session (id=%s)", self.id)
+        self._report.clear()
+        media_file_manager.spill_session_files(self.id)
+        return True
+
     def enqueue(self, msg):
         """Enqueue a new ForwardMsg to our browser queue.
 
@@ -193,7 +267,7 @@ class ReportSession(object):
 
         self.enqueue(msg)
 
-    def request_rerun(self, widget_state=None):
+    def request_rerun(self, widget_state=None, is_interactive=True):
         """Signal that we're interested in running the script.
 
         If the script is not already running, it will be started immediately.
@@ -204,14 +278,23 @@ class ReportSession(object):
         widget_state : dict | None
             The widget state dictionary to run the script with, or None
             to use the widget state from the previous run of the script.
+        is_interactive : bool
+            False if the rerun wasn't requested by the user (e.g. if a
+            source file changed), in which case it's scheduled after the
+            user-requested reruns of other sessions.
 
         """
-        self._enqueue_script_request(ScriptRequest.RERUN, RerunData(widget_state))
+        self._enqueue_script_request(
+            ScriptRequest.RERUN,
+            RerunData(widget_state=widget_state, is_interactive=is_interactive),
+        )
 
     def _on_source_file_changed(self):
         """One of our source files changed. Schedule a rerun if appropriate."""
+        script_cache.invalidate(self._report.script_path)
+
         if self._run_on_save:
-            self.request_rerun()
+            self.request_rerun(is_interactive=False)
         else:
             self._enqueue_file_change_message()
 
@@ -261,6 +344,10 @@ class ReportSession(object):
             if self._state != ReportSessionState.SHUTDOWN_REQUESTED:
                 self._state = ReportSessionState.REPORT_NOT_RUNNING
 
+            if self._debounced_rerun_data is not None:
+                # No need to wait any longer, since the script isn't running.
+                self._ioloop.spawn_callback(self._flush_debounced_rerun)
+
             script_succeeded = event == ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS
 
             self._enqueue_report_finished_message(
@@ -379,6 +466,7 @@ class ReportSession(object):
 
         imsg.command_line = self._report.command_line
         imsg.session_id = self.id
+        imsg.session_resume_token = self.resume_token
 
         self.enqueue(msg)
 
@@ -420,6 +508,13 @@ class ReportSession(object):
             then ignore the next rerun request if it matches the already-ran
             widget state.
 
+        Returns
+        -------
+        bool
+            False if the rerun was skipped because the browser already has
+            its output. Otherwise True, including when the rerun is held back
+            to be merged with later ones.
+
         """
         if is_preheat:
             self._maybe_reuse_previous_run = True  # For next time.
@@ -435,9 +530,100 @@ class ReportSession(object):
 
             if not has_widget_state:
                 LOGGER.debug("Skipping rerun since the preheated run is the same")
-                return
+                return False
+
+        elif self._skip_rerun_if_widgets_unchanged:
+            # If a browser just resumed this session, it asks for a rerun
+            # with its widget state. Skip it if the state hasn't changed
+            # since the last run, since the browser already has its output.
+            self._skip_rerun_if_widgets_unchanged = False
+
+            if widget_state is not None and _widget_states_equal(
+                widget_state, self._widget_states
+            ):
+                LOGGER.debug("Skipping rerun since the resumed run is the same")
+                return False
+
+        if not is_preheat and self._maybe_debounce_rerun(widget_state):
+            return True
+
+        self.request_rerun(widget_state, is_interactive=not is_preheat)
+        return True
+
+    def _maybe_debounce_rerun(self, widget_state):
+        """Hold back a widget rerun if it would restart the running script.
 
-        self.request_rerun(widget_state)
+        While the script runs, widget reruns requested within the session's
+        debounce window of the first one are merged into a single
+        rerun with the latest widget values, which is requested when the
+        window passes or the script stops, whichever comes first. This keeps
+        e.g. a dragged slider from restarting the script on every change.
+
+        The window is `runner.rerunDebounceMs`, unless the browser set its
+        own with handle_set_rerun_debounce_ms_request().
+
+        Parameters
+        ----------
+        widget_state : WidgetStates | None
+            The widget state the rerun was requested with.
+
+        Returns
+        -------
+        bool
+            True if the rerun was held back. Otherwise, any rerun that was
+            held back before has been requested, and the caller should
+            request this one.
+
+        """
+        debounce_ms = self._rerun_debounce_ms
+        if debounce_ms is None:
+            debounce_ms = config.get_option("runner.rerunDebounceMs")
+        if (
+            debounce_ms <= 0
+            or self._state != ReportSessionState.REPORT_IS_RUNNING
+            or _has_trigger_value(widget_state)
+        ):
+            # Buttons aren't debounced, since a click is a one-off event
+            # that the user expects to see the result of right away.
+            self._flush_debounced_rerun()
+            return False
+
+        rerun_data = RerunData(widget_state=widget_state)
+        if self._debounced_rerun_data is None:
+            LOGGER.debug("Debouncing rerun for %dms", debounce_ms)
+            self._debounced_rerun_data = rerun_data
+            self._debounce_timeout = self._ioloop.call_later(
+                debounce_ms / 1000.0, self._flush_debounced_rerun
+            )
+        else:
+            self._debounced_rerun_data = coalesce_rerun_data(
+                self._debounced_rerun_data, rerun_data
+            )
+            metrics.Client.get("streamlit_script_reruns_debounced_total").inc()
+
+        return True
+
+    def _flush_debounced_rerun(self):
+        """Request the rerun that's being held back, if any."""
+        self._cancel_debounce_timeout()
+
+        rerun_data = self._debounced_rerun_data
+        if rerun_data is None:
+            return
+
+        self._debounced_rerun_data = None
+        self.request_rerun(rerun_data.widget_state, is_interactive=True)
+
+    def _cancel_debounce_timeout(self):
+        if self._debounce_timeout is not None:
+            self._ioloop.remove_timeout(self._debounce_timeout)
+            self._debounce_timeout = None
+
+    def handle_resume(self):
+        """Called when a browser reconnects to this session after its
+        previous connection dropped.
+        """
+        self._skip_rerun_if_widgets_unchanged = True
 
     def handle_stop_script_request(self):
         """Tell the ScriptRunner to stop running its report."""
@@ -469,6 +655,19 @@ class ReportSession(object):
         self._run_on_save = new_value
         self._enqueue_session_state_changed_message()
 
+    def handle_set_rerun_debounce_ms_request(self, debounce_ms):
+        """Change how long widget reruns are held back while the script runs,
+        for this session only. See _maybe_debounce_rerun().
+
+        Parameters
+        ----------
+        debounce_ms : int
+            The new debounce window, in milliseconds. 0 disables debouncing,
+            and a negative value restores runner.rerunDebounceMs.
+
+        """
+        self._rerun_debounce_ms = debounce_ms if debounce_ms >= 0 else None
+
     def _enqueue_script_request(self, request, data=None):
         """Enqueue a ScriptEvent into our ScriptEventQueue.
 
@@ -489,6 +688,8 @@ class ReportSession(object):
             return
 
         self._script_request_queue.enqueue(request, data)
+        if self._scriptrunner is not None:
+            self._scriptrunner.on_request_enqueued()
         self._maybe_create_scriptrunner()
 
     def _maybe_create_scriptrunner(self):
@@ -509,7 +710,12 @@ class ReportSession(object):
             return
 
         # Create the ScriptRunner, attach event handlers, and start it
-        self._scriptrunner = ScriptRunner(
+        if config.get_option("global.numScriptProcesses") > 0:
+            scriptrunner_class = ProcessScriptRunner
+        else:
+            scriptrunner_class = ScriptRunner
+
+        self._scriptrunner = scriptrunner_class(
             session_id=self.id,
             report=self._report,
             enqueue_forward_msg=self.enqueue,
@@ -599,3 +805,26 @@ class ReportSession(object):
             else:
                 raise RuntimeError("Unsupported sharing mode '%s'" % sharing_mode)
         return self._storage
+
+
+def _has_trigger_value(widget_state):
+    """True if the given WidgetStates has a triggered button."""
+    if widget_state is None:
+        return False
+
+    return any(
+        widget.WhichOneof("value") == "trigger_value" and widget.trigger_value
+        for widget in widget_state.widgets
+    )
+
+
+def _widget_states_equal(states1, states2):
+    """True if the two WidgetStates protos hold the same values, regardless
+    of the order of their widgets."""
+    if states1 is None or states2 is None:
+        return states1 is states2
+
+    def to_dict(states):
+        return {w.id: w for w in states.widgets}
+
+    return to_dict(states1) == to_dict(states2)
@@ -12,16 +12,27 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import sys
 import threading
+from typing import Any, Callable, Dict, List, Optional
 
 from streamlit.logger import get_logger
 
 LOGGER = get_logger(__name__)
 
+# How long, in seconds, an idle pooled thread waits for work before exiting.
+POOLED_THREAD_IDLE_TIMEOUT = 60
+
 
 class ReportContext(object):
     def __init__(
-        self, session_id, enqueue, widgets, widget_ids_this_run, uploaded_file_mgr,
+        self,
+        session_id,
+        enqueue,
+        widgets,
+        widget_ids_this_run,
+        uploaded_file_mgr,
+        media_file_mgr=None,
     ):
         """Construct a ReportContext.
 
@@ -38,6 +49,9 @@ class ReportContext(object):
             current report run. This set is cleared at the start of each run.
         uploaded_file_mgr : UploadedFileManager
             The manager for files uploaded by all users.
+        media_file_mgr : MediaFileManager or None
+            The manager that the report's media files are added to. If None,
+            the global media_file_manager is used.
         """
         # (dict) Mapping of container (type str or BlockPath) to top-level
         # cursor (type AbstractCursor).
@@ -47,6 +61,7 @@ class ReportContext(object):
         self.widgets = widgets
         self.widget_ids_this_run = widget_ids_this_run
         self.uploaded_file_mgr = uploaded_file_mgr
+        self.media_file_mgr = media_file_mgr
 
     def reset(self):
         self.cursors = {}
@@ -90,46 +105,146 @@ class _WidgetIDSet(object):
 REPORT_CONTEXT_ATTR_NAME = "streamlit_report_ctx"
 
 
-class ReportThread(threading.Thread):
-    """Extends threading.Thread with a ReportContext member"""
+class _PooledReportThread(threading.Thread):
+    """A long-lived thread that runs tasks for a ReportThreadPool, with the
+    ReportContext of each task bound to it while the task runs."""
+
+    def __init__(self, pool):
+        super(_PooledReportThread, self).__init__(name="ReportThreadPool.idle")
+        self.daemon = True
+        self.streamlit_report_ctx = None  # type: Optional[ReportContext]
+        self._pool = pool
+        self._task = None  # type: Optional[Callable[[], Any]]
+        self._has_task = threading.Event()
+
+    def assign(self, ctx, target, name):
+        """Run target with the given ReportContext. Called by the pool once
+        this thread has been removed from its idle list."""
+        self.streamlit_report_ctx = ctx
+        self.name = name
+        self._task = target
+        self._has_task.set()
+
+    def run(self):
+        while self._wait_for_task():
+            task = self._task
+            self._task = None
+            assert task is not None, "A pooled thread woke up without a task"
+            try:
+                task()
+            except BaseException:
+                LOGGER.exception("Uncaught exception in pooled report thread")
+            finally:
+                # Don't leak the task's ReportContext, or the tracer its
+                # script may have installed, into the next task.
+                sys.settrace(None)
+                self.streamlit_report_ctx = None
+                self.name = "ReportThreadPool.idle"
+                self._pool._on_task_done(self)
+
+    def _wait_for_task(self):
+        """Wait for the next task. Returns False if the thread should exit,
+        because it's been idle for too long."""
+        while not self._has_task.wait(POOLED_THREAD_IDLE_TIMEOUT):
+            if self._pool._on_idle_timeout(self):
+                return False
+            # The pool is handing us a task right now.
+        self._has_task.clear()
+        return True
+
+
+class ReportThreadPool(object):
+    """A pool of threads that run ScriptRunners.
+
+    A ScriptRunner only needs a thread while it has script requests to
+    process, so rather than starting a thread for every ScriptRunner, we
+    reuse threads that have finished running another one. Threads that are
+    idle for POOLED_THREAD_IDLE_TIMEOUT seconds exit.
+
+    The number of threads isn't capped. A ReportSession has at most one
+    ScriptRunner at a time, so there are never more busy threads than
+    sessions, which is as many as there were before threads were pooled.
+    How many scripts actually run at once is limited by the
+    ScriptRunScheduler instead. A task holds its thread for as long as its
+    ScriptRunner processes requests, including while it waits for the
+    scheduler or runs a script that never ends. So if tasks had to wait for
+    a free thread, one session's STOP or SHUTDOWN request could be stuck
+    behind other sessions' scripts.
+    """
 
-    def __init__(
-        self,
-        session_id,
-        enqueue,
-        widgets,
-        uploaded_file_mgr=None,
-        target=None,
-        name=None,
-    ):
-        """Construct a ReportThread.
+    def __init__(self):
+        self._idle_threads = []  # type: List[_PooledReportThread]
+        self._num_threads = 0
+        self._num_threads_started = 0
+        self._num_tasks = 0
+
+        # Protects all of the above.
+        self._lock = threading.Lock()
+
+    def submit(self, ctx, target, name):
+        """Run target on a pooled thread, with the given ReportContext.
 
         Parameters
         ----------
-        session_id : str
-            The ReportSession's id.
-        enqueue : callable
-            Function that enqueues ForwardMsg protos in the websocket.
-        widgets : Widgets
-            The Widgets state object for the report.
-        uploaded_file_mgr : UploadedFileManager
-            The manager for files uploaded by all users.
+        ctx : ReportContext
+            The ReportContext that get_report_ctx() returns while target runs.
         target : callable
-            The callable object to be invoked by the run() method.
-            Defaults to None, meaning nothing is called.
+            The function to run.
         name : str
-            The thread name. By default, a unique name is constructed of
-            the form "Thread-N" where N is a small decimal number.
+            The thread's name while target runs.
+
+        Returns
+        -------
+        threading.Thread
+            The thread that target runs on.
 
         """
-        super(ReportThread, self).__init__(target=target, name=name)
-        self.streamlit_report_ctx = ReportContext(
-            session_id=session_id,
-            enqueue=enqueue,
-            widgets=widgets,
-            uploaded_file_mgr=uploaded_file_mgr,
-            widget_ids_this_run=_WidgetIDSet(),
-        )
+        with self._lock:
+            self._num_tasks += 1
+            if self._idle_threads:
+                # Reuse the most-recently idle thread, so that the other ones
+                # can time out if there's not enough work for all of them.
+                thread = self._idle_threads.pop()
+                is_new_thread = False
+            else:
+                thread = _PooledReportThread(self)
+                self._num_threads += 1
+                self._num_threads_started += 1
+                is_new_thread = True
+
+        thread.assign(ctx, target, name)
+        if is_new_thread:
+            thread.start()
+        return thread
+
+    def get_stats(self):
+        # type: () -> Dict[str, Any]
+        """Return a dict of statistics about the pool's threads."""
+        with self._lock:
+            return {
+                "num_threads": self._num_threads,
+                "num_idle": len(self._idle_threads),
+                "num_threads_started": self._num_threads_started,
+                "num_tasks": self._num_tasks,
+            }
+
+    def _on_task_done(self, thread):
+        with self._lock:
+            self._idle_threads.append(thread)
+
+    def _on_idle_timeout(self, thread):
+        """Called when an idle thread's wait for a task times out. Returns
+        True if the thread should exit, or False if it was just handed a
+        task."""
+        with self._lock:
+            if thread not in self._idle_threads:
+                return False
+            self._idle_threads.remove(thread)
+            self._num_threads -= 1
+            return True
+
+
+report_thread_pool = ReportThreadPool()
 
 
 def add_report_ctx(thread=None, ctx=None):
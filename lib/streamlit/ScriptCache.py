@@ -0,0 +1,200 @@
+# Copyright 2018-2020 Streamlit Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import importlib.util
+import marshal
+import os
+import threading
+from types import CodeType
+from typing import Any, Dict, Optional, Tuple
+
+from streamlit import config
+from streamlit import file_util
+from streamlit import magic
+from streamlit import source_util
+from streamlit import util
+from streamlit.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+
+class ScriptCache(object):
+    """Caches scripts' compiled code, so that rerunning an unchanged script
+    doesn't read, parse, magic-transform and compile it again.
+
+    Code is cached in memory by script path, and is recompiled when the
+    script's mtime or size changes, or when the file watcher tells us it
+    changed (see invalidate()). With `global.persistScriptCache`, compiled
+    code is also cached on disk, keyed by a hash of the source, so it
+    survives server restarts and is shared by script worker processes.
+    """
+
+    def __init__(self):
+        # Dict[script path] -> ((mtime, size, magic enabled), code)
+        self._entries = {}  # type: Dict[str, Tuple[Tuple[int, int, bool], CodeType]]
+        self._num_hits = 0
+        self._num_disk_hits = 0
+        self._num_misses = 0
+
+        # Protects all of the above.
+        self._lock = threading.Lock()
+
+    def get_code(self, script_path):
+        """Return the compiled code of the given script.
+
+        Parameters
+        ----------
+        script_path : str
+            The path to the script.
+
+        Returns
+        -------
+        CodeType
+            The script's code, magic-transformed if `runner.magicEnabled` is
+            set. Errors reading or compiling the script are raised.
+
+        """
+        stat = os.stat(script_path)
+        magic_enabled = config.get_option("runner.magicEnabled")
+        key = (stat.st_mtime_ns, stat.st_size, magic_enabled)
+
+        with self._lock:
+            entry = self._entries.get(script_path, None)
+            if entry is not None and entry[0] == key:
+                self._num_hits += 1
+                return entry[1]
+
+        with source_util.open_python_file(script_path) as f:
+            filebody = f.read()
+
+        code = None
+        disk_key = None
+        if config.get_option("global.persistScriptCache"):
+            disk_key = _get_disk_key(script_path, filebody, magic_enabled)
+            code = _read_from_disk_cache(disk_key)
+
+        with self._lock:
+            if code is not None:
+                self._num_disk_hits += 1
+            else:
+                self._num_misses += 1
+
+        if code is None:
+            code = _compile_script(script_path, filebody, magic_enabled)
+            if disk_key is not None:
+                _write_to_disk_cache(disk_key, code)
+
+        with self._lock:
+            self._entries[script_path] = (key, code)
+
+        return code
+
+    def invalidate(self, script_path):
+        """Forget the given script's code, e.g. because it changed on disk.
+        (Its mtime alone isn't always precise enough to tell.)"""
+        with self._lock:
+            self._entries.pop(script_path, None)
+
+    def clear(self):
+        """Forget all scripts' code."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        # type: () -> Dict[str, Any]
+        """Return a dict of statistics about the cache."""
+        with self._lock:
+            return {
+                "num_scripts": len(self._entries),
+                "hits": self._num_hits,
+                "disk_hits": self._num_disk_hits,
+                "misses": self._num_misses,
+            }
+
+
+def _compile_script(script_path, filebody, magic_enabled):
+    if magic_enabled:
+        filebody = magic.add_magic(filebody, script_path)
+
+    return compile(
+        filebody,
+        # Pass in the file path so it can show up in exceptions.
+        script_path,
+        # We're compiling entire blocks of Python, so we need "exec"
+        # mode (as opposed to "eval" or "single").
+        mode="exec",
+        # Don't inherit any flags or "future" statements.
+        flags=0,
+        dont_inherit=True,
+        # Parameter not supported in Python2:
+        # optimize=-1,
+    )
+
+
+def _get_disk_key(script_path, filebody, magic_enabled):
+    """Return the key of a script's code in the disk cache.
+
+    The path is part of the key because it's baked into the code, for
+    tracebacks. The Python bytecode version is too, because code objects
+    can't be loaded by other versions.
+    """
+    hasher = hashlib.new("md5")
+    hasher.update(importlib.util.MAGIC_NUMBER)
+    hasher.update(os.path.abspath(script_path).encode("utf-8"))
+    hasher.update(b"magic" if magic_enabled else b"nomagic")
+    hasher.update(filebody.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def _get_disk_cache_path(key):
+    return file_util.get_streamlit_file_path("script_cache", "%s.pyc" % key)
+
+
+def _read_from_disk_cache(key):
+    # type: (str) -> Optional[CodeType]
+    """Return the code with the given key from the disk cache, or None."""
+    path = _get_disk_cache_path(key)
+    try:
+        with file_util.streamlit_read(path, binary=True) as input:
+            code = marshal.load(input)
+    except FileNotFoundError:
+        return None
+    except (util.Error, EOFError, ValueError, TypeError, OSError) as e:
+        # A corrupt or partly-written file. It'll be overwritten.
+        LOGGER.debug("Unable to read %s from the script cache: %s", key, e)
+        return None
+
+    if not isinstance(code, CodeType):
+        return None
+
+    LOGGER.debug("Script cache disk HIT: %s", key)
+    return code
+
+
+def _write_to_disk_cache(key, code):
+    path = _get_disk_cache_path(key)
+    try:
+        with file_util.streamlit_write(path, binary=True) as output:
+            marshal.dump(code, output)
+    except (util.Error, OSError) as e:
+        LOGGER.debug("Unable to write %s to the script cache: %s", key, e)
+        # Clean up file so we don't leave a partly-written file.
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+script_cache = ScriptCache()
@@ -14,9 +14,10 @@
 
 import threading
 from collections import deque
-from collections import namedtuple
 from enum import Enum
+from typing import NamedTuple, Optional
 
+from streamlit.proto.Widget_pb2 import WidgetStates
 from streamlit.widgets import coalesce_widget_states
 
 
@@ -29,15 +30,16 @@ class ScriptRequest(Enum):
     SHUTDOWN = "SHUTDOWN"
 
 
-# Data attached to RERUN requests
-RerunData = namedtuple(
-    "RerunData",
-    [
-        # WidgetStates protobuf to run the script with. If this is None, the
-        # widget_state from the most recent run of the script will be used instead.
-        "widget_state"
-    ],
-)
+class RerunData(NamedTuple):
+    """Data attached to RERUN requests."""
+
+    # WidgetStates protobuf to run the script with. If this is None, the
+    # widget_state from the most recent run of the script will be used instead.
+    widget_state: Optional[WidgetStates]
+
+    # True if the rerun was requested by the user, rather than e.g. by a
+    # source file changing. Interactive reruns are scheduled first.
+    is_interactive: bool = True
 
 
 class ScriptRequestQueue(object):
@@ -83,37 +85,63 @@ class ScriptRequestQueue(object):
                 index = _index_if(self._queue, lambda item: item[0] == request)
                 if index >= 0:
                     _, old_data = self._queue[index]
-
-                    if old_data.widget_state is None:
-                        # The existing request's widget_state is None, which
-                        # means it wants to rerun with whatever the most
-                        # recent script execution's widget state was.
-                        # We have no meaningful state to merge with, and
-                        # so we simply overwrite the existing request.
-                        self._queue[index] = (
-                            request,
-                            RerunData(widget_state=data.widget_state),
-                        )
-                    elif data.widget_state is None:
-                        # If this request's widget_state is None, and the
-                        # existing request's widget_state was not, this
-                        # new request is entirely redundant and can be dropped.
-                        pass
-                    else:
-                        # Both the existing and the new request have
-                        # non-null widget_states. Merge them together.
-                        coalesced_state = coalesce_widget_states(
-                            old_data.widget_state, data.widget_state
-                        )
-                        self._queue[index] = (
-                            request,
-                            RerunData(widget_state=coalesced_state),
-                        )
+                    self._queue[index] = (request, coalesce_rerun_data(old_data, data))
                 else:
                     self._queue.append((request, data))
             else:
                 self._queue.append((request, data))
 
+    def contains(self, request):
+        """True if the queue has at least one request of the given type.
+
+        Parameters
+        ----------
+        request : ScriptRequest
+
+        """
+        with self._lock:
+            return _index_if(self._queue, lambda item: item[0] == request) >= 0
+
+    def peek_rerun_data(self):
+        """Return the data of the pending RERUN request without removing it,
+        or None if there is no such request.
+
+        Returns
+        -------
+        RerunData | None
+
+        """
+        with self._lock:
+            index = _index_if(self._queue, lambda item: item[0] == ScriptRequest.RERUN)
+            return self._queue[index][1] if index >= 0 else None
+
+    def coalesce_rerun(self, data):
+        """Remove the pending RERUN request, if any, and coalesce it onto the
+        given RerunData.
+
+        A ScriptRunner that is about to run the script with the given data
+        calls this, so that reruns requested in the meantime supersede it
+        instead of running after it.
+
+        Parameters
+        ----------
+        data : RerunData
+
+        Returns
+        -------
+        RerunData
+            The data to run the script with.
+
+        """
+        with self._lock:
+            index = _index_if(self._queue, lambda item: item[0] == ScriptRequest.RERUN)
+            if index < 0:
+                return data
+
+            _, new_data = self._queue[index]
+            del self._queue[index]
+            return coalesce_rerun_data(data, new_data)
+
     def dequeue(self):
         """Pops the front-most request from the queue and returns it.
 
@@ -130,6 +158,44 @@ class ScriptRequestQueue(object):
                 return None, None
 
 
+def coalesce_rerun_data(old_data, new_data):
+    """Combine two RerunDatas into the data for a single rerun.
+
+    Parameters
+    ----------
+    old_data : RerunData
+    new_data : RerunData
+        The data of the more recent request.
+
+    Returns
+    -------
+    RerunData
+
+    """
+    is_interactive = old_data.is_interactive or new_data.is_interactive
+
+    if old_data.widget_state is None:
+        # The existing request's widget_state is None, which
+        # means it wants to rerun with whatever the most
+        # recent script execution's widget state was.
+        # We have no meaningful state to merge with, and
+        # so we simply use the new request's state.
+        widget_state = new_data.widget_state
+    elif new_data.widget_state is None:
+        # If the new request's widget_state is None, and the
+        # existing request's widget_state was not, the new
+        # request's state is entirely redundant and can be dropped.
+        widget_state = old_data.widget_state
+    else:
+        # Both the existing and the new request have
+        # non-null widget_states. Merge them together.
+        widget_state = coalesce_widget_states(
+            old_data.widget_state, new_data.widget_state
+        )
+
+    return RerunData(widget_state=widget_state, is_interactive=is_interactive)
+
+
 def _index_if(collection, pred):
     """Find the index of the first item in a collection for which a predicate is true.
 
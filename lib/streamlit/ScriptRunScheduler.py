@@ -0,0 +1,186 @@
+# Copyright 2018-2020 Streamlit Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import itertools
+import threading
+import time
+from typing import Any, Deque, Dict
+
+from streamlit import config
+from streamlit import metrics
+from streamlit.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+
+class ScriptRunTicket(object):
+    """A ScriptRunner's place in the ScriptRunScheduler's queue."""
+
+    def __init__(self, session_id, is_interactive, seq):
+        self.session_id = session_id
+        self.is_interactive = is_interactive
+        self.seq = seq
+        self.is_admitted = False
+        self.is_released = False
+        self.requested_at = time.monotonic()
+        self._event = threading.Event()
+
+    def wait(self):
+        """Block until the run is admitted, or until wake() is called.
+
+        Returns
+        -------
+        bool
+            True if the run was admitted.
+
+        """
+        self._event.wait()
+        self._event.clear()
+        return self.is_admitted
+
+    def wake(self):
+        """Wake up wait() without admitting the run, so the waiting thread
+        can check whether the run is still wanted."""
+        self._event.set()
+
+    def _admit(self):
+        self.is_admitted = True
+        self._event.set()
+
+
+class ScriptRunScheduler(object):
+    """Caps the number of scripts that run at once across all sessions.
+
+    Before running its script, a ScriptRunner asks for a ticket and waits for
+    it to be admitted. At most `global.maxConcurrentScriptRuns` runs are
+    admitted at a time; the rest are queued, interactive reruns first, and
+    otherwise first-come first-served. (Each session has at most one
+    ScriptRunner, and so at most one queued run, which keeps the queue fair
+    between sessions.)
+    """
+
+    def __init__(self):
+        # Waiting tickets, in the order they will be admitted.
+        self._interactive = collections.deque()  # type: Deque[ScriptRunTicket]
+        self._background = collections.deque()  # type: Deque[ScriptRunTicket]
+        self._num_running = 0
+        self._num_admitted = 0
+        self._total_wait_time = 0.0
+        self._seq = itertools.count()
+
+        # Protects all of the above.
+        self._lock = threading.Lock()
+
+    def request_run(self, session_id, is_interactive):
+        """Queue up a script run.
+
+        Parameters
+        ----------
+        session_id : str
+            The ID of the session whose script will run.
+        is_interactive : bool
+            True if the run was requested by the user.
+
+        Returns
+        -------
+        ScriptRunTicket
+            Wait on this until it's admitted, and then release() it when the
+            run is done.
+
+        """
+        with self._lock:
+            ticket = ScriptRunTicket(session_id, is_interactive, next(self._seq))
+            self._queue_for(ticket).append(ticket)
+            self._admit_waiting_runs()
+        return ticket
+
+    def promote(self, ticket):
+        """Move a waiting ticket to the interactive queue, because an
+        interactive rerun superseded the run it was waiting for."""
+        with self._lock:
+            if ticket.is_admitted or ticket.is_released or ticket.is_interactive:
+                return
+
+            self._background.remove(ticket)
+            ticket.is_interactive = True
+            # Keep the interactive queue in request order.
+            index = next(
+                (
+                    i
+                    for i, other in enumerate(self._interactive)
+                    if other.seq > ticket.seq
+                ),
+                len(self._interactive),
+            )
+            self._interactive.insert(index, ticket)
+
+    def release(self, ticket):
+        """Give up a ticket: either its run is done, or it's no longer
+        wanted. Releasing a ticket more than once is a no-op."""
+        with self._lock:
+            if ticket.is_released:
+                return
+            ticket.is_released = True
+
+            if ticket.is_admitted:
+                self._num_running -= 1
+            else:
+                self._queue_for(ticket).remove(ticket)
+
+            self._admit_waiting_runs()
+
+    def get_stats(self):
+        # type: () -> Dict[str, Any]
+        """Return a dict of statistics about the scheduled runs."""
+        with self._lock:
+            return {
+                "num_running": self._num_running,
+                "num_waiting": len(self._interactive) + len(self._background),
+                "max_running": config.get_option("global.maxConcurrentScriptRuns"),
+                "num_admitted": self._num_admitted,
+                "mean_wait_time": (
+                    self._total_wait_time / self._num_admitted
+                    if self._num_admitted > 0
+                    else 0.0
+                ),
+            }
+
+    def _queue_for(self, ticket):
+        return self._interactive if ticket.is_interactive else self._background
+
+    def _admit_waiting_runs(self):
+        max_running = config.get_option("global.maxConcurrentScriptRuns")
+
+        while self._interactive or self._background:
+            if max_running > 0 and self._num_running >= max_running:
+                break
+
+            ticket = (self._interactive or self._background).popleft()
+            wait_time = time.monotonic() - ticket.requested_at
+            self._num_running += 1
+            self._num_admitted += 1
+            self._total_wait_time += wait_time
+            ticket._admit()
+
+            metrics.Client.get("streamlit_script_run_wait_seconds").labels(
+                "interactive" if ticket.is_interactive else "background"
+            ).observe(wait_time)
+
+        metrics.Client.get("streamlit_script_run_queue_depth").set(
+            len(self._interactive) + len(self._background)
+        )
+
+
+script_run_scheduler = ScriptRunScheduler()
@@ -12,25 +12,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import ctypes
 import sys
 import threading
+import time
 from contextlib import contextmanager
 from enum import Enum
 
 from blinker import Signal
 
 from streamlit import config
-from streamlit import magic
-from streamlit import source_util
-from streamlit.MediaFileManager import media_file_manager
-from streamlit.ReportThread import ReportThread
+from streamlit import metrics
+from streamlit.MediaFileManager import get_media_file_manager
+from streamlit.ReportThread import ReportContext
+from streamlit.ReportThread import _WidgetIDSet
 from streamlit.ReportThread import get_report_ctx
+from streamlit.ReportThread import report_thread_pool
+from streamlit.ScriptCache import script_cache
 from streamlit.ScriptRequestQueue import ScriptRequest
+from streamlit.ScriptRunScheduler import script_run_scheduler
 from streamlit.logger import get_logger
 from streamlit.widgets import Widgets
 
 LOGGER = get_logger(__name__)
 
+# How long, in seconds, to wait for a pending interrupt to go off after the
+# script is done, before deciding that the script swallowed it, and how often
+# to check for it in the meantime.
+AWAIT_INTERRUPT_TIMEOUT = 0.01
+AWAIT_INTERRUPT_POLL_INTERVAL = 0.001
+
 
 class ScriptRunnerEvent(Enum):
     # The script started running.
@@ -57,6 +68,7 @@ class ScriptRunner(object):
         widget_states,
         request_queue,
         uploaded_file_mgr=None,
+        media_file_mgr=None,
     ):
         """Initialize the ScriptRunner.
 
@@ -81,12 +93,17 @@ class ScriptRunner(object):
         uploaded_file_mgr : UploadedFileManager
             The File manager to store the data uploaded by the file_uploader widget.
 
+        media_file_mgr : MediaFileManager or None
+            The manager to add the script's media files to. Defaults to the
+            global media_file_manager.
+
         """
         self._session_id = session_id
         self._report = report
         self._enqueue_forward_msg = enqueue_forward_msg
         self._request_queue = request_queue
         self._uploaded_file_mgr = uploaded_file_mgr
+        self._media_file_mgr = media_file_mgr
 
         self._widgets = Widgets()
         self._widgets.set_state(widget_states)
@@ -118,11 +135,31 @@ class ScriptRunner(object):
         # maybe_handle_execution_control_request.
         self._execing = False
 
+        # Set while an AsyncInterruptException is pending in the script
+        # thread. See _interrupt_script().
+        self._interrupt_pending = False
+
+        # Protects _execing and _interrupt_pending, so that we only interrupt
+        # the script thread while it's executing the script.
+        self._interrupt_lock = threading.Lock()
+
+        # Set by _handle_interrupt once a pending AsyncInterruptException has
+        # gone off. See _await_interrupt().
+        self._interrupt_handled = threading.Event()
+
         # This is initialized in start()
         self._script_thread = None
 
+        # Set when _process_request_queue is done, and our thread has moved
+        # on (it may go on to run another ScriptRunner).
+        self._finished = threading.Event()
+
+        # Our place in the ScriptRunScheduler's queue, while we're waiting to
+        # run the script or running it.
+        self._run_ticket = None
+
     def start(self):
-        """Start a new thread to process the ScriptEventQueue.
+        """Start processing the ScriptEventQueue on a pooled script thread.
 
         This must be called only once.
 
@@ -130,24 +167,36 @@ class ScriptRunner(object):
         if self._script_thread is not None:
             raise Exception("ScriptRunner was already started")
 
-        self._script_thread = ReportThread(
+        ctx = ReportContext(
             session_id=self._session_id,
             enqueue=self._enqueue_forward_msg,
             widgets=self._widgets,
+            widget_ids_this_run=_WidgetIDSet(),
             uploaded_file_mgr=self._uploaded_file_mgr,
-            target=self._process_request_queue,
-            name="ScriptRunner.scriptThread",
+            media_file_mgr=self._media_file_mgr,
+        )
+        self._script_thread = report_thread_pool.submit(
+            ctx, self._process_request_queue, name="ScriptRunner.scriptThread"
         )
-        self._script_thread.start()
 
     def _process_request_queue(self):
         """Process the ScriptRequestQueue and then exits.
 
-        This is run in a separate thread.
+        This is run on a pooled script thread, which moves on to other work
+        once we return.
 
         """
         LOGGER.debug("Beginning script thread")
 
+        # We may start running before report_thread_pool.submit() returns.
+        self._script_thread = threading.current_thread()
+
+        try:
+            self._process_requests()
+        finally:
+            self._finished.set()
+
+    def _process_requests(self):
         while not self._shutdown_requested and self._request_queue.has_request:
             request, data = self._request_queue.dequeue()
             if request == ScriptRequest.STOP:
@@ -156,7 +205,13 @@ class ScriptRunner(object):
                 LOGGER.debug("Shutting down")
                 self._shutdown_requested = True
             elif request == ScriptRequest.RERUN:
-                self._run_script(data)
+                rerun_data = self._wait_for_run_slot(data)
+                if rerun_data is not None:
+                    try:
+                        self._run_script(rerun_data)
+                    finally:
+                        script_run_scheduler.release(self._run_ticket)
+                        self._run_ticket = None
             else:
                 raise RuntimeError("Unrecognized ScriptRequest: %s" % request)
 
@@ -168,9 +223,112 @@ class ScriptRunner(object):
             ScriptRunnerEvent.SHUTDOWN, widget_states=self._widgets.get_state()
         )
 
+    def on_request_enqueued(self):
+        """Called after a new ScriptRequest is enqueued, so that we can
+        reconsider our queued run if we're waiting for the scheduler.
+
+        This is called on the main thread.
+        """
+        run_ticket = self._run_ticket
+        if run_ticket is not None:
+            run_ticket.wake()
+
+        if config.get_option("runner.asyncInterrupts"):
+            self._interrupt_script()
+
+    def _interrupt_script(self):
+        """If the script is executing, raise an AsyncInterruptException in
+        the script thread, so that it handles the new request right away.
+
+        Unlike the tracer, this has no cost while the script runs. The
+        exception is raised once the thread next executes Python bytecode, so
+        a blocking call (e.g. time.sleep()) finishes first.
+        """
+        with self._interrupt_lock:
+            if not self._execing or self._interrupt_pending:
+                return
+
+            self._interrupt_handled.clear()
+            if _set_async_exc(self._script_thread, AsyncInterruptException):
+                LOGGER.debug("Interrupting script")
+                self._interrupt_pending = True
+
+    def _await_interrupt(self):
+        """Wait for a pending AsyncInterruptException to go off, once the
+        script is done executing, so that it doesn't go off later.
+
+        (A pending async exception could also be cleared, but in some
+        versions of CPython that leaves the interpreter checking for it
+        forever, which hangs traced code.)
+        """
+        # The exception goes off once the thread next checks for it, and
+        # _handle_interrupt then sets the event. If that doesn't happen in
+        # time, the script most likely swallowed it. (With the tracer
+        # installed, it may instead go off as soon as we return, where it's
+        # handled like any other interrupt.)
+        deadline = time.monotonic() + AWAIT_INTERRUPT_TIMEOUT
+        while time.monotonic() < deadline:
+            if self._interrupt_handled.wait(AWAIT_INTERRUPT_POLL_INTERVAL):
+                return
+
+        # The script already caught and swallowed it (e.g. with a bare
+        # except).
+        LOGGER.debug("Interrupt was swallowed by the script")
+        with self._interrupt_lock:
+            self._interrupt_pending = False
+
+    def _wait_for_run_slot(self, rerun_data):
+        """Wait until the ScriptRunScheduler lets us run the script.
+
+        Reruns requested while we wait supersede the given one, and a STOP
+        or SHUTDOWN request cancels it.
+
+        Parameters
+        ----------
+        rerun_data : RerunData
+            The data of the rerun we want to run.
+
+        Returns
+        -------
+        RerunData | None
+            The data to run the script with, or None if the run was cancelled.
+
+        """
+        self._run_ticket = script_run_scheduler.request_run(
+            self._session_id, rerun_data.is_interactive
+        )
+
+        while True:
+            is_admitted = self._run_ticket.wait()
+
+            if self._request_queue.contains(
+                ScriptRequest.STOP
+            ) or self._request_queue.contains(ScriptRequest.SHUTDOWN):
+                LOGGER.debug("Cancelling queued script run")
+                script_run_scheduler.release(self._run_ticket)
+                self._run_ticket = None
+                return None
+
+            if is_admitted:
+                break
+
+            pending_data = self._request_queue.peek_rerun_data()
+            if pending_data is not None and pending_data.is_interactive:
+                script_run_scheduler.promote(self._run_ticket)
+
+        if self._request_queue.peek_rerun_data() is not None:
+            LOGGER.debug("Queued script run superseded by a newer rerun")
+            metrics.Client.get("streamlit_script_runs_superseded_total").inc()
+            rerun_data = self._request_queue.coalesce_rerun(rerun_data)
+
+        return rerun_data
+
     def _is_in_script_thread(self):
         """True if the calling function is running in the script thread"""
-        return self._script_thread == threading.current_thread()
+        return (
+            self._script_thread == threading.current_thread()
+            and not self._finished.is_set()
+        )
 
     def maybe_handle_execution_control_request(self):
         if not self._is_in_script_thread():
@@ -207,6 +365,10 @@ class ScriptRunner(object):
         """Install function that runs before each line of the script."""
 
         def trace_calls(frame, event, arg):
+            # Don't trace our own bookkeeping (e.g. _set_execing_flag), which
+            # must not be interrupted halfway through.
+            if frame.f_code.co_filename == __file__:
+                return None
             self.maybe_handle_execution_control_request()
             return trace_calls
 
@@ -223,11 +385,16 @@ class ScriptRunner(object):
         """
         if self._execing:
             raise RuntimeError("Nested set_execing_flag call")
-        self._execing = True
+        with self._interrupt_lock:
+            self._execing = True
         try:
             yield
         finally:
-            self._execing = False
+            with self._interrupt_lock:
+                self._execing = False
+                interrupt_pending = self._interrupt_pending
+            if interrupt_pending:
+                self._await_interrupt()
 
     def _run_script(self, rerun_data):
         """Run our script.
@@ -243,38 +410,17 @@ class ScriptRunner(object):
         LOGGER.debug("Running script %s", rerun_data)
 
         # Reset DeltaGenerators, widgets, media files.
-        media_file_manager.clear_session_files()
+        get_media_file_manager().clear_session_files()
         get_report_ctx().reset()
 
         self.on_event.send(ScriptRunnerEvent.SCRIPT_STARTED)
+        start_time = time.perf_counter()
 
         # Compile the script. Any errors thrown here will be surfaced
         # to the user via a modal dialog in the frontend, and won't result
         # in their previous report disappearing.
         try:
-            # Python 3 got rid of the native execfile() command, so we read
-            # the file, compile it, and exec() it. This implementation is
-            # compatible with both 2 and 3.
-
-            with source_util.open_python_file(self._report.script_path) as f:
-                filebody = f.read()
-
-            if config.get_option("runner.magicEnabled"):
-                filebody = magic.add_magic(filebody, self._report.script_path)
-
-            code = compile(
-                filebody,
-                # Pass in the file path so it can show up in exceptions.
-                self._report.script_path,
-                # We're compiling entire blocks of Python, so we need "exec"
-                # mode (as opposed to "eval" or "single").
-                mode="exec",
-                # Don't inherit any flags or "future" statements.
-                flags=0,
-                dont_inherit=1,
-                # Parameter not supported in Python2:
-                # optimize=-1,
-            )
+            code = script_cache.get_code(self._report.script_path)
 
         except BaseException as e:
             # We got a compile error. Send an error event and bail immediately.
@@ -282,6 +428,7 @@ class ScriptRunner(object):
             self.on_event.send(
                 ScriptRunnerEvent.SCRIPT_STOPPED_WITH_COMPILE_ERROR, exception=e
             )
+            _observe_run_duration(start_time, "compile_error")
             return
 
         # If we get here, we've successfully compiled our script. The next step
@@ -299,6 +446,9 @@ class ScriptRunner(object):
         # is interrupted by a RerunException.
         rerun_with_data = None
 
+        # How the run ended, for metrics.
+        outcome = "success"
+
         try:
             # Create fake module. This gives us a name global namespace to
             # execute the code in.
@@ -321,13 +471,19 @@ class ScriptRunner(object):
             with modified_sys_path(self._report), self._set_execing_flag():
                 exec(code, module.__dict__)
 
+        except AsyncInterruptException as e:
+            rerun_with_data = self._handle_interrupt(e)
+            outcome = "stopped" if rerun_with_data is None else "rerun"
+
         except RerunException as e:
             rerun_with_data = e.rerun_data
+            outcome = "rerun"
 
         except StopException:
-            pass
+            outcome = "stopped"
 
         except BaseException as e:
+            outcome = "error"
             # Show exceptions in the Streamlit report.
             LOGGER.debug(e)
             import streamlit as st
@@ -338,6 +494,7 @@ class ScriptRunner(object):
 
         finally:
             self._widgets.reset_triggers()
+            _observe_run_duration(start_time, outcome)
             self.on_event.send(ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS)
 
         # Use _log_if_error() to make sure we never ever ever stop running the
@@ -347,6 +504,38 @@ class ScriptRunner(object):
         if rerun_with_data is not None:
             self._run_script(rerun_with_data)
 
+    def _handle_interrupt(self, e):
+        """Handle the request that an AsyncInterruptException was raised for.
+
+        Returns
+        -------
+        RerunData | None
+            The data to rerun the script with, if it was interrupted by a
+            RERUN request.
+
+        """
+        # The interrupt may have gone off anywhere while the script was
+        # executing, including in _set_execing_flag.
+        with self._interrupt_lock:
+            self._execing = False
+            self._interrupt_pending = False
+        self._interrupt_handled.set()
+
+        request, data = self._request_queue.dequeue()
+        if request is None:
+            # maybe_handle_execution_control_request already took the
+            # request, and the interrupt went off while we were stopping.
+            if isinstance(e.__context__, RerunException):
+                return e.__context__.rerun_data
+            return None
+
+        LOGGER.debug("Interrupted by ScriptRequest: %s", request)
+        if request == ScriptRequest.SHUTDOWN:
+            self._shutdown_requested = True
+        elif request == ScriptRequest.RERUN:
+            return data
+        return None
+
 
 class ScriptControlException(BaseException):
     """Base exception for ScriptRunner."""
@@ -374,6 +563,42 @@ class RerunException(ScriptControlException):
         self.rerun_data = rerun_data
 
 
+class AsyncInterruptException(ScriptControlException):
+    """Raised in the script thread when a request comes in while the script
+    is executing. The ScriptRunner then handles the request."""
+
+    pass
+
+
+def _observe_run_duration(start_time, outcome):
+    """Record how long a script run took, and how it ended."""
+    metrics.Client.get("streamlit_script_run_duration_seconds").labels(outcome).observe(
+        time.perf_counter() - start_time
+    )
+
+
+def _set_async_exc(thread, exc_type):
+    """Raise an exception of the given type in the given thread, the next
+    time it executes Python bytecode.
+
+    Returns
+    -------
+    bool
+        False if this isn't supported by the Python interpreter.
+
+    """
+    # Python interpreters other than CPython may not have this.
+    if not hasattr(ctypes, "pythonapi") or not hasattr(
+        ctypes.pythonapi, "PyThreadState_SetAsyncExc"
+    ):
+        return False
+
+    num_set = ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread.ident), ctypes.py_object(exc_type)
+    )
+    return num_set == 1
+
+
 def _clean_problem_modules():
     """Some modules are stateful, so we have to clear their state."""
 
@@ -12,16 +12,218 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import io
+import mmap
 import threading
+from typing import Any
 from typing import Dict
 from typing import List
 from typing import NamedTuple
+from typing import Optional
 from typing import Tuple
 
 from blinker import Signal
 
-# An uploaded file's data and metadata
-UploadedFile = NamedTuple("UploadedFile", [("name", str), ("data", bytes)])
+from streamlit import config
+from streamlit import metrics
+from streamlit.logger import get_logger
+from streamlit.string_util import is_binary_string
+
+LOGGER = get_logger(__name__)
+
+# Size of the chunks in which UploadedFile.is_binary() scans a file.
+_SCAN_CHUNK_SIZE = 64 * 1024
+
+
+class UploadedFile(io.BufferedIOBase):
+    """A file uploaded by a user.
+
+    This is a read-only binary file-like object, so it can be passed anywhere
+    a file is expected. Its data is read lazily from the underlying file,
+    which may be an in-memory buffer or, for large uploads, a temporary file
+    on disk.
+
+    Scripts get views of the file (see view()), rather than the file itself,
+    so that closing or reading from one doesn't affect another.
+
+    Parameters
+    ----------
+    name : str
+        The file's name, as given by the user's browser.
+    data : bytes or file
+        The file's data. Either bytes, or a seekable binary file object that
+        the UploadedFile will take ownership of.
+
+    """
+
+    def __init__(self, name, data):
+        super(UploadedFile, self).__init__()
+        self.name = name
+
+        if isinstance(data, bytes):
+            data = io.BytesIO(data)
+        self._file = data
+        self._file.seek(0, io.SEEK_END)
+        self._size = self._file.tell()
+        self._file.seek(0)
+
+        # The memory map of a file on disk, created on first use.
+        self._mmap = None  # type: Optional[mmap.mmap]
+
+    def __repr__(self):
+        return "UploadedFile(name=%r, size=%s)" % (self.name, self._size)
+
+    @property
+    def size(self):
+        """The size of the file's data, in bytes."""
+        return self._size
+
+    @property
+    def path(self):
+        """The path of the temporary file that holds the data, or None if
+        the data is in memory or the file has no name on disk."""
+        path = getattr(self._file, "name", None)
+        return path if isinstance(path, str) else None
+
+    @property
+    def data(self):
+        """The file's full data, as bytes."""
+        return self.getvalue()
+
+    def getvalue(self):
+        """Return the file's full data, as bytes. Like BytesIO.getvalue(),
+        this doesn't change the file's position."""
+        if isinstance(self._file, io.BytesIO):
+            return self._file.getvalue()
+
+        with self.getbuffer() as buf:
+            return bytes(buf)
+
+    def getbuffer(self):
+        """Return a read-only memoryview of the file's data.
+
+        If the data lives on disk it is memory-mapped, rather than read into
+        memory. The mapping is shared by all the views of the file, and is
+        released when the file is closed.
+        """
+        if isinstance(self._file, io.BytesIO):
+            return self._file.getbuffer().toreadonly()
+
+        if isinstance(self._file, _BufferReader):
+            return memoryview(self._file.buffer)
+
+        if self._size == 0:
+            return memoryview(b"")
+
+        if self._mmap is None:
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def view(self):
+        """Return a new read-only view of the file.
+
+        The view shares this file's data, without copying it, but has its own
+        position, and can be closed without closing this file.
+        """
+        return UploadedFile(self.name, _BufferReader(self.getbuffer()))
+
+    def is_binary(self):
+        """Guess whether the file's data is binary, rather than text.
+
+        The data is scanned in chunks, so a binary file is usually detected
+        without reading all of it.
+        """
+        with self.getbuffer() as buf:
+            for start in range(0, len(buf), _SCAN_CHUNK_SIZE):
+                if is_binary_string(bytes(buf[start : start + _SCAN_CHUNK_SIZE])):
+                    return True
+        return False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def read1(self, size=-1):
+        return self._file.read(size)
+
+    def readinto(self, b):
+        return self._file.readinto(b)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A view is still using it. It'll be unmapped when the last
+                # view is garbage-collected.
+                pass
+            self._mmap = None
+
+        try:
+            self._file.close()
+        except BufferError:
+            # Ditto, for in-memory data.
+            pass
+        super(UploadedFile, self).close()
+
+
+class _BufferReader(io.RawIOBase):
+    """A read-only, seekable file over a memoryview."""
+
+    def __init__(self, buffer):
+        super(_BufferReader, self).__init__()
+        self.buffer = buffer
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.buffer[self._pos : self._pos + len(b)]
+        n = len(data)
+        b[:n] = data
+        self._pos += n
+        return n
+
+    def readall(self):
+        data = bytes(self.buffer[self._pos :])
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self.buffer)
+        if offset < 0:
+            raise ValueError("negative seek position %d" % offset)
+        self._pos = offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self.buffer.release()
+        super(_BufferReader, self).close()
+
 
 # A list of UploadedFiles, and associated ID
 _UploadedFileListBase = NamedTuple(
@@ -36,18 +238,65 @@ class UploadedFileList(_UploadedFileListBase):
         """The list's unique ID."""
         return self.session_id, self.widget_id
 
+    @property
+    def size(self):
+        """The total size of the list's files, in bytes."""
+        return sum(file.size for file in self.files)
+
+
+class UploadedFileQuotaError(Exception):
+    """Raised when a file list can't be added without going over an upload
+    quota."""
+
+    pass
+
 
 class UploadedFileManager(object):
     """Holds files uploaded by users of the running Streamlit app,
     and emits an event signal when a file is added.
+
+    To bound the storage used by uploads, each session's file lists may use
+    at most `global.maxSessionUploadedFilesSize` bytes, and all sessions'
+    lists together at most `global.maxUploadedFilesSize` bytes.
+
+    A list that would put its session over its quota is rejected. A list
+    that would put the manager over its quota evicts the least-recently-used
+    lists of sessions whose browser isn't connected, and is rejected if that
+    isn't enough. Lists of connected sessions are never evicted, since their
+    browsers still show the files.
+
+    Parameters
+    ----------
+    is_session_connected : callable or None
+        Called with a session ID, returns True if the session's browser is
+        connected. If None, every session is treated as connected, so no
+        lists are evicted.
+
     """
 
-    def __init__(self):
-        self._files_by_id = {}  # type: Dict[Tuple[str, str], UploadedFileList]
-        # Prevents concurrent access to the _files_by_id dict.
-        # In remove_session_files(), we iterate over the dict's keys. It's
-        # an error to mutate a dict while iterating; this lock prevents that.
+    def __init__(self, is_session_connected=None):
+        self._is_session_connected = is_session_connected
+
+        # File lists, from least- to most-recently used.
+        self._files_by_id = (
+            collections.OrderedDict()
+        )  # type: collections.OrderedDict[Tuple[str, str], UploadedFileList]
+
+        # Dict[session ID] -> widget IDs of that session's file lists, from
+        # least- to most-recently used, so that finding or removing a
+        # session's files doesn't require a scan.
+        self._widget_ids_by_session = (
+            {}
+        )  # type: Dict[str, collections.OrderedDict[str, None]]
+
+        self._total_size = 0
+        self._size_by_session = {}  # type: Dict[str, int]
+        self._num_evictions = 0
+        self._num_rejections = 0
+
+        # Protects all of the above.
         self._files_lock = threading.Lock()
+
         self.on_files_added = Signal(
             doc="""Emitted when a file list is added to the manager.
 
@@ -75,12 +324,42 @@ class UploadedFileManager(object):
         files : List[UploadedFile]
             The files to add.
 
+        Raises
+        ------
+        UploadedFileQuotaError
+            If the list doesn't fit within the upload quotas. The list isn't
+            added, and any list it would have replaced is kept.
+
         """
         file_list = UploadedFileList(
             session_id=session_id, widget_id=widget_id, files=files
         )
+        size = file_list.size
+
         with self._files_lock:
+            try:
+                self._make_room(file_list)
+            except UploadedFileQuotaError:
+                self._num_rejections += 1
+                _metric("streamlit_uploaded_file_rejections_total").inc()
+                raise
+
+            self._remove_files(file_list.id, keep=files)
+
             self._files_by_id[file_list.id] = file_list
+            self._widget_ids_by_session.setdefault(
+                session_id, collections.OrderedDict()
+            )[widget_id] = None
+            self._size_by_session[session_id] = (
+                self._size_by_session.get(session_id, 0) + size
+            )
+            self._total_size += size
+            total_size = self._total_size
+
+        _metric("streamlit_uploaded_files_total").inc(len(files))
+        _metric("streamlit_uploaded_bytes_total").inc(size)
+        _metric("streamlit_uploaded_files_bytes").set(total_size)
+
         self.on_files_added.send(file_list)
 
     def get_files(self, session_id, widget_id):
@@ -101,6 +380,9 @@ class UploadedFileManager(object):
         files_id = session_id, widget_id
         with self._files_lock:
             file_list = self._files_by_id.get(files_id, None)
+            if file_list is not None:
+                self._files_by_id.move_to_end(files_id)
+                self._widget_ids_by_session[session_id].move_to_end(widget_id)
         return file_list.files if file_list is not None else None
 
     def remove_files(self, session_id, widget_id):
@@ -115,7 +397,9 @@ class UploadedFileManager(object):
         """
         files_id = session_id, widget_id
         with self._files_lock:
-            self._files_by_id.pop(files_id, None)
+            self._remove_files(files_id)
+            total_size = self._total_size
+        _metric("streamlit_uploaded_files_bytes").set(total_size)
 
     def remove_session_files(self, session_id):
         """Remove all files that belong to the given report.
@@ -126,10 +410,125 @@ class UploadedFileManager(object):
             The session ID of the report whose files we're removing.
 
         """
-        # Copy the keys into a list, because we'll be mutating the dictionary.
         with self._files_lock:
-            all_ids = list(self._files_by_id.keys())
+            widget_ids = self._widget_ids_by_session.get(session_id, ())
+            for widget_id in list(widget_ids):
+                self._remove_files((session_id, widget_id))
+            total_size = self._total_size
+        _metric("streamlit_uploaded_files_bytes").set(total_size)
+
+    def get_session_files(self, session_id):
+        # type: (str) -> List[UploadedFileList]
+        """Return all file lists that belong to the given report.
+
+        Parameters
+        ----------
+        session_id : str
+            The session ID of the report whose files we're returning.
+
+        """
+        with self._files_lock:
+            widget_ids = self._widget_ids_by_session.get(session_id, ())
+            return [self._files_by_id[(session_id, w)] for w in widget_ids]
+
+    def get_session_size(self, session_id):
+        # type: (str) -> int
+        """Return the total size of the files stored for the given session,
+        in bytes."""
+        with self._files_lock:
+            return self._size_by_session.get(session_id, 0)
+
+    def get_stats(self):
+        # type: () -> Dict[str, Any]
+        """Return a dict of statistics about the files in the manager."""
+        with self._files_lock:
+            return {
+                "num_file_lists": len(self._files_by_id),
+                "num_sessions": len(self._widget_ids_by_session),
+                "total_size": self._total_size,
+                "max_size": config.get_option("global.maxUploadedFilesSize"),
+                "max_session_size": config.get_option(
+                    "global.maxSessionUploadedFilesSize"
+                ),
+                "evictions": self._num_evictions,
+                "rejections": self._num_rejections,
+            }
+
+    def _remove_files(self, files_id, keep=()):
+        """Remove the file list with the given ID, if it exists, and close
+        its files, except for those in `keep`. The caller must hold
+        _files_lock."""
+        file_list = self._files_by_id.pop(files_id, None)
+        if file_list is None:
+            return
+
+        for file in file_list.files:
+            if not any(file is kept for kept in keep):
+                file.close()
+
+        session_id, widget_id = files_id
+        widget_ids = self._widget_ids_by_session[session_id]
+        del widget_ids[widget_id]
+
+        size = file_list.size
+        self._total_size -= size
+        if widget_ids:
+            self._size_by_session[session_id] -= size
+        else:
+            del self._widget_ids_by_session[session_id]
+            del self._size_by_session[session_id]
+
+    def _make_room(self, new_list):
+        """Evict file lists until the new list fits within the upload
+        quotas, or raise UploadedFileQuotaError if it can't. (Nothing is
+        evicted then.) The caller must hold _files_lock."""
+        session_id = new_list.session_id
+        replaced_list = self._files_by_id.get(new_list.id, None)
+        replaced_size = replaced_list.size if replaced_list is not None else 0
+
+        max_session_size = config.get_option("global.maxSessionUploadedFilesSize")
+        session_size = (
+            self._size_by_session.get(session_id, 0) - replaced_size + new_list.size
+        )
+        if max_session_size > 0 and session_size > max_session_size:
+            raise UploadedFileQuotaError(
+                "Uploaded files would exceed the session's quota of %s bytes"
+                % max_session_size
+            )
+
+        max_size = config.get_option("global.maxUploadedFilesSize")
+        total_size = self._total_size - replaced_size + new_list.size
+        if max_size <= 0 or total_size <= max_size:
+            return
+
+        evicted_ids = []
+        for files_id, file_list in self._files_by_id.items():
+            if total_size <= max_size:
+                break
+            if files_id == new_list.id or self._is_connected(files_id[0]):
+                continue
+            evicted_ids.append(files_id)
+            total_size -= file_list.size
+
+        if total_size > max_size:
+            raise UploadedFileQuotaError(
+                "Uploaded files would exceed the server's quota of %s bytes" % max_size
+            )
+
+        for files_id in evicted_ids:
+            self._evict(files_id)
+
+    def _is_connected(self, session_id):
+        if self._is_session_connected is None:
+            return True
+        return self._is_session_connected(session_id)
+
+    def _evict(self, files_id):
+        LOGGER.debug("Evicting uploaded files %s", files_id)
+        self._remove_files(files_id)
+        self._num_evictions += 1
+        _metric("streamlit_uploaded_file_evictions_total").inc()
+
 
-        for files_id in all_ids:
-            if files_id[0] == session_id:
-                self.remove_files(*files_id)
+def _metric(name):
+    return metrics.Client.get(name)
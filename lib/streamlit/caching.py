@@ -33,6 +33,7 @@ from cachetools import TTLCache
 
 from streamlit import config
 from streamlit import file_util
+from streamlit import metrics
 from streamlit import util
 from streamlit.errors import StreamlitAPIWarning
 from streamlit.errors import StreamlitDeprecationWarning
@@ -317,22 +318,32 @@ def _read_from_cache(
     changed), we show a warning. If reading from memory fails, we either read
     from disk or rerun the code.
     """
+    lookups = metrics.Client.get("streamlit_cache_lookups_total")
     try:
-        return _read_from_mem_cache(
+        value = _read_from_mem_cache(
             mem_cache, key, allow_output_mutation, func_or_code, hash_funcs
         )
+        lookups.labels("memory_hit").inc()
+        return value
 
     except CachedObjectMutationError as e:
+        lookups.labels("memory_hit").inc()
         st.exception(CachedObjectMutationWarning(e))
         return e.cached_value
 
     except CacheKeyNotFoundError as e:
         if persist:
-            value = _read_from_disk_cache(key)
+            try:
+                value = _read_from_disk_cache(key)
+            except CacheKeyNotFoundError:
+                lookups.labels("miss").inc()
+                raise
+            lookups.labels("disk_hit").inc()
             _write_to_mem_cache(
                 mem_cache, key, value, allow_output_mutation, func_or_code, hash_funcs
             )
             return value
+        lookups.labels("miss").inc()
         raise e
 
 
@@ -294,6 +294,17 @@ _create_option(
     type_=float,
 )  # 10k
 
+_create_option(
+    "global.maxMessageCacheSize",
+    description="""Maximum total size, in bytes, of the ForwardMsgs held in
+        the server's message cache. When the cache grows past this size, the
+        least-recently-used messages are evicted. Set to 0 to disable the
+        limit.""",
+    visibility="hidden",
+    default_val=500 * 1e6,
+    type_=float,
+)  # 500MB
+
 _create_option(
     "global.maxCachedMessageAge",
     description="""Expire cached ForwardMsgs whose age is greater than this
@@ -304,6 +315,174 @@ _create_option(
     type_=int,
 )
 
+_create_option(
+    "global.maxConcurrentScriptRuns",
+    description="""Maximum number of scripts that run at once, across all
+        sessions. Other runs wait in a queue, with reruns requested by users
+        ahead of e.g. reruns caused by source file changes. Set to 0 to
+        disable the limit.
+
+        Note that a script that never finishes (e.g. one that loops forever
+        to animate a chart) holds on to its slot until it's stopped.""",
+    visibility="hidden",
+    default_val=0,
+    type_=int,
+)
+
+_create_option(
+    "global.numScriptProcesses",
+    description="""Number of worker processes that run scripts, so that
+        CPU-heavy scripts from different sessions run in parallel on
+        multiple cores. Set to 0 to run scripts on threads in the server
+        process instead.
+
+        Each worker has its own in-memory st.cache, so cached values are
+        only shared between runs on the same worker (sessions stick to the
+        worker that last ran them, when it's free). Use
+        st.cache(persist=True) to share values across workers.""",
+    visibility="hidden",
+    default_val=0,
+    type_=int,
+)
+
+_create_option(
+    "global.ioloopStallThresholdMs",
+    description="""Log what the server's event loop is doing when it's
+        blocked for longer than this many milliseconds, since that holds
+        up every session. Set to 0 to disable the check.""",
+    visibility="hidden",
+    default_val=500,
+    type_=int,
+)
+
+_create_option(
+    "global.persistScriptCache",
+    description="""Whether to also cache scripts' compiled code on disk
+        (in ~/.streamlit/script_cache), so that it survives server restarts
+        and is shared by script worker processes. Code is always cached in
+        memory.""",
+    visibility="hidden",
+    default_val=False,
+    type_=bool,
+)
+
+_create_option(
+    "global.numPreheatedSessions",
+    description="""How many sessions to keep running the script ahead of
+        time, so that newly-connected browsers are handed an
+        already-rendered report. When a browser takes a preheated session,
+        another one is started in the background once the previous one
+        has finished running (see global.preheatCpuBudget). Each of these
+        runs the script once more than browsers need, so this is off by
+        default: only one session is preheated, when the server starts,
+        and it isn't replaced once a browser takes it.""",
+    visibility="hidden",
+    default_val=0,
+    type_=int,
+)
+
+_create_option(
+    "global.preheatCpuBudget",
+    description="""Only start a new preheated session in the background
+        while the server is using less than this much CPU, as a fraction of
+        one core. Set to 0 to only ever preheat the first session, when the
+        server starts.""",
+    visibility="hidden",
+    default_val=0.5,
+    type_=float,
+)
+
+_create_option(
+    "global.sessionResumeGracePeriod",
+    description="""How long, in seconds, to keep a session alive after its
+        browser disconnects, so that the browser can resume it when it
+        reconnects instead of starting over in a new session. Set to 0 to
+        close sessions as soon as their browser disconnects.""",
+    visibility="hidden",
+    default_val=120.0,
+    type_=float,
+)
+
+_create_option(
+    "global.maxSessionReplaySize",
+    description="""Maximum total size, in bytes, of the messages kept for a
+        session so they can be replayed if its browser resumes it. When a
+        report's messages exceed this, the older ones are dropped, and a
+        browser that missed them gets a rerun of the script instead. Set to
+        0 to disable the limit.""",
+    visibility="hidden",
+    default_val=50 * 1e6,
+    type_=float,
+)  # 50MB
+
+_create_option(
+    "global.sessionIdleTimeout",
+    description="""How long, in seconds, a session can go without hearing
+        from its browser before it's hibernated: its report is dropped from
+        memory and its media files are moved to disk, keeping only what it
+        needs to rerun the script (its widget states and uploaded files).
+        The browser keeps showing the report, which is regenerated when the
+        user next interacts with it. Set to 0 to never hibernate idle sessions.""",
+    visibility="hidden",
+    default_val=0.0,
+    type_=float,
+)
+
+_create_option(
+    "global.maxSessionsMemorySize",
+    description="""Maximum total estimated memory, in bytes, used by all
+        sessions' reports, media files, uploaded files and message replay
+        buffers. When this is exceeded, the least-recently-active sessions
+        are hibernated (see global.sessionIdleTimeout) until it's no longer
+        exceeded. Set to 0 to disable the limit.""",
+    visibility="hidden",
+    default_val=0.0,
+    type_=float,
+)
+
+_create_option(
+    "global.maxUploadedFilesSize",
+    description="""Maximum total size, in bytes, of the uploaded files the
+        server stores across all sessions. When this would be exceeded, the
+        least-recently-used uploads of sessions whose browser isn't connected
+        are evicted. If that isn't enough, the new upload is rejected. Set to
+        0 to disable the limit.""",
+    visibility="hidden",
+    default_val=4000 * 1e6,
+    type_=float,
+)  # 4GB
+
+_create_option(
+    "global.maxSessionUploadedFilesSize",
+    description="""Maximum total size, in bytes, of the uploaded files the
+        server stores for a single session. Uploads that would exceed this
+        are rejected. Set to 0 to disable the limit.""",
+    visibility="hidden",
+    default_val=1000 * 1e6,
+    type_=float,
+)  # 1GB
+
+_create_option(
+    "global.maxMediaFileMemorySize",
+    description="""Maximum total size, in bytes, of the media files (images,
+        audio, video) the server keeps in memory. When this is exceeded, the
+        least-recently-used files are moved to a temporary directory on disk
+        and served from there. Set to 0 to disable the limit.""",
+    visibility="hidden",
+    default_val=200 * 1e6,
+    type_=float,
+)  # 200MB
+
+_create_option(
+    "global.mediaFileSpillSize",
+    description="""Media files at least this large, in bytes, are written to
+        a temporary directory on disk right away, rather than kept in
+        memory.""",
+    visibility="hidden",
+    default_val=10 * 1e6,
+    type_=float,
+)  # 10MB
+
 # Config Section: Client #
 
 _create_section("client", "Settings for scripts that use Streamlit.")
@@ -350,6 +529,33 @@ _create_option(
     type_=bool,
 )
 
+_create_option(
+    "runner.asyncInterrupts",
+    description="""
+        Stop or rerun your script as soon as you ask to, by raising an
+        exception in the thread running it, rather than the next time it
+        writes to the app. This doesn't slow down your script's execution,
+        but a blocking call (like time.sleep) finishes before the script
+        stops.
+        """,
+    default_val=False,
+    type_=bool,
+)
+
+_create_option(
+    "runner.rerunDebounceMs",
+    description="""
+        When widgets change while your script is running (e.g. while a
+        slider is dragged), wait up to this many milliseconds before
+        rerunning it, and then rerun it once with the latest widget values,
+        rather than restarting it on every change. Button clicks and reruns
+        while the script isn't running aren't delayed. Set to 0 to rerun on
+        every change.
+        """,
+    default_val=0,
+    type_=int,
+)
+
 _create_option(
     "runner.fixMatplotlib",
     description="""
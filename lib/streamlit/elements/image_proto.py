@@ -26,7 +26,7 @@ from streamlit.errors import StreamlitAPIException
 from streamlit.logger import get_logger
 from urllib.parse import urlparse
 
-from streamlit.MediaFileManager import media_file_manager
+from streamlit.MediaFileManager import get_media_file_manager
 
 LOGGER = get_logger(__name__)
 
@@ -95,6 +95,29 @@ def _verify_np_shape(array):
     return array
 
 
+def _get_resized_width(actual_width, width):
+    if width < 0 and actual_width > MAXIMUM_CONTENT_WIDTH:
+        return MAXIMUM_CONTENT_WIDTH
+    return width
+
+
+def _get_file_mimetype_if_servable(path, width, format):
+    """Return the mimetype to serve the image file at the given path with,
+    or None if the image needs to be resized first.
+
+    This only reads the image's header, so that files which don't need
+    resizing can be served straight from disk.
+    """
+    with Image.open(path) as image:
+        actual_width = image.size[0]
+
+    width = _get_resized_width(actual_width, width)
+    if width > 0 and actual_width > width:
+        return None
+
+    return "image/" + format.lower()
+
+
 def _normalize_to_bytes(data, width, format):
     format = format.lower()
     ext = imghdr.what(None, data)
@@ -106,9 +129,7 @@ def _normalize_to_bytes(data, width, format):
 
     image = Image.open(io.BytesIO(data))
     actual_width, actual_height = image.size
-
-    if width < 0 and actual_width > MAXIMUM_CONTENT_WIDTH:
-        width = MAXIMUM_CONTENT_WIDTH
+    width = _get_resized_width(actual_width, width)
 
     if width > 0:
         if actual_width > width:
@@ -227,6 +248,14 @@ def marshall_images(
                 pass
 
             # If not, see if it's a file. Allow OS filesystem errors to raise.
+            mimetype = _get_file_mimetype_if_servable(image, width, format)
+            if mimetype is not None:
+                this_file = get_media_file_manager().add_file(
+                    image, mimetype, "%s-%i" % (coordinates, coord_suffix)
+                )
+                proto_img.url = this_file.url
+                continue
+
             with open(image, "rb") as f:
                 data = f.read()
 
@@ -238,7 +267,7 @@ def marshall_images(
 
         # We use the index of the image in the input image list to identify this image inside
         # MediaFileManager. For this, we just add the index to the image's "coordinates".
-        this_file = media_file_manager.add(
+        this_file = get_media_file_manager().add(
             data, mimetype, "%s-%i" % (coordinates, coord_suffix)
         )
         proto_img.url = this_file.url
@@ -21,7 +21,7 @@ from validators import url
 
 from streamlit import type_util
 from streamlit.proto import Video_pb2
-from streamlit.MediaFileManager import media_file_manager
+from streamlit.MediaFileManager import get_media_file_manager
 
 
 # Regular expression explained at https://regexr.com/4n2l2 Covers any youtube
@@ -72,10 +72,9 @@ def _marshall_av_media(coordinates, proto, data, mimetype):
 
     if isinstance(data, str):
         # Assume it's a filename or blank.  Allow OS-based file errors.
-        with open(data, "rb") as fh:
-            this_file = media_file_manager.add(fh.read(), mimetype, coordinates)
-            proto.url = this_file.url
-            return
+        this_file = get_media_file_manager().add_file(data, mimetype, coordinates)
+        proto.url = this_file.url
+        return
 
     if data is None:
         # Allow empty values so media players can be shown without media.
@@ -95,7 +94,7 @@ def _marshall_av_media(coordinates, proto, data, mimetype):
     else:
         raise RuntimeError("Invalid binary data format: %s" % type(data))
 
-    this_file = media_file_manager.add(data, mimetype, coordinates)
+    this_file = get_media_file_manager().add(data, mimetype, coordinates)
     proto.url = this_file.url
 
 
@@ -57,6 +57,36 @@ def get_encoded_file_data(data, encoding="auto"):
     return io.BytesIO(data)
 
 
+def get_encoded_uploaded_file(file, encoding="auto"):
+    """Like get_encoded_file_data, but for an UploadedFile.
+
+    Binary files are returned as a new view of the UploadedFile, rather
+    than copied into a BytesIO, so that large uploads aren't read into
+    memory. Each call returns a separate view, so a script that closes or
+    reads from one doesn't affect the next rerun.
+
+    Parameters
+    ----------
+    file : UploadedFile
+    encoding : str
+
+    Returns
+    -------
+    UploadedFile or StringIO
+        If the file's data is in a well-known textual format (or if the
+        encoding parameter is set), return a StringIO. Otherwise, return a
+        view of the UploadedFile.
+
+    """
+    if encoding == "auto":
+        encoding = None if file.is_binary() else "utf-8"
+
+    if encoding:
+        return io.StringIO(file.getvalue().decode(encoding))
+
+    return file.view()
+
+
 @contextlib.contextmanager
 def streamlit_read(path, binary=False):
     """Opens a context to read this file relative to the streamlit path.
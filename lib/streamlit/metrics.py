@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from typing import Any, List, Tuple
+
 from streamlit import config
 from streamlit.logger import get_logger
 
@@ -37,6 +39,9 @@ class MockMetric(object):
     def set(self, *args, **kwargs):
         pass
 
+    def observe(self, *args, **kwargs):
+        pass
+
 
 class Client(object):
 
@@ -62,8 +67,29 @@ class Client(object):
         Client._singleton = self
 
         # yapf: disable
-        self._raw_metrics  = [
+        self._raw_metrics  = [  # type: List[Tuple[Any, ...]]
             ('Counter', 'streamlit_enqueue_deltas_total', 'Total deltas enqueued', ['type']),
+            ('Counter', 'streamlit_uploaded_files_total', 'Total files uploaded', []),
+            ('Counter', 'streamlit_uploaded_bytes_total', 'Total bytes uploaded', []),
+            ('Gauge', 'streamlit_uploaded_files_bytes', 'Size of the uploaded files currently stored', []),
+            ('Counter', 'streamlit_uploaded_file_evictions_total', 'Total uploaded file lists evicted to stay within quota', []),
+            ('Counter', 'streamlit_uploaded_file_rejections_total', 'Total uploaded file lists rejected for exceeding a quota', []),
+            ('Counter', 'streamlit_sessions_hibernated_total', 'Total sessions hibernated to free memory', ['reason']),
+            ('Gauge', 'streamlit_script_run_queue_depth', 'Script runs waiting for the scheduler to admit them', []),
+            ('Histogram', 'streamlit_script_run_wait_seconds', 'Time script runs waited for the scheduler to admit them', ['priority']),
+            ('Counter', 'streamlit_script_runs_superseded_total', 'Total queued script runs superseded by a newer rerun request', []),
+            ('Histogram', 'streamlit_ioloop_lag_seconds', 'How late the IOLoop ran a callback scheduled by the stall monitor', []),
+            ('Counter', 'streamlit_ioloop_stalls_total', 'Total times the IOLoop was blocked for longer than global.ioloopStallThresholdMs', []),
+            ('Counter', 'streamlit_script_reruns_debounced_total', 'Total widget rerun requests merged into a debounced rerun instead of restarting the script', []),
+            ('Gauge', 'streamlit_sessions', 'Sessions, by whether a browser is connected to them', ['state']),
+            ('Histogram', 'streamlit_script_run_duration_seconds', 'Time script runs took, by how they ended', ['outcome']),
+            ('Histogram', 'streamlit_rerun_first_delta_seconds', 'Time from a browser asking for a rerun to the first delta being sent to it', []),
+            ('Histogram', 'streamlit_session_queue_depth', 'Messages queued for a session each time its queue is flushed', [], {'buckets': (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)}),
+            ('Counter', 'streamlit_forward_msgs_sent_total', 'Total messages sent to browsers', ['type']),
+            ('Counter', 'streamlit_forward_msg_bytes_sent_total', 'Total bytes of messages sent to browsers', ['type']),
+            ('Counter', 'streamlit_message_cache_lookups_total', 'Total cacheable messages, by whether a reference to the cached message was sent instead', ['result']),
+            ('Gauge', 'streamlit_media_files_bytes', 'Size of the media files currently stored', ['storage']),
+            ('Counter', 'streamlit_cache_lookups_total', 'Total st.cache lookups, by where the value was found', ['result']),
         ]
         # yapf: enable
 
@@ -81,16 +107,17 @@ class Client(object):
                 )
             self.generate_latest = prometheus_client.generate_latest
 
-            existing_metrics = (
-                prometheus_client.registry.REGISTRY._names_to_collectors.keys()
-            )
+            existing_metrics = prometheus_client.registry.REGISTRY._names_to_collectors
 
-            for kind, metric, doc, labels in self._raw_metrics:
+            for kind, metric, doc, labels, *kwargs in self._raw_metrics:
                 if metric in existing_metrics:
+                    # Registered by an earlier call. Prometheus doesn't allow
+                    # a metric to be registered twice, so reuse it.
+                    self._metrics[metric] = existing_metrics[metric]
                     continue
                 p = getattr(prometheus_client, kind)
-                self._metrics[metric] = p(metric, doc, labels)
+                self._metrics[metric] = p(metric, doc, labels, **dict(*kwargs))
         else:
             self.generate_latest = lambda: ""
-            for _, metric, _, _ in self._raw_metrics:
+            for _, metric, *_ in self._raw_metrics:
                 self._metrics[metric] = MockMetric()
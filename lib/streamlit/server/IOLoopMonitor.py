@@ -0,0 +1,167 @@
+# Copyright 2018-2020 Streamlit Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Detects when the server's IOLoop is blocked."""
+
+import collections
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Counter, Dict, Optional
+
+from streamlit import metrics
+from streamlit.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+# How often the IOLoop checks in with the monitor.
+PROBE_INTERVAL_SECS = 0.1
+
+# How many stack samples to take of a single stall.
+MAX_STACK_SAMPLES = 10
+
+
+class IOLoopMonitor(object):
+    """Measures how late the IOLoop runs its callbacks, and logs what it's
+    doing when it's blocked.
+
+    Everything that runs on the IOLoop (e.g. serializing messages, or
+    updating the watched modules after a script run) holds up every
+    session while it runs. The monitor schedules a callback every
+    PROBE_INTERVAL_SECS, and records how late it runs in the
+    streamlit_ioloop_lag_seconds histogram. A separate thread samples the
+    IOLoop thread's stack while a callback is overdue by more than the
+    stall threshold, and logs the samples.
+    """
+
+    def __init__(self, ioloop, stall_threshold):
+        """Constructor.
+
+        Parameters
+        ----------
+        ioloop : tornado.ioloop.IOLoop
+            The IOLoop to monitor.
+
+        stall_threshold : float
+            How long, in seconds, the IOLoop must be blocked for before we
+            log it.
+
+        """
+        self._ioloop = ioloop
+        self._stall_threshold = stall_threshold
+
+        # These are set on the IOLoop thread, and read by the monitor thread.
+        self._ioloop_thread_id = None
+        self._next_probe_time = 0.0
+        self._last_lag = 0.0
+
+        self._probe_timeout = None
+        self._monitor_thread = None
+        self._stopped = threading.Event()
+
+        self._num_stalls = 0
+        self._max_lag = 0.0
+
+    def start(self):
+        """Start monitoring. This must be called on the IOLoop's thread."""
+        if self._monitor_thread is not None:
+            raise RuntimeError("IOLoopMonitor was already started")
+
+        self._ioloop_thread_id = threading.get_ident()
+        self._schedule_probe()
+
+        self._monitor_thread = threading.Thread(
+            target=self._monitor, name="IOLoopMonitor"
+        )
+        self._monitor_thread.daemon = True
+        self._monitor_thread.start()
+
+    def stop(self):
+        """Stop monitoring. This must be called on the IOLoop's thread."""
+        self._stopped.set()
+        if self._probe_timeout is not None:
+            self._ioloop.remove_timeout(self._probe_timeout)
+            self._probe_timeout = None
+
+    def get_stats(self):
+        # type: () -> Dict[str, Any]
+        """Return a dict of statistics about the IOLoop's lag."""
+        return {
+            "last_lag": self._last_lag,
+            "max_lag": self._max_lag,
+            "num_stalls": self._num_stalls,
+        }
+
+    def _schedule_probe(self):
+        self._next_probe_time = time.monotonic() + PROBE_INTERVAL_SECS
+        self._probe_timeout = self._ioloop.call_later(PROBE_INTERVAL_SECS, self._probe)
+
+    def _probe(self):
+        lag = max(0.0, time.monotonic() - self._next_probe_time)
+        self._last_lag = lag
+        self._max_lag = max(self._max_lag, lag)
+        metrics.Client.get("streamlit_ioloop_lag_seconds").observe(lag)
+
+        if not self._stopped.is_set():
+            self._schedule_probe()
+
+    def _monitor(self):
+        """Sample the IOLoop thread's stack while the probe is overdue."""
+        check_interval = max(self._stall_threshold / 2, 0.01)
+
+        # Stack samples of the current stall.
+        samples = collections.Counter()  # type: Counter[str]
+
+        while not self._stopped.wait(check_interval):
+            stalled_for = time.monotonic() - self._next_probe_time
+
+            if stalled_for >= self._stall_threshold:
+                if sum(samples.values()) >= MAX_STACK_SAMPLES:
+                    continue
+
+                sample = self._sample_ioloop_stack()
+                if len(samples) == 0:
+                    LOGGER.warning(
+                        "The IOLoop has been blocked for %dms, which holds up "
+                        "every session. It is running:\n%s",
+                        stalled_for * 1000,
+                        sample,
+                    )
+                samples[sample] += 1
+
+            elif len(samples) > 0:
+                # The probe ran, so the stall is over.
+                self._on_stall_ended(samples)
+                samples = collections.Counter()
+
+    def _on_stall_ended(self, samples):
+        self._num_stalls += 1
+        metrics.Client.get("streamlit_ioloop_stalls_total").inc()
+
+        lines = ["The IOLoop was blocked for %dms." % (self._last_lag * 1000)]
+        if len(samples) > 1:
+            for sample, count in samples.most_common():
+                lines.append("%d sample(s) of:\n%s" % (count, sample))
+        LOGGER.warning("\n".join(lines))
+
+    def _sample_ioloop_stack(self):
+        thread_id = self._ioloop_thread_id
+        if thread_id is None:
+            return "(unknown)"
+
+        frame = sys._current_frames().get(thread_id, None)
+        if frame is None:
+            return "(unknown)"
+        return "".join(traceback.format_stack(frame))
@@ -12,15 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import hmac
 import logging
 import threading
 import socket
 import sys
 import errno
+import time
 import traceback
 import click
 from enum import Enum
-from typing import Any, Dict, Optional, TYPE_CHECKING
+from typing import Any, Deque, Dict, List, Optional, Tuple, TYPE_CHECKING, cast
 
 import tornado.concurrent
 import tornado.gen
@@ -30,15 +33,23 @@ import tornado.websocket
 
 from streamlit import config
 from streamlit import file_util
+from streamlit import metrics
 from streamlit.ConfigOption import ConfigOption
 from streamlit.ForwardMsgCache import ForwardMsgCache
+from streamlit.ForwardMsgCache import ForwardMsgEnvelope
 from streamlit.ForwardMsgCache import create_reference_msg
-from streamlit.ForwardMsgCache import populate_hash_if_needed
+from streamlit.MediaFileManager import media_file_manager
+from streamlit.ProcessScriptRunner import script_process_pool
 from streamlit.ReportSession import ReportSession
+from streamlit.ProcessScriptRunner import script_process_pool
+from streamlit.ReportThread import report_thread_pool
+from streamlit.ScriptCache import script_cache
+from streamlit.ScriptRunScheduler import script_run_scheduler
 from streamlit.UploadedFileManager import UploadedFileManager
 from streamlit.logger import get_logger
 from streamlit.proto.BackMsg_pb2 import BackMsg
 from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.server.IOLoopMonitor import IOLoopMonitor
 from streamlit.server.UploadFileRequestHandler import UploadFileRequestHandler
 from streamlit.server.routes import AddSlashHandler
 from streamlit.server.routes import DebugHandler
@@ -52,6 +63,7 @@ from streamlit.server.server_util import is_cacheable_msg
 from streamlit.server.server_util import is_url_from_allowed_origins
 from streamlit.server.server_util import make_url_path_regex
 from streamlit.server.server_util import serialize_forward_msg
+from streamlit.watcher.LocalSourcesWatcher import source_watch_registry
 
 
 import os  # IMPULSO HACK
@@ -74,6 +86,16 @@ TORNADO_SETTINGS = {
 # up to MAX_PORT_SEARCH_RETRIES.
 MAX_PORT_SEARCH_RETRIES = 100
 
+# How often, in seconds, to look for sessions to hibernate.
+SESSION_REAP_INTERVAL = 10
+
+# How often, in seconds, to check whether to start a new preheated session.
+# The server's CPU usage is measured over this interval.
+PREHEAT_INTERVAL = 1
+
+# How many of the sessions using the most memory are listed in /debugz.
+NUM_LARGEST_SESSIONS_IN_DEBUG = 10
+
 
 class SessionInfo(object):
     """Type stored in our _session_info_by_id dict.
@@ -97,6 +119,96 @@ class SessionInfo(object):
         self.ws = ws
         self.report_run_count = 0
 
+        # The messages sent to the browser since (and including) the last
+        # new_report message, so we can replay the ones the browser missed
+        # if it resumes the session. Each is kept as a (msg_to_send,
+        # envelope) pair, where msg_to_send is what was sent, which may be a
+        # reference to a cached message, and envelope is the full message.
+        # sent_msgs_start_index is the index of sent_msgs[0] among all the
+        # messages sent to the session, counting from its initialize message.
+        self.sent_msgs = []  # type: List[Tuple[Any, ForwardMsgEnvelope]]
+        self.sent_msgs_start_index = 0
+        self.sent_msgs_size = 0
+
+        # True if messages of the current report were dropped from sent_msgs
+        # to stay within global.maxSessionReplaySize, so a browser that
+        # missed them can't be caught up by replaying.
+        self.sent_msgs_truncated = False
+
+        # When the session's websocket closed, if it's waiting to be resumed.
+        self.detached_at = None  # type: Optional[float]
+
+        # When the session last heard from its browser. Set by the Server.
+        self.last_active_at = 0.0
+
+        # True if the session was hibernated, and hasn't sent anything to
+        # its browser since.
+        self.is_hibernated = False
+
+        # When the browser asked for the rerun whose first delta hasn't been
+        # sent yet, for metrics.
+        self.rerun_requested_at = None  # type: Optional[float]
+
+        # True once that rerun's new_report message has been sent, so deltas
+        # left over from the run it interrupted aren't timed.
+        self.rerun_started = False
+
+    @property
+    def num_msgs_sent(self):
+        """The number of messages sent to the session, counting from its
+        initialize message."""
+        return self.sent_msgs_start_index + len(self.sent_msgs)
+
+    def add_sent_msg(self, envelope, msg_to_send):
+        """Record a message sent to the session.
+
+        Parameters
+        ----------
+        envelope : ForwardMsgEnvelope
+            The message.
+        msg_to_send : ForwardMsg or ForwardMsgEnvelope
+            What was actually sent for the message (it may be a reference
+            to a cached message).
+        """
+        msg_type = envelope.msg.WhichOneof("type")
+        if msg_type == "initialize":
+            self.sent_msgs_start_index = 0
+            self.sent_msgs = []
+            self.sent_msgs_size = 0
+            self.sent_msgs_truncated = False
+        elif msg_type == "new_report":
+            self.clear_sent_msgs()
+            self.sent_msgs_truncated = False
+
+        # A reference keeps its full message alive too, since the message
+        # is replayed in full if it's gone from the cache by then.
+        size = envelope.body_size
+        max_size = config.get_option("global.maxSessionReplaySize")
+        if max_size > 0 and self.sent_msgs_size + size > max_size:
+            self.clear_sent_msgs()
+            self.sent_msgs_truncated = True
+
+        self.sent_msgs.append((msg_to_send, envelope))
+        self.sent_msgs_size += size
+
+    def clear_sent_msgs(self):
+        """Forget the messages kept to be replayed. The count of messages
+        sent to the session is unchanged."""
+        self.sent_msgs_start_index = self.num_msgs_sent
+        self.sent_msgs = []
+        self.sent_msgs_size = 0
+
+    def get_memory_size(self):
+        """Estimate the memory used by the session, in bytes.
+
+        This includes its report, media and uploaded files, and the messages
+        kept to be replayed if its browser resumes it (counted in full, even
+        if they were sent as references to cached messages), but not the
+        messages in the server's ForwardMsgCache, which are shared between
+        sessions.
+        """
+        return self.session.get_memory_size() + self.sent_msgs_size
+
 
 class State(Enum):
     INITIAL = "INITIAL"
@@ -209,10 +321,21 @@ class Server(object):
         self._state = None
         self._set_state(State.INITIAL)
         self._message_cache = ForwardMsgCache()
-        self._uploaded_file_mgr = UploadedFileManager()
+        self._uploaded_file_mgr = UploadedFileManager(
+            is_session_connected=self._is_session_connected
+        )
         self._uploaded_file_mgr.on_files_added.connect(self._on_file_uploaded)
         self._report = None  # type: Optional[Report]
-        self._preheated_session_id = None  # type: Optional[str]
+
+        # IDs of the preheated sessions that haven't been handed to a
+        # browser yet, from oldest to newest.
+        self._preheated_session_ids = collections.deque()  # type: Deque[str]
+
+        self._ioloop_monitor = None  # type: Optional[IOLoopMonitor]
+
+        # (wall time, CPU time) when we last measured our CPU usage.
+        self._cpu_usage_sample = (0.0, 0.0)
+        self._num_hibernations = 0
 
     def _on_file_uploaded(self, file):
         """Event handler for UploadedFileManager.on_file_added.
@@ -234,6 +357,11 @@ class Server(object):
             # remove it so it doesn't stick around forever.
             self._uploaded_file_mgr.remove_files(file.session_id, file.widget_id)
 
+    def _is_session_connected(self, session_id):
+        """True if the session with the given id has a connected browser."""
+        session_info = self._get_session_info(session_id)
+        return session_info is not None and session_info.ws is not None
+
     def _get_session_info(self, session_id):
         """Return the SessionInfo with the given id, or None if no such
         session exists.
@@ -274,9 +402,56 @@ class Server(object):
         self._ioloop.spawn_callback(self._loop_coroutine, on_started)
 
     def get_debug(self) -> Dict[str, Dict[str, Any]]:
+        debug = {
+            "message_cache": self._message_cache.get_stats(),
+            "media_files": media_file_manager.get_stats(),
+            "uploaded_files": self._uploaded_file_mgr.get_stats(),
+            "sessions": self._get_session_stats(),
+            "script_runs": script_run_scheduler.get_stats(),
+            "script_threads": report_thread_pool.get_stats(),
+            "script_processes": script_process_pool.get_stats(),
+            "script_cache": script_cache.get_stats(),
+            "watched_files": source_watch_registry.get_stats(),
+        }
+        if self._ioloop_monitor is not None:
+            debug["ioloop"] = self._ioloop_monitor.get_stats()
         if self._report:
-            return {"report": self._report.get_debug()}
-        return {}
+            debug["report"] = self._report.get_debug()
+        return debug
+
+    def _get_session_stats(self):
+        # type: () -> Dict[str, Any]
+        """Return a dict of statistics about the sessions' memory use,
+        listing the sessions that use the most memory."""
+        now = self._ioloop.time()
+        sessions = [
+            {
+                # A prefix of the ID, to identify the session in logs
+                # without handing out the full ID.
+                "id": session_info.session.id[:8],
+                "memory_size": session_info.get_memory_size(),
+                "idle_time": now - session_info.last_active_at,
+                "connected": session_info.ws is not None,
+                "hibernated": session_info.is_hibernated,
+            }
+            for session_info in list(self._session_info_by_id.values())
+        ]
+
+        def get_memory_size(session):
+            # type: (Dict[str, Any]) -> int
+            return cast(int, session["memory_size"])
+
+        sessions.sort(key=get_memory_size, reverse=True)
+
+        return {
+            "num_sessions": len(sessions),
+            "num_preheated": len(self._preheated_session_ids),
+            "memory_size": sum(session["memory_size"] for session in sessions),
+            "max_memory_size": config.get_option("global.maxSessionsMemorySize"),
+            "idle_timeout": config.get_option("global.sessionIdleTimeout"),
+            "hibernations": self._num_hibernations,
+            "largest_sessions": sessions[:NUM_LARGEST_SESSIONS_IN_DEBUG],
+        }
 
     def _create_app(self):
         """Create our tornado web app.
@@ -299,7 +474,7 @@ class Server(object):
                 dict(callback=lambda: self.is_ready_for_browser_connection),
             ),
             (make_url_path_regex(base, "debugz"), DebugHandler, dict(server=self)),
-            (make_url_path_regex(base, "metrics"), MetricsHandler),
+            (make_url_path_regex(base, "metrics"), MetricsHandler, dict(server=self)),
             (
                 make_url_path_regex(base, "message"),
                 MessageCacheHandler,
@@ -367,6 +542,17 @@ class Server(object):
             if on_started is not None:
                 on_started(self)
 
+            stall_threshold_ms = config.get_option("global.ioloopStallThresholdMs")
+            if stall_threshold_ms > 0:
+                self._ioloop_monitor = IOLoopMonitor(
+                    self._ioloop, stall_threshold_ms / 1000.0
+                )
+                self._ioloop_monitor.start()
+
+            next_reap_time = self._ioloop.time() + SESSION_REAP_INTERVAL
+            next_preheat_time = self._ioloop.time() + PREHEAT_INTERVAL
+            self._get_cpu_usage()
+
             while not self._must_stop.is_set():
 
                 if self._state == State.WAITING_FOR_FIRST_BROWSER:
@@ -381,14 +567,20 @@ class Server(object):
 
                     for session_info in session_infos:
                         if session_info.ws is None:
-                            # Preheated.
+                            # Preheated, or waiting to be resumed.
                             continue
                         msg_list = session_info.session.flush_browser_queue()
+                        if msg_list:
+                            metrics.Client.get("streamlit_session_queue_depth").observe(
+                                len(msg_list)
+                            )
                         for msg in msg_list:
                             try:
                                 self._send_message(session_info, msg)
                             except tornado.websocket.WebSocketClosedError:
-                                self._close_report_session(session_info.session.id)
+                                self._on_websocket_closed(
+                                    session_info.session.id, session_info.ws
+                                )
                             yield
                         yield
 
@@ -399,12 +591,26 @@ class Server(object):
                     # Break out of the thread loop if we encounter any other state.
                     break
 
+                if self._ioloop.time() >= next_reap_time:
+                    self._reap_sessions()
+                    next_reap_time = self._ioloop.time() + SESSION_REAP_INTERVAL
+
+                if self._ioloop.time() >= next_preheat_time:
+                    self._maybe_add_preheated_report_session()
+                    next_preheat_time = self._ioloop.time() + PREHEAT_INTERVAL
+
                 yield tornado.gen.sleep(0.01)
 
+            if self._ioloop_monitor is not None:
+                self._ioloop_monitor.stop()
+
             # Shut down all ReportSessions
             for session_info in list(self._session_info_by_id.values()):
                 session_info.session.shutdown()
 
+            # And the script worker processes, if any.
+            script_process_pool.shutdown()
+
             self._set_state(State.STOPPED)
 
         except Exception as e:
@@ -436,32 +642,52 @@ Please report this bug at https://github.com/streamlit/streamlit/issues.
             The message to send to the client
 
         """
-        msg.metadata.cacheable = is_cacheable_msg(msg)
-        msg_to_send = msg
+        # Wrap the message so that it's serialized at most once, no matter
+        # how many of the steps below need its bytes.
+        envelope = ForwardMsgEnvelope(msg)
+        msg.metadata.cacheable = is_cacheable_msg(envelope)
+        msg_to_send = envelope
         if msg.metadata.cacheable:
-            populate_hash_if_needed(msg)
-
             if self._message_cache.has_message_reference(
-                msg, session_info.session, session_info.report_run_count
+                envelope, session_info.session, session_info.report_run_count
             ):
 
                 # This session has probably cached this message. Send
                 # a reference instead.
                 LOGGER.debug("Sending cached message ref (hash=%s)" % msg.hash)
                 msg_to_send = create_reference_msg(msg)
+                cache_result = "hit"
+            else:
+                cache_result = "miss"
+            metrics.Client.get("streamlit_message_cache_lookups_total").labels(
+                cache_result
+            ).inc()
 
             # Cache the message so it can be referenced in the future.
             # If the message is already cached, this will reset its
             # age.
             LOGGER.debug("Caching message (hash=%s)" % msg.hash)
             self._message_cache.add_message(
-                msg, session_info.session, session_info.report_run_count
+                envelope, session_info.session, session_info.report_run_count
             )
 
+        msg_type = msg.WhichOneof("type")
+        if session_info.rerun_requested_at is not None:
+            if msg_type == "new_report":
+                session_info.rerun_started = True
+            elif session_info.rerun_started and msg_type == "delta":
+                metrics.Client.get("streamlit_rerun_first_delta_seconds").observe(
+                    time.perf_counter() - session_info.rerun_requested_at
+                )
+                session_info.rerun_requested_at = None
+            elif session_info.rerun_started and msg_type == "report_finished":
+                # The rerun didn't produce any deltas.
+                session_info.rerun_requested_at = None
+
         # If this was a `report_finished` message, we increment the
         # report_run_count for this session, and update the cache
         if (
-            msg.WhichOneof("type") == "report_finished"
+            msg_type == "report_finished"
             and msg.report_finished == ForwardMsg.FINISHED_SUCCESSFULLY
         ):
             LOGGER.debug(
@@ -475,8 +701,24 @@ Please report this bug at https://github.com/streamlit/streamlit/issues.
                 session_info.session, session_info.report_run_count
             )
 
-        # Ship it off!
-        session_info.ws.write_message(serialize_forward_msg(msg_to_send), binary=True)
+        if _get_session_resume_grace_period() > 0:
+            session_info.add_sent_msg(envelope, msg_to_send)
+
+        session_info.is_hibernated = False
+
+        # Ship it off! (If the websocket closed while we were sending
+        # a batch of messages, the rest will be replayed if the browser
+        # resumes the session.)
+        if session_info.ws is not None:
+            msg_str = serialize_forward_msg(msg_to_send)
+            session_info.ws.write_message(msg_str, binary=True)
+
+            metrics.Client.get("streamlit_forward_msgs_sent_total").labels(
+                msg_type
+            ).inc()
+            metrics.Client.get("streamlit_forward_msg_bytes_sent_total").labels(
+                msg_type
+            ).inc(len(msg_str))
 
     def stop(self):
         click.secho("  Stopping...", fg="blue")
@@ -496,11 +738,54 @@ Please report this bug at https://github.com/streamlit/streamlit/issues.
         """Register a fake browser with the server and run the script.
 
         This is used to start running the user's script even before the first
-        browser connects.
+        browser connects. It's a no-op if there are already
+        global.numPreheatedSessions preheated sessions (or one, if the pool
+        isn't refilled).
         """
+        if len(self._preheated_session_ids) >= max(
+            1, config.get_option("global.numPreheatedSessions")
+        ):
+            return
+
         session = self._create_or_reuse_report_session(ws=None)
         session.handle_rerun_script_request(is_preheat=True)
 
+    def _maybe_add_preheated_report_session(self):
+        """Top up the pool of preheated sessions, one session at a time.
+
+        A new session is only started once the previous preheated session
+        has finished running, and while the server's CPU usage is within
+        global.preheatCpuBudget, so that refilling the pool doesn't compete
+        with the scripts of connected browsers.
+        """
+        cpu_usage = self._get_cpu_usage()
+
+        num_preheated_sessions = config.get_option("global.numPreheatedSessions")
+        if len(self._preheated_session_ids) >= num_preheated_sessions:
+            return
+
+        for session_id in self._preheated_session_ids:
+            if self._session_info_by_id[session_id].session.is_script_running:
+                return
+
+        if cpu_usage >= config.get_option("global.preheatCpuBudget"):
+            LOGGER.debug("Not preheating a session: CPU usage is %.2f", cpu_usage)
+            return
+
+        self.add_preheated_report_session()
+
+    def _get_cpu_usage(self):
+        """Return the CPU time the server process used since the last call,
+        as a fraction of the wall-clock time that has passed."""
+        prev_wall_time, prev_cpu_time = self._cpu_usage_sample
+        wall_time, cpu_time = time.monotonic(), time.process_time()
+        self._cpu_usage_sample = (wall_time, cpu_time)
+
+        elapsed = wall_time - prev_wall_time
+        if elapsed <= 0:
+            return 0.0
+        return (cpu_time - prev_cpu_time) / elapsed
+
     def _create_or_reuse_report_session(self, ws):
         """Register a connected browser with the server.
 
@@ -516,16 +801,11 @@ Please report this bug at https://github.com/streamlit/streamlit/issues.
             The newly-created ReportSession for this browser connection.
 
         """
-        if self._preheated_session_id is not None:
-            assert len(self._session_info_by_id) == 1
-            assert ws is not None
-
-            session_id = self._preheated_session_id
-            self._preheated_session_id = None
-
-            session_info = self._session_info_by_id[session_id]
-            session_info.ws = ws
-            session = session_info.session
+        if ws is not None and len(self._preheated_session_ids) > 0:
+            # Hand out the oldest preheated session, which is the most likely
+            # to have finished running.
+            session_id = self._preheated_session_ids.popleft()
+            session = self._session_info_by_id[session_id].session
 
             LOGGER.debug(
                 "Reused preheated session for ws %s. Session ID: %s", id(ws), session_id
@@ -547,15 +827,296 @@ Please report this bug at https://github.com/streamlit/streamlit/issues.
                 "session.id '%s' registered multiple times!" % session.id
             )
 
-        self._session_info_by_id[session.id] = SessionInfo(ws, session)
+        session_info = SessionInfo(ws, session)
+        session_info.last_active_at = self._ioloop.time()
+        self._session_info_by_id[session.id] = session_info
 
         if ws is None:
-            self._preheated_session_id = session.id
+            self._preheated_session_ids.append(session.id)
         else:
             self._set_state(State.ONE_OR_MORE_BROWSERS_CONNECTED)
 
         return session
 
+    def _resume_report_session(self, ws, session_id, resume_token, num_msgs_received):
+        """Reattach a browser to the session it was connected to before its
+        websocket connection dropped.
+
+        The messages the browser missed are replayed to it.
+
+        Parameters
+        ----------
+        ws : _BrowserWebSocketHandler
+            The newly-connected websocket handler.
+        session_id : str
+            The ID of the session to resume.
+        resume_token : str
+            The session's resume token, which the browser received in its
+            initialize message.
+        num_msgs_received : int
+            The number of messages the browser received from the session,
+            counting from its initialize message.
+
+        Returns
+        -------
+        ReportSession or None
+            The resumed session, or None if it can't be resumed (e.g. because
+            it was closed after its grace period expired).
+
+        """
+        session_info = self._get_session_info(session_id)
+        if (
+            session_info is None
+            or session_info.num_msgs_sent == 0
+            or num_msgs_received > session_info.num_msgs_sent
+            or not hmac.compare_digest(
+                session_info.session.resume_token.encode("utf-8"),
+                resume_token.encode("utf-8"),
+            )
+        ):
+            LOGGER.debug("Can't resume session %s", session_id)
+            return None
+
+        old_ws = session_info.ws
+        session_info.ws = ws
+        session_info.detached_at = None
+        session_info.last_active_at = self._ioloop.time()
+        if old_ws is not None:
+            # The browser reconnected before we noticed its old connection
+            # was gone. (Its on_close will be ignored, as it no longer owns
+            # the session.)
+            old_ws.close()
+
+        # Replay the messages the browser missed. If it missed the start
+        # of the current report, replay the report from its new_report
+        # message, and adopt the browser's message count from there.
+        start = num_msgs_received - session_info.sent_msgs_start_index
+        if start < 0 and session_info.sent_msgs_truncated:
+            # The browser missed messages that weren't kept. Adopt its
+            # message count, and rerun the script to send it the whole
+            # report again.
+            LOGGER.debug(
+                "Resumed session %s for ws %s; rerunning, since the messages "
+                "it missed were dropped",
+                session_id,
+                id(ws),
+            )
+            session_info.sent_msgs = []
+            session_info.sent_msgs_size = 0
+            session_info.sent_msgs_start_index = num_msgs_received
+            session_info.sent_msgs_truncated = False
+            session_info.session.request_rerun()
+            self._set_state(State.ONE_OR_MORE_BROWSERS_CONNECTED)
+            return session_info.session
+
+        if start < 0:
+            start = 0
+            session_info.sent_msgs_start_index = num_msgs_received
+
+        msgs_to_replay = session_info.sent_msgs[start:]
+        LOGGER.debug(
+            "Resumed session %s for ws %s; replaying %s messages",
+            session_id,
+            id(ws),
+            len(msgs_to_replay),
+        )
+        for msg_to_send, envelope in msgs_to_replay:
+            if msg_to_send is not envelope and not self._message_cache.has_message(
+                envelope.hash
+            ):
+                # The message was sent as a reference, but it's been evicted
+                # from the cache since, so the browser couldn't fetch it.
+                # Send it in full instead.
+                msg_to_send = envelope
+            ws.write_message(serialize_forward_msg(msg_to_send), binary=True)
+
+        session_info.session.handle_resume()
+        self._set_state(State.ONE_OR_MORE_BROWSERS_CONNECTED)
+        return session_info.session
+
+    def _on_session_active(self, session_id):
+        """Called when a session hears from its browser."""
+        session_info = self._get_session_info(session_id)
+        if session_info is not None:
+            session_info.last_active_at = self._ioloop.time()
+
+    def _on_rerun_requested(self, session_id, is_rerun):
+        """Called when a session's browser asks for a rerun. Starts timing
+        how long it takes for the rerun's first delta to be sent back.
+
+        A request replaces any earlier one that's still waiting, since it
+        interrupts that rerun or is merged into it. If the session skipped
+        the rerun (is_rerun is False), nothing is timed.
+        """
+        session_info = self._get_session_info(session_id)
+        if session_info is None:
+            return
+        session_info.rerun_requested_at = time.perf_counter() if is_rerun else None
+        session_info.rerun_started = False
+
+    def update_metrics(self):
+        """Update the metrics that are sampled, rather than counted as things
+        happen. Called when the metrics are served."""
+        num_sessions = collections.Counter(
+            {"connected": 0, "preheated": 0, "disconnected": 0}
+        )
+        preheated_session_ids = set(self._preheated_session_ids)
+        for session_id, session_info in list(self._session_info_by_id.items()):
+            if session_id in preheated_session_ids:
+                num_sessions["preheated"] += 1
+            elif session_info.ws is not None:
+                num_sessions["connected"] += 1
+            else:
+                num_sessions["disconnected"] += 1
+
+        sessions_gauge = metrics.Client.get("streamlit_sessions")
+        for state, count in num_sessions.items():
+            sessions_gauge.labels(state).set(count)
+
+        media_stats = media_file_manager.get_stats()
+        media_gauge = metrics.Client.get("streamlit_media_files_bytes")
+        media_gauge.labels("memory").set(media_stats["memory_size"])
+        media_gauge.labels("disk").set(media_stats["disk_size"])
+
+    def _reap_sessions(self):
+        """Hibernate the sessions that have been idle for longer than
+        global.sessionIdleTimeout. Then, if the sessions use more than
+        global.maxSessionsMemorySize, hibernate the least-recently-active
+        ones until they don't.
+
+        Only sessions with a connected browser are hibernated. (Preheated
+        sessions, and sessions waiting to be resumed, still have messages
+        their browser hasn't seen.)
+        """
+        idle_timeout = config.get_option("global.sessionIdleTimeout")
+        max_memory_size = config.get_option("global.maxSessionsMemorySize")
+        if idle_timeout <= 0 and max_memory_size <= 0:
+            return
+
+        all_session_infos = list(self._session_info_by_id.values())
+        session_infos = [
+            session_info
+            for session_info in all_session_infos
+            if session_info.ws is not None and not session_info.is_hibernated
+        ]
+
+        if idle_timeout > 0:
+            now = self._ioloop.time()
+            for session_info in session_infos:
+                if now - session_info.last_active_at >= idle_timeout:
+                    self._hibernate_session(session_info, "idle")
+
+        if max_memory_size > 0:
+            sizes = {
+                session_info.session.id: session_info.get_memory_size()
+                for session_info in all_session_infos
+            }
+            total_size = sum(sizes.values())
+
+            def get_last_active_at(session_info):
+                # type: (SessionInfo) -> float
+                return session_info.last_active_at
+
+            session_infos.sort(key=get_last_active_at)
+            for session_info in session_infos:
+                if total_size <= max_memory_size:
+                    break
+                if session_info.is_hibernated:
+                    continue
+                if self._hibernate_session(session_info, "memory"):
+                    total_size -= (
+                        sizes[session_info.session.id] - session_info.get_memory_size()
+                    )
+
+    def _hibernate_session(self, session_info, reason):
+        """Free the memory used by a session's report, media files and
+        replay buffer, keeping its browser connected. The media files are
+        spilled to disk, since the browser may still request them.
+
+        The session's references to cached messages are dropped too, so the
+        messages of its next run are sent in full.
+
+        Parameters
+        ----------
+        session_info : SessionInfo
+        reason : str
+            Why the session is hibernated ("idle" or "memory").
+
+        Returns
+        -------
+        bool
+            False if the session is busy and couldn't be hibernated.
+
+        """
+        if not session_info.session.hibernate():
+            return False
+
+        LOGGER.debug(
+            "Hibernated session %s (%s)", session_info.session.id, reason,
+        )
+        self._message_cache.remove_session_entries(session_info.session)
+        session_info.clear_sent_msgs()
+        session_info.is_hibernated = True
+        self._num_hibernations += 1
+        metrics.Client.get("streamlit_sessions_hibernated_total").labels(reason).inc()
+        return True
+
+    def _on_websocket_closed(self, session_id, ws):
+        """Called when a session's websocket closes.
+
+        The session is kept around for global.sessionResumeGracePeriod
+        seconds, in case its browser reconnects and resumes it. Its script
+        keeps running in the meantime, and its messages are queued up.
+
+        Parameters
+        ----------
+        session_id : str
+            The ReportSession's id string.
+        ws : _BrowserWebSocketHandler
+            The websocket that closed.
+        """
+        session_info = self._get_session_info(session_id)
+        if session_info is None or session_info.ws is not ws:
+            # The session is gone, or another websocket has resumed it.
+            return
+
+        grace_period = _get_session_resume_grace_period()
+        if grace_period <= 0:
+            self._close_report_session(session_id)
+            return
+
+        LOGGER.debug(
+            "Websocket for session %s closed; waiting %ss for it to resume",
+            session_id,
+            grace_period,
+        )
+        session_info.ws = None
+        session_info.detached_at = self._ioloop.time()
+        self._ioloop.call_later(
+            grace_period,
+            self._close_detached_report_session,
+            session_info,
+            session_info.detached_at,
+        )
+
+        if all(info.ws is None for info in self._session_info_by_id.values()):
+            self._set_state(State.NO_BROWSERS_CONNECTED)
+
+    def _close_detached_report_session(self, session_info, detached_at):
+        """Close a session whose resume grace period has expired, unless it
+        has been resumed since. (If it was resumed and then detached again,
+        a new grace period started.)"""
+        if session_info.detached_at != detached_at:
+            return
+
+        if self._get_session_info(session_info.session.id) is not session_info:
+            return
+
+        LOGGER.debug(
+            "Closing session %s: resume grace period expired", session_info.session.id,
+        )
+        self._close_report_session(session_info.session.id)
+
     def _close_report_session(self, session_id):
         """Shutdown and remove a ReportSession.
 
@@ -572,7 +1133,7 @@ Please report this bug at https://github.com/streamlit/streamlit/issues.
             del self._session_info_by_id[session_id]
             session_info.session.shutdown()
 
-        if len(self._session_info_by_id) == 0:
+        if all(info.ws is None for info in self._session_info_by_id.values()):
             self._set_state(State.NO_BROWSERS_CONNECTED)
 
 
@@ -588,12 +1149,22 @@ class _BrowserWebSocketHandler(tornado.websocket.WebSocketHandler):
         return super().check_origin(origin) or is_url_from_allowed_origins(origin)
 
     def open(self):
-        self._session = self._server._create_or_reuse_report_session(self)
+        resume_session_id = self.get_argument("resumeSessionId", None)
+        if resume_session_id is not None:
+            self._session = self._server._resume_report_session(
+                self,
+                resume_session_id,
+                self.get_argument("resumeToken", ""),
+                _parse_int(self.get_argument("numMessagesReceived", "0")),
+            )
+
+        if self._session is None:
+            self._session = self._server._create_or_reuse_report_session(self)
 
     def on_close(self):
         if not self._session:
             return
-        self._server._close_report_session(self._session.id)
+        self._server._on_websocket_closed(self._session.id, self)
         self._session = None
 
     @tornado.gen.coroutine
@@ -601,6 +1172,8 @@ class _BrowserWebSocketHandler(tornado.websocket.WebSocketHandler):
         if not self._session:
             return
 
+        self._server._on_session_active(self._session.id)
+
         msg = BackMsg()
 
         try:
@@ -612,17 +1185,23 @@ class _BrowserWebSocketHandler(tornado.websocket.WebSocketHandler):
             if msg_type == "cloud_upload":
                 yield self._session.handle_save_request(self)
             elif msg_type == "rerun_script":
-                self._session.handle_rerun_script_request()
+                is_rerun = self._session.handle_rerun_script_request()
+                self._server._on_rerun_requested(self._session.id, is_rerun)
             elif msg_type == "clear_cache":
                 self._session.handle_clear_cache_request()
             elif msg_type == "set_run_on_save":
                 self._session.handle_set_run_on_save_request(msg.set_run_on_save)
+            elif msg_type == "set_rerun_debounce_ms":
+                self._session.handle_set_rerun_debounce_ms_request(
+                    msg.set_rerun_debounce_ms
+                )
             elif msg_type == "stop_report":
                 self._session.handle_stop_script_request()
             elif msg_type == "update_widgets":
-                self._session.handle_rerun_script_request(
+                is_rerun = self._session.handle_rerun_script_request(
                     widget_state=msg.update_widgets
                 )
+                self._server._on_rerun_requested(self._session.id, is_rerun)
             elif msg_type == "close_connection":
                 if config.get_option("global.developmentMode"):
                     Server.get_current().stop()
@@ -639,6 +1218,17 @@ class _BrowserWebSocketHandler(tornado.websocket.WebSocketHandler):
             self._session.enqueue_exception(e)
 
 
+def _get_session_resume_grace_period():
+    return config.get_option("global.sessionResumeGracePeriod")
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+
 def _set_tornado_log_levels():
     if not config.get_option("global.developmentMode"):
         # Hide logs unless they're super important.
@@ -12,22 +12,224 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
+import tempfile
 from typing import Dict, Any
+from typing import IO
 from typing import List
+from typing import Optional
+from typing import cast
 
-import tornado.web
+import tornado.http1connection
 import tornado.httputil
+import tornado.web
 
+from streamlit import config
 from streamlit.UploadedFileManager import UploadedFile
+from streamlit.UploadedFileManager import UploadedFileQuotaError
 from streamlit.logger import get_logger
 from streamlit.server import routes
 
 LOGGER = get_logger(__name__)
 
+# Uploaded files larger than this are spooled to a temporary file on disk,
+# rather than kept in memory.
+SPOOL_MAX_SIZE = 1024 * 1024  # 1MB
+
+# Max size of the headers of one part of a multipart body.
+_MAX_PART_HEADERS_SIZE = 64 * 1024
+
+_PREAMBLE = "preamble"
+_BOUNDARY = "boundary"
+_HEADERS = "headers"
+_BODY = "body"
+_DONE = "done"
+
+
+class _SpooledFileWriter(object):
+    """Accumulates a file's data in memory, moving it to a temporary file on
+    disk once it grows larger than SPOOL_MAX_SIZE.
+
+    The temporary file is named, so that script worker processes can open it
+    rather than being sent its data. It's deleted once it's closed.
+    """
+
+    def __init__(self):
+        self.file = io.BytesIO()  # type: IO[bytes]
+        self._is_spooled = False
+
+    def write(self, data):
+        if not self._is_spooled and self.file.tell() + len(data) > SPOOL_MAX_SIZE:
+            buffer = self.file
+            assert isinstance(buffer, io.BytesIO)
+            spooled = tempfile.NamedTemporaryFile(prefix="streamlit-upload-")
+            spooled.write(buffer.getbuffer())
+            self.file = spooled
+            self._is_spooled = True
+        self.file.write(data)
+
+
+class _MultipartParser(object):
+    """Incrementally parses a multipart/form-data request body.
+
+    Data is fed in as it arrives, and file parts are written out as they're
+    parsed, so the body never needs to be held in memory in its entirety.
+    Form fields are collected into `args` and files into `files`, like
+    tornado.httputil.parse_body_arguments does.
+
+    Raises ValueError if the body is malformed.
+    """
+
+    def __init__(self, boundary):
+        # A part's delimiter is a CRLF followed by "--" and the boundary. The
+        # first delimiter in the body doesn't need the CRLF, so we seed the
+        # buffer with one.
+        self._delimiter = b"\r\n--" + boundary
+        self._buffer = bytearray(b"\r\n")
+        self._state = _PREAMBLE
+
+        self._part_name = None  # type: Optional[str]
+        self._part_filename = None  # type: Optional[str]
+        self._part_writer = None  # type: Any
+
+        self.args = {}  # type: Dict[str, List[bytes]]
+        self.files = []  # type: List[UploadedFile]
 
+    @staticmethod
+    def from_content_type(content_type):
+        """Create a parser for a request with the given Content-Type header."""
+        value, params = tornado.httputil._parse_header(content_type)
+        if value != "multipart/form-data":
+            raise ValueError("Unsupported Content-Type: %s" % value)
+
+        boundary = params.get("boundary")
+        if not boundary:
+            raise ValueError("Missing multipart boundary")
+
+        # The boundary may be quoted.
+        if boundary.startswith('"') and boundary.endswith('"'):
+            boundary = boundary[1:-1]
+
+        return _MultipartParser(boundary.encode("latin1"))
+
+    def feed(self, chunk):
+        """Parse the next chunk of the body."""
+        buf = self._buffer
+        buf += chunk
+
+        while True:
+            if self._state in (_PREAMBLE, _BODY):
+                index = buf.find(self._delimiter)
+                if index == -1:
+                    # The end of the buffer may be the start of a delimiter,
+                    # so hold on to that until we get more data.
+                    keep = len(self._delimiter) - 1
+                    if len(buf) > keep:
+                        self._write_part(buf[:-keep])
+                        del buf[:-keep]
+                    return
+
+                self._write_part(buf[:index])
+                self._end_part()
+                del buf[: index + len(self._delimiter)]
+                self._state = _BOUNDARY
+
+            elif self._state == _BOUNDARY:
+                if len(buf) < 2:
+                    return
+                if buf[:2] == b"--":
+                    self._state = _DONE
+                elif buf[:2] == b"\r\n":
+                    self._state = _HEADERS
+                else:
+                    raise ValueError("Invalid multipart boundary")
+                del buf[:2]
+
+            elif self._state == _HEADERS:
+                index = buf.find(b"\r\n\r\n")
+                if index == -1:
+                    if len(buf) > _MAX_PART_HEADERS_SIZE:
+                        raise ValueError("Multipart headers too large")
+                    return
+
+                headers = tornado.httputil.HTTPHeaders.parse(
+                    buf[:index].decode("utf-8")
+                )
+                del buf[: index + 4]
+                self._start_part(headers)
+                self._state = _BODY
+
+            else:
+                # Ignore the epilogue.
+                del buf[:]
+                return
+
+    def close(self):
+        """Signal the end of the body."""
+        if self._state != _DONE:
+            raise ValueError("Unexpected end of multipart body")
+
+    def discard(self):
+        """Close the files parsed so far, including one that's only partly
+        written, which deletes any that were spooled to disk."""
+        for file in self.files:
+            file.close()
+        self.files = []
+
+        if isinstance(self._part_writer, _SpooledFileWriter):
+            self._part_writer.file.close()
+        self._part_writer = None
+
+    def _start_part(self, headers):
+        disposition, params = tornado.httputil._parse_header(
+            headers.get("Content-Disposition", "")
+        )
+        if disposition != "form-data" or "name" not in params:
+            LOGGER.warning("Invalid multipart/form-data part")
+            return
+
+        self._part_name = params["name"]
+        if "filename" in params:
+            self._part_filename = params["filename"]
+            self._part_writer = _SpooledFileWriter()
+        else:
+            self._part_filename = None
+            self._part_writer = io.BytesIO()
+
+    def _write_part(self, data):
+        if self._state == _BODY and self._part_writer is not None:
+            self._part_writer.write(data)
+
+    def _end_part(self):
+        if self._state != _BODY or self._part_writer is None:
+            return
+
+        if self._part_filename is not None:
+            # Spooled data may be read by other processes, by path.
+            self._part_writer.file.flush()
+            self.files.append(
+                UploadedFile(name=self._part_filename, data=self._part_writer.file)
+            )
+        else:
+            assert self._part_name is not None
+            self.args.setdefault(self._part_name, []).append(
+                self._part_writer.getvalue()
+            )
+
+        self._part_name = None
+        self._part_filename = None
+        self._part_writer = None
+
+
+@tornado.web.stream_request_body
 class UploadFileRequestHandler(tornado.web.RequestHandler):
     """
     Implements the PUT /upload_file endpoint.
+
+    The request body is parsed as it streams in, and uploaded files are
+    spooled to disk, so large uploads are never buffered in memory. Uploads
+    larger than `server.maxUploadSize` are rejected as soon as we know
+    their size.
     """
 
     def initialize(self, file_mgr):
@@ -40,6 +242,8 @@ class UploadFileRequestHandler(tornado.web.RequestHandler):
 
         """
         self._file_mgr = file_mgr
+        self._parser = None  # type: Optional[_MultipartParser]
+        self._parse_error = None  # type: Optional[str]
 
     def set_default_headers(self):
         if routes.allow_cross_origin_requests():
@@ -84,40 +288,87 @@ class UploadFileRequestHandler(tornado.web.RequestHandler):
         # Convert bytes to string
         return arg[0].decode("utf-8")
 
-    def post(self):
-        args = {}  # type: Dict[str, str]
-        files = {}  # type: Dict[str, List[Any]]
-
-        tornado.httputil.parse_body_arguments(
-            content_type=self.request.headers["Content-Type"],
-            body=self.request.body,
-            arguments=args,
-            files=files,
+    def prepare(self):
+        if self.request.method != "POST":
+            return
+
+        max_size = config.get_option("server.maxUploadSize") * 1024 * 1024
+        content_length = int(self.request.headers.get("Content-Length", 0))
+        if content_length > max_size:
+            self.send_error(
+                413,
+                reason="Upload exceeds %s MB"
+                % config.get_option("server.maxUploadSize"),
+            )
+            return
+
+        # Replace Tornado's default body size limit with ours. This also
+        # covers bodies without a Content-Length (i.e. chunked uploads).
+        connection = cast(
+            tornado.http1connection.HTTP1Connection, self.request.connection
         )
+        connection.set_max_body_size(max_size)
+
+        try:
+            self._parser = _MultipartParser.from_content_type(
+                self.request.headers.get("Content-Type", "")
+            )
+        except ValueError as e:
+            self.send_error(400, reason=str(e))
+
+    def data_received(self, chunk):
+        if self._parser is None or self._parse_error is not None:
+            return
+
+        try:
+            self._parser.feed(chunk)
+        except ValueError as e:
+            self._parse_error = str(e)
+
+    def on_connection_close(self):
+        # The upload was cut off, so nothing will take its files.
+        if self._parser is not None:
+            self._parser.discard()
+        super(UploadFileRequestHandler, self).on_connection_close()
+
+    def post(self):
+        # prepare() sends an error, and so post() isn't called, unless it
+        # created the parser.
+        assert self._parser is not None
+
+        if self._parse_error is None:
+            try:
+                self._parser.close()
+            except ValueError as e:
+                self._parse_error = str(e)
+
+        if self._parse_error is not None:
+            self._parser.discard()
+            self.send_error(400, reason=self._parse_error)
+            return
+
+        args = self._parser.args
+        uploaded_files = self._parser.files
 
         try:
             session_id = self._require_arg(args, "sessionId")
             widget_id = self._require_arg(args, "widgetId")
         except Exception as e:
+            self._parser.discard()
             self.send_error(400, reason=str(e))
             return
 
-        # Create an UploadedFile object for each file.
-        uploaded_files = []
-        for flist in files.values():
-            # Because multiple files with the same name can be uploaded, each
-            # entry in the files dict is itself a list.
-            for file in flist:
-                uploaded_files.append(
-                    UploadedFile(name=file["filename"], data=file["body"])
-                )
-
         if len(uploaded_files) == 0:
             self.send_error(400, reason="Expected at least 1 file, but got 0")
             return
 
-        self._file_mgr.add_files(
-            session_id=session_id, widget_id=widget_id, files=uploaded_files,
-        )
+        try:
+            self._file_mgr.add_files(
+                session_id=session_id, widget_id=widget_id, files=uploaded_files,
+            )
+        except UploadedFileQuotaError as e:
+            self._parser.discard()
+            self.send_error(413, reason=str(e))
+            return
 
         self.set_status(200)
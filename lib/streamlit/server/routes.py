@@ -25,6 +25,17 @@ from streamlit.MediaFileManager import media_file_manager
 
 LOGGER = get_logger(__name__)
 
+# Cache-Control header for resources whose URL contains a hash of their
+# content. Their content can never change, so browsers and proxies can keep
+# them forever and don't need to revalidate them.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Responses smaller than this aren't worth compressing.
+MIN_GZIP_SIZE = 1024
+
+# Same compression level as tornado's own GZipContentEncoding.
+GZIP_LEVEL = 6
+
 
 def allow_cross_origin_requests():
     """True if cross-origin requests are allowed.
@@ -60,31 +71,100 @@ class AddSlashHandler(tornado.web.RequestHandler):
         pass
 
 
-class MediaFileHandler(tornado.web.RequestHandler):
+def _accepts_gzip(request):
+    """True if the client accepts gzip-encoded responses.
+
+    Each coding in the Accept-Encoding header can have a q-value, and
+    "gzip;q=0" means that gzip is not acceptable. "*" stands for any coding
+    that isn't listed.
+    """
+    qvalues = {}
+    for coding in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        qvalue = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[name.strip().lower()] = qvalue
+
+    return qvalues.get("gzip", qvalues.get("*", 0.0)) > 0
+
+
+class MediaFileHandler(tornado.web.StaticFileHandler):
+    """Serves files from the MediaFileManager.
+
+    This builds on tornado's StaticFileHandler, which gives us HTTP Range
+    requests (so browsers can seek in st.video and st.audio without
+    re-downloading the whole file), HEAD requests, and a body that's streamed
+    to the client in chunks rather than buffered in one write.
+    """
+
+    # Size of each chunk of the file that is written and flushed.
+    CHUNK_SIZE = 64 * 1024
+
+    def initialize(self):  # type: ignore[override]
+        # Media files don't live under a root directory.
+        super(MediaFileHandler, self).initialize(path="")
+
     def set_default_headers(self):
         if allow_cross_origin_requests():
             self.set_header("Access-Control-Allow-Origin", "*")
 
-    def get(self, filename):
+    def set_extra_headers(self, path):
+        self.set_header("Cache-Control", IMMUTABLE_CACHE_CONTROL)
+
+    @classmethod
+    def get_absolute_path(cls, root, path):
         # Filename is {requested_hash}.{extension} but MediaFileManager
         # is indexed by requested_hash.
-        requested_hash = filename.split(".")[0]
-        LOGGER.debug("MediaFileHandler: GET %s" % filename)
+        return path.split(".")[0]
 
+    def validate_absolute_path(self, root, absolute_path):
+        LOGGER.debug("MediaFileHandler: GET %s" % absolute_path)
         try:
-            media = media_file_manager.get(requested_hash)
-        except:
-            LOGGER.error("MediaFileManager: Missing file %s" % requested_hash)
-            self.write("%s not found" % requested_hash)
-            self.set_status(404)
-            return
+            # Hold on to the file for the duration of the request, so it's
+            # not removed from the MediaFileManager while we stream it.
+            self._media = media_file_manager.get(absolute_path)
+        except KeyError:
+            LOGGER.error("MediaFileManager: Missing file %s" % absolute_path)
+            raise tornado.web.HTTPError(404, "%s not found" % absolute_path)
 
         LOGGER.debug(
-            "MediaFileManager: Sending %s file %s" % (media.mimetype, requested_hash)
+            "MediaFileManager: Sending %s file %s"
+            % (self._media.mimetype, absolute_path)
         )
-        self.write(media.content)
-        self.set_header("Content-Type", media.mimetype)
-        self.set_status(200)
+        return absolute_path
+
+    def compute_etag(self):
+        # Media files are addressed by a hash of their content, so there's
+        # no need to hash the content again.
+        return '"%s"' % self.absolute_path
+
+    def should_return_304(self):
+        # Media files have no modification time. Only check the ETag.
+        return self.check_etag_header()
+
+    def get_modified_time(self):
+        return None
+
+    def get_content_type(self):
+        return self._media.mimetype
+
+    def get_content_size(self):
+        return self._media.size
+
+    def get_content(self, abspath, start=None, end=None):  # type: ignore[override]
+        # StaticFileHandler declares this as a classmethod that looks the file
+        # up again, but get() calls it on the handler. Stream from the file
+        # that validate_absolute_path() resolved, since it may have been
+        # removed from the MediaFileManager since then.
+        start = start if start is not None else 0
+        end = end if end is not None else self._media.size
+        return self._media.read_chunks(start, end, self.CHUNK_SIZE)
 
 
 class _SpecialRequestHandler(tornado.web.RequestHandler):
@@ -139,8 +219,13 @@ class HealthHandler(_SpecialRequestHandler):
 
 
 class MetricsHandler(_SpecialRequestHandler):
+    def initialize(self, server=None):
+        self._server = server
+
     def get(self):
         if config.get_option("global.metrics"):
+            if self._server is not None:
+                self._server.update_metrics()
             self.add_header("Cache-Control", "no-cache")
             self.set_header("Content-Type", "text/plain")
             self.write(metrics.Client.get_current().generate_latest())
@@ -177,6 +262,17 @@ class MessageCacheHandler(tornado.web.RequestHandler):
         if allow_cross_origin_requests():
             self.set_header("Access-Control-Allow-Origin", "*")
 
+        # Responses are gzipped depending on the request's Accept-Encoding,
+        # so shared caches must key them on it. (Tornado's compress_response
+        # setting adds this header itself.)
+        if not self.settings.get("compress_response"):
+            self.set_header("Vary", "Accept-Encoding")
+
+    def compute_etag(self):
+        # Messages are addressed by their hash, so there's no need to hash
+        # the response body again.
+        return '"%s"' % self._msg_hash
+
     def get(self):
         msg_hash = self.get_argument("hash", None)
         if msg_hash is None:
@@ -187,8 +283,16 @@ class MessageCacheHandler(tornado.web.RequestHandler):
             self.set_status(404)
             raise tornado.web.Finish()
 
-        message = self._cache.get_message(msg_hash)
-        if message is None:
+        self._msg_hash = msg_hash
+        self.set_etag_header()
+        if self.check_etag_header():
+            # The browser already has this message.
+            self.set_header("Cache-Control", IMMUTABLE_CACHE_CONTROL)
+            self.set_status(304)
+            return
+
+        envelope = self._cache.get_envelope(msg_hash)
+        if envelope is None:
             # Message not in our cache.
             LOGGER.error(
                 "HTTP request for cached message could not be fulfilled. "
@@ -198,8 +302,18 @@ class MessageCacheHandler(tornado.web.RequestHandler):
             raise tornado.web.Finish()
 
         LOGGER.debug("MessageCache HIT [hash=%s]" % msg_hash)
-        msg_str = serialize_forward_msg(message)
+        msg_str = serialize_forward_msg(envelope)
         self.set_header("Content-Type", "application/octet-stream")
+        self.set_header("Cache-Control", IMMUTABLE_CACHE_CONTROL)
+
+        # Tornado's compress_response setting doesn't consider
+        # application/octet-stream compressible, but serialized ForwardMsgs
+        # (e.g. DataFrames) usually compress very well. The cache keeps the
+        # compressed message, so it's only compressed once.
+        if _accepts_gzip(self.request) and len(msg_str) >= MIN_GZIP_SIZE:
+            msg_str = self._cache.get_gzipped_message(msg_hash, msg_str, GZIP_LEVEL)
+            self.set_header("Content-Encoding", "gzip")
+
         self.write(msg_str)
         self.set_status(200)
 
@@ -20,7 +20,7 @@ from streamlit import config
 from streamlit import net_util
 from streamlit import type_util
 from streamlit import url_util
-from streamlit.ForwardMsgCache import populate_hash_if_needed
+from streamlit.ForwardMsgCache import ForwardMsgEnvelope
 
 # Largest message that can be sent via the WebSocket connection.
 # (Limit was picked arbitrarily)
@@ -33,7 +33,9 @@ def is_cacheable_msg(msg):
 
     Parameters
     ----------
-    msg : ForwardMsg
+    msg : ForwardMsg | ForwardMsgEnvelope
+        If an envelope is passed, its serialized body is used for the size
+        check instead of encoding the message again.
 
     Returns
     -------
@@ -41,10 +43,18 @@ def is_cacheable_msg(msg):
         True if we should cache the message.
 
     """
+    if isinstance(msg, ForwardMsgEnvelope):
+        envelope = msg
+        msg = envelope.msg
+    else:
+        envelope = None
+
     if msg.WhichOneof("type") in {"ref_hash", "initialize"}:
         # Some message types never get cached
         return False
-    return msg.ByteSize() >= config.get_option("global.minCachedMessageSize")
+
+    msg_size = envelope.body_size if envelope is not None else msg.ByteSize()
+    return msg_size >= config.get_option("global.minCachedMessageSize")
 
 
 def serialize_forward_msg(msg):
@@ -55,8 +65,9 @@ def serialize_forward_msg(msg):
 
     Parameters
     ----------
-    msg : ForwardMsg
-        The message to serialize
+    msg : ForwardMsg | ForwardMsgEnvelope
+        The message to serialize. If an envelope is passed, its
+        already-serialized body is reused.
 
     Returns
     -------
@@ -64,12 +75,12 @@ def serialize_forward_msg(msg):
         The serialized byte string to send
 
     """
-    populate_hash_if_needed(msg)
-    msg_str = msg.SerializeToString()
+    envelope = ForwardMsgEnvelope.wrap(msg)
+    msg_str = envelope.serialize()
 
     if len(msg_str) > MESSAGE_SIZE_LIMIT:
-        _convert_msg_to_exception_msg(msg, RuntimeError("Data too large"))
-        msg_str = msg.SerializeToString()
+        _convert_msg_to_exception_msg(envelope.msg, RuntimeError("Data too large"))
+        msg_str = envelope.msg.SerializeToString()
 
     return msg_str
 
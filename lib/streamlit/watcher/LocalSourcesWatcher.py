@@ -14,14 +14,19 @@
 
 import fnmatch
 import importlib
+import inspect
 import os
 import sys
+import threading
+import types
 import collections
+from typing import Any, Dict
 
 from streamlit import config
 from streamlit import env_util
 from streamlit import file_util
 from streamlit.folder_black_list import FolderBlackList
+from streamlit.watcher import util
 
 from streamlit.logger import get_logger
 
@@ -70,7 +75,185 @@ def get_file_watcher_class():
 
 FileWatcher = get_file_watcher_class()
 
-WatchedModule = collections.namedtuple("WatchedModule", ["watcher", "module_name"])
+WatchedModule = collections.namedtuple("WatchedModule", ["module_name"])
+
+# A module that update_watched_modules() has looked at. filepath is None if
+# its file isn't watched.
+ExaminedModule = collections.namedtuple("ExaminedModule", ["module_id", "filepath"])
+
+
+class _WorkerModule(object):
+    """Stands in for a module that a script worker process loaded (see
+    ProcessScriptRunner), since it isn't in the server's sys.modules."""
+
+    def __init__(self, filepath, package):
+        self.__file__ = filepath
+        self.__package__ = package
+
+
+class SourceWatchRegistry(object):
+    """Watches source files on behalf of all LocalSourcesWatchers.
+
+    Sessions running the same script watch the same files. Rather than each
+    of them creating its own FileWatcher (and stat'ing and hashing the file
+    on every change), each file gets a single FileWatcher here, whose
+    changes are fanned out to every subscribed callback.
+
+    Since sys.modules is shared by all sessions, the modules that a change
+    makes stale are unloaded here too, once, before the callbacks are
+    called.
+
+    When scripts run in worker processes, their modules are loaded in the
+    workers' sys.modules instead. The workers report those modules here, so
+    that they're watched too, and the ones that a change makes stale are
+    recorded for each worker to unload before its next run.
+    """
+
+    def __init__(self):
+        # Dict[filepath] -> FileWatcher
+        self._watchers = {}
+
+        # Dict[filepath] -> List[callback]
+        self._subscribers = {}
+
+        # Dict[module name] -> _WorkerModule, for the modules that script
+        # worker processes have loaded.
+        self._worker_modules = {}  # type: Dict[str, _WorkerModule]
+
+        # Dict[module name] -> the unload generation at which the workers'
+        # copy of the module became stale.
+        self._worker_unloads = {}  # type: Dict[str, int]
+        self._worker_unload_generation = 0
+
+        # Protects all of the above.
+        self._lock = threading.Lock()
+
+    def subscribe(self, filepath, callback):
+        """Call the given callback with the file's path when it changes.
+
+        Parameters
+        ----------
+        filepath : str
+            Absolute path of the file to watch.
+
+        callback : callable
+            Function to call when the file changes.
+
+        Raises
+        ------
+        PermissionError
+            If the file can't be read.
+
+        """
+        with self._lock:
+            subscribers = self._subscribers.get(filepath, None)
+            if subscribers is None:
+                # This raises PermissionError if we can't read the file.
+                self._watchers[filepath] = FileWatcher(filepath, self._on_file_changed)
+                subscribers = self._subscribers[filepath] = []
+
+            subscribers.append(callback)
+
+    def unsubscribe(self, filepath, callback):
+        """Stop calling the given callback when the file changes, and stop
+        watching the file once nothing is subscribed to it."""
+        with self._lock:
+            subscribers = self._subscribers.get(filepath, None)
+            if subscribers is None or callback not in subscribers:
+                return
+
+            subscribers.remove(callback)
+            if len(subscribers) == 0:
+                self._watchers.pop(filepath).close()
+                del self._subscribers[filepath]
+
+    def add_worker_modules(self, modules):
+        """Record modules that a script worker process loaded.
+
+        Parameters
+        ----------
+        modules : list of (str, str, str | None)
+            Each module's name, the absolute path of its file, and its
+            package.
+
+        """
+        with self._lock:
+            for name, filepath, package in modules:
+                module = self._worker_modules.get(name, None)
+                if (
+                    module is None
+                    or module.__file__ != filepath
+                    or module.__package__ != package
+                ):
+                    self._worker_modules[name] = _WorkerModule(filepath, package)
+
+    def get_modules(self):
+        """Return a copy of sys.modules, plus stand-ins for the modules that
+        only script worker processes have loaded."""
+        with self._lock:
+            modules = dict(self._worker_modules)  # type: Dict[str, Any]
+        modules.update(sys.modules)
+        return modules
+
+    def get_worker_modules_to_unload(self, generation):
+        """Return the modules that script workers must unload to catch up
+        with changes since the given unload generation.
+
+        Parameters
+        ----------
+        generation : int
+            The generation returned by the worker's previous call, or 0.
+
+        Returns
+        -------
+        (int, list of str)
+            The current generation, and the names of the modules to unload.
+
+        """
+        with self._lock:
+            return (
+                self._worker_unload_generation,
+                [
+                    name
+                    for name, unloaded_at in self._worker_unloads.items()
+                    if unloaded_at > generation
+                ],
+            )
+
+    def _on_file_changed(self, filepath):
+        with self._lock:
+            callbacks = list(self._subscribers.get(filepath, []))
+            watched_filepaths = set(self._watchers)
+
+        if len(callbacks) == 0:
+            return
+
+        # Unload the changed module and all of the modules which import it
+        # (directly or indirectly), so that when the sessions exec the
+        # application code, the changes are reloaded and reflected in the
+        # running application. Other modules stay loaded.
+        module_names = _get_modules_to_unload(
+            filepath, watched_filepaths, self.get_modules()
+        )
+        with self._lock:
+            self._worker_unload_generation += 1
+            for module_name in module_names:
+                _unload_module(module_name)
+                if self._worker_modules.pop(module_name, None) is not None:
+                    self._worker_unloads[module_name] = self._worker_unload_generation
+
+        for callback in callbacks:
+            callback(filepath)
+
+    def get_stats(self):
+        """Return a dict of statistics about the watched files."""
+        with self._lock:
+            return {
+                "num_files": len(self._watchers),
+                "num_subscriptions": sum(
+                    len(subscribers) for subscribers in self._subscribers.values()
+                ),
+            }
 
 
 class LocalSourcesWatcher(object):
@@ -87,37 +270,30 @@ class LocalSourcesWatcher(object):
         # A dict of filepath -> WatchedModule.
         self._watched_modules = {}
 
+        # A dict of module name -> ExaminedModule, for the modules in
+        # sys.modules at the last update_watched_modules() call.
+        self._examined_modules = {}
+
+        # How many of the examined modules were loaded from each file.
+        self._filepath_counts = collections.Counter()  # type: Dict[str, int]
+
         self._register_watcher(
             self._report.script_path,
             module_name=None,  # Only the root script has None here.
         )
 
     def on_file_changed(self, filepath):
+        """Called by the source_watch_registry when a watched file changes,
+        once it has unloaded the modules that the change made stale."""
         if filepath not in self._watched_modules:
             LOGGER.error("Received event for non-watched file: %s", filepath)
             return
 
-        # Workaround:
-        # Delete all watched modules so we can guarantee changes to the
-        # updated module are reflected on reload.
-        #
-        # In principle, for reloading a given module, we only need to unload
-        # the module itself and all of the modules which import it (directly
-        # or indirectly) such that when we exec the application code, the
-        # changes are reloaded and reflected in the running application.
-        #
-        # However, determining all import paths for a given loaded module is
-        # non-trivial, and so as a workaround we simply unload all watched
-        # modules.
-        for wm in self._watched_modules.values():
-            if wm.module_name is not None and wm.module_name in sys.modules:
-                del sys.modules[wm.module_name]
-
         self._on_file_changed()
 
     def close(self):
-        for wm in self._watched_modules.values():
-            wm.watcher.close()
+        for filepath in self._watched_modules:
+            source_watch_registry.unsubscribe(filepath, self.on_file_changed)
         self._watched_modules = {}
         self._is_closed = True
 
@@ -126,16 +302,13 @@ class LocalSourcesWatcher(object):
             return
 
         try:
-            wm = WatchedModule(
-                watcher=FileWatcher(filepath, self.on_file_changed),
-                module_name=module_name,
-            )
+            source_watch_registry.subscribe(filepath, self.on_file_changed)
         except PermissionError:
             # If you don't have permission to read this file, don't even add it
             # to watchers.
             return
 
-        self._watched_modules[filepath] = wm
+        self._watched_modules[filepath] = WatchedModule(module_name=module_name)
 
     def _deregister_watcher(self, filepath):
         if filepath not in self._watched_modules:
@@ -144,8 +317,7 @@ class LocalSourcesWatcher(object):
         if filepath == self._report.script_path:
             return
 
-        wm = self._watched_modules[filepath]
-        wm.watcher.close()
+        source_watch_registry.unsubscribe(filepath, self.on_file_changed)
         del self._watched_modules[filepath]
 
     def _file_is_new(self, filepath):
@@ -159,63 +331,242 @@ class LocalSourcesWatcher(object):
         )
 
     def update_watched_modules(self):
+        """Watch the files of newly-loaded modules, and stop watching the
+        files of unloaded ones.
+
+        Each module is only examined once, the first time we see it in
+        sys.modules, so this doesn't touch the file system for modules that
+        were already loaded at the last update. Modules that script worker
+        processes loaded are included.
+        """
         if self._is_closed:
             return
 
-        local_filepaths = []
+        # Clone modules dict here because it may change while we loop.
+        modules = source_watch_registry.get_modules()
+
+        # Files whose modules were unloaded or replaced.
+        stale_filepaths = set()
 
-        # Clone modules dict here because we may alter the original dict inside
-        # the loop.
-        modules = dict(sys.modules)
+        for name in list(self._examined_modules):
+            if name not in modules:
+                stale_filepaths.add(self._forget_module(name))
 
         for name, module in modules.items():
-            try:
-                spec = getattr(module, "__spec__", None)
-
-                if spec is None:
-                    filepath = getattr(module, "__file__", None)
-                    if filepath is None:
-                        # Some modules have neither a spec nor a file. But we
-                        # can ignore those since they're not the user-created
-                        # modules we want to watch anyway.
-                        continue
-                else:
-                    filepath = spec.origin
+            examined = self._examined_modules.get(name, None)
+            if examined is not None:
+                if examined.module_id == id(module):
+                    continue
+                # The module was reloaded since we examined it.
+                stale_filepaths.add(self._forget_module(name))
+
+            filepath = self._get_module_filepath(module)
+            self._examined_modules[name] = ExaminedModule(id(module), filepath)
+            if filepath is None:
+                continue
+
+            self._filepath_counts[filepath] += 1
+
+            if self._file_should_be_watched(filepath):
+                self._register_watcher(filepath, name)
 
+        # Remove no-longer-depended-on files from self._watched_modules
+        for filepath in stale_filepaths:
+            if filepath is not None and filepath not in self._filepath_counts:
+                self._deregister_watcher(filepath)
+
+    def _forget_module(self, name):
+        """Forget an examined module, and return its file path, if any."""
+        filepath = self._examined_modules.pop(name).filepath
+        if filepath is not None:
+            self._filepath_counts[filepath] -= 1
+            if self._filepath_counts[filepath] <= 0:
+                del self._filepath_counts[filepath]
+        return filepath
+
+    def _get_module_filepath(self, module):
+        """Return the absolute path of the module's file, or None if it has
+        no file or the file shouldn't be watched."""
+        try:
+            spec = getattr(module, "__spec__", None)
+
+            if spec is None:
+                filepath = getattr(module, "__file__", None)
                 if filepath is None:
-                    # Built-in modules (and other stuff) don't have origins.
+                    # Some modules have neither a spec nor a file. But we
+                    # can ignore those since they're not the user-created
+                    # modules we want to watch anyway.
+                    return None
+            else:
+                filepath = spec.origin
+
+            if filepath is None:
+                # Built-in modules (and other stuff) don't have origins.
+                return None
+
+            filepath = os.path.abspath(filepath)
+
+            if not os.path.isfile(filepath):
+                # There are some modules that have a .origin, but don't
+                # point to real files. For example, there's a module where
+                # .origin is 'built-in'.
+                return None
+
+            if self._folder_black_list.is_blacklisted(filepath):
+                return None
+
+            return filepath
+
+        except Exception:
+            # In case there's a problem introspecting some specific module,
+            # let's not stop the entire loop from running.  For example,
+            # the __spec__ field in some modules (like IPython) is actually
+            # a dynamic property, which can crash if the underlying
+            # module's code has a bug (as discovered by one of our users).
+            return None
+
+
+def _get_modules_to_unload(changed_filepath, watched_filepaths, modules):
+    """Return the names of the loaded modules from the given file, and of
+    the loaded modules from watched files that depend on them.
+
+    Parameters
+    ----------
+    changed_filepath : str
+        The absolute path of the file that changed.
+
+    watched_filepaths : set of str
+        The absolute paths of all watched files.
+
+    modules : dict
+        A copy of the loaded modules. See SourceWatchRegistry.get_modules().
+
+    Returns
+    -------
+    list of str
+
+    """
+    # Dict[filepath] -> names of the loaded modules from that file.
+    module_names = collections.defaultdict(list)
+    for name, module in modules.items():
+        if name == "__main__":
+            # The script's module, which is re-created on every run.
+            continue
+        filepath = _get_module_file(module)
+        if filepath in watched_filepaths:
+            module_names[filepath].append(name)
+
+    # Dict[filepath] -> files of the modules that depend on that file.
+    importers = collections.defaultdict(set)
+    for filepath, names in module_names.items():
+        for name in names:
+            deps = _get_module_dependencies(modules[name], filepath, modules)
+            if deps is None:
+                # We can't tell what this module depends on, so assume it
+                # depends on everything.
+                deps = watched_filepaths
+            for dep in deps:
+                importers[dep].add(filepath)
+
+    filepaths_to_unload = {changed_filepath}
+    stack = [changed_filepath]
+    while stack:
+        for importer in importers.get(stack.pop(), ()):
+            if importer not in filepaths_to_unload:
+                filepaths_to_unload.add(importer)
+                stack.append(importer)
+
+    return [
+        name
+        for filepath in filepaths_to_unload
+        for name in module_names.get(filepath, [])
+    ]
+
+
+def _get_module_dependencies(module, filepath, modules):
+    """Return the files of the modules that the given module imports or
+    uses, or None if we can't tell.
+
+    Parameters
+    ----------
+    module : ModuleType
+        The module.
+
+    filepath : str
+        The absolute path of the module's file.
+
+    modules : dict
+        A copy of sys.modules.
+
+    Returns
+    -------
+    set of str | None
+
+    """
+    try:
+        spec = getattr(module, "__spec__", None)
+        package = spec.parent if spec is not None else module.__package__
+
+        dep_filepaths = set()
+
+        # Modules imported anywhere in the module's source. This catches
+        # e.g. "from helpers import SOME_CONSTANT".
+        for name in util.get_imported_module_names(filepath, package):
+            dep_filepaths.add(_get_module_file(modules.get(name, None)))
+
+        # Modules, classes and functions in the module's namespace. This
+        # catches modules that are loaded under other names.
+        for attr_name, value in list(vars(module).items()):
+            if isinstance(value, types.ModuleType):
+                if value.__name__ == "%s.%s" % (module.__name__, attr_name):
+                    # The import system sets each submodule of a package as
+                    # an attribute of it, whether or not the package uses
+                    # it. (If it imports it, we found that above.)
                     continue
+                dep_filepaths.add(_get_module_file(value))
+            elif inspect.isclass(value) or inspect.isfunction(value):
+                name = getattr(value, "__module__", None)
+                dep_filepaths.add(_get_module_file(modules.get(name, None)))
 
-                filepath = os.path.abspath(filepath)
+        dep_filepaths.discard(None)
+        dep_filepaths.discard(filepath)
+        return dep_filepaths
 
-                if not os.path.isfile(filepath):
-                    # There are some modules that have a .origin, but don't
-                    # point to real files. For example, there's a module where
-                    # .origin is 'built-in'.
-                    continue
+    except Exception as e:
+        LOGGER.debug("Unable to get the dependencies of %s: %s", filepath, e)
+        return None
 
-                if self._folder_black_list.is_blacklisted(filepath):
-                    continue
 
-                local_filepaths.append(filepath)
+def _get_module_file(module):
+    """Return the absolute path of the module's file, if it has one."""
+    try:
+        filepath = getattr(module, "__file__", None)
+        if not isinstance(filepath, str):
+            return None
+        return os.path.abspath(filepath)
+    except Exception:
+        # Some modules' attributes are dynamic properties, which can crash.
+        return None
 
-                if self._file_should_be_watched(filepath):
-                    self._register_watcher(filepath, name)
 
-            except Exception:
-                # In case there's a problem introspecting some specific module,
-                # let's not stop the entire loop from running.  For example,
-                # the __spec__ field in some modules (like IPython) is actually
-                # a dynamic property, which can crash if the underlying
-                # module's code has a bug (as discovered by one of our users).
-                continue
+def _unload_module(module_name):
+    """Remove a module from sys.modules, so that it's re-imported the next
+    time it's imported."""
+    module = sys.modules.pop(module_name, None)
+
+    # Also remove it from its parent package, which otherwise hands out
+    # the old module to "from package import module".
+    parent_name, _, child_name = module_name.rpartition(".")
+    parent = sys.modules.get(parent_name, None) if parent_name else None
+    if (
+        module is not None
+        and parent is not None
+        and getattr(parent, child_name, None) is module
+    ):
+        try:
+            delattr(parent, child_name)
+        except AttributeError:
+            pass
 
-        # Clone dict here because we may alter the original dict inside the
-        # loop.
-        watched_modules = dict(self._watched_modules)
 
-        # Remove no-longer-depended-on files from self._watched_modules
-        # Will this ever happen?
-        for filepath in watched_modules:
-            if filepath not in local_filepaths:
-                self._deregister_watcher(filepath)
+source_watch_registry = SourceWatchRegistry()
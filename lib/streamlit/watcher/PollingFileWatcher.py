@@ -14,8 +14,9 @@
 
 """A class that watches the file system"""
 
-from concurrent.futures import ThreadPoolExecutor
+import collections
 import os
+import threading
 import time
 
 from streamlit.watcher import util
@@ -25,15 +26,24 @@ from streamlit.logger import get_logger
 LOGGER = get_logger(__name__)
 
 
-_MAX_WORKERS = 4
+# How long to wait between polls, when watching few files.
 _POLLING_PERIOD_SECS = 0.2
 
+# How much longer to wait between polls for each watched file, so that the
+# poll loop's cost stays flat as the number of watched files grows.
+_POLLING_PERIOD_SECS_PER_FILE = 0.0001
+
+# The longest we'll wait between polls, however many files are watched.
+_MAX_POLLING_PERIOD_SECS = 1.0
+
+# Folders with at least this many watched files are listed with a single
+# os.scandir() call, rather than stat'ing each file.
+_MIN_FILES_TO_SCAN_FOLDER = 4
+
 
 class PollingFileWatcher(object):
     """Watches a single file on disk via a polling loop"""
 
-    _executor = ThreadPoolExecutor(max_workers=_MAX_WORKERS)
-
     @staticmethod
     def close_all():
         """Close top-level watcher object.
@@ -59,42 +69,189 @@ class PollingFileWatcher(object):
         self._file_path = file_path
         self._on_file_changed = on_file_changed
 
-        self._active = True
-        self._modification_time = os.stat(self._file_path).st_mtime
-        self._md5 = util.calc_md5_with_blocking_retries(self._file_path)
-        self._schedule()
+        _poller.watch(self)
 
-    def _schedule(self):
-        def task():
-            time.sleep(_POLLING_PERIOD_SECS)
-            self._check_if_file_changed()
+    def close(self):
+        """Stop watching the file system."""
+        _poller.unwatch(self)
 
-        PollingFileWatcher._executor.submit(task)
 
-    def _check_if_file_changed(self):
-        if not self._active:
-            # Don't call self._schedule()
-            return
+class _WatchedFile(object):
+    """The last-seen state of a polled file, and the watchers watching it."""
+
+    def __init__(self, file_path, modification_time, size, md5):
+        self.file_path = file_path
+        self.modification_time = modification_time
+        self.size = size
+        self.md5 = md5
+        self.watchers = []
+
+
+class _Poller(object):
+    """Polls all watched files from a single thread.
+
+    Each tick stats every watched file, in a batch per folder, and only
+    re-hashes the files whose modification time or size changed. The thread
+    runs while any files are watched.
+    """
+
+    def __init__(self):
+        # Dict[file path] -> _WatchedFile
+        self._watched_files = {}
+
+        # The polling thread, if it's running.
+        self._thread = None
+
+        # Protects all of the above.
+        self._lock = threading.Lock()
+
+    def watch(self, watcher):
+        file_path = watcher._file_path
+
+        with self._lock:
+            is_new = file_path not in self._watched_files
+
+        if is_new:
+            # Do the I/O outside the lock. This raises if the file can't be
+            # read.
+            stat = os.stat(file_path)
+            md5 = util.calc_md5_with_blocking_retries(file_path)
+
+        with self._lock:
+            watched_file = self._watched_files.get(file_path, None)
+            if watched_file is None:
+                watched_file = _WatchedFile(file_path, stat.st_mtime, stat.st_size, md5)
+                self._watched_files[file_path] = watched_file
+
+            watched_file.watchers.append(watcher)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="PollingFileWatcher"
+                )
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unwatch(self, watcher):
+        with self._lock:
+            watched_file = self._watched_files.get(watcher._file_path, None)
+            if watched_file is None or watcher not in watched_file.watchers:
+                return
+
+            watched_file.watchers.remove(watcher)
+            if len(watched_file.watchers) == 0:
+                del self._watched_files[watcher._file_path]
 
-        modification_time = os.stat(self._file_path).st_mtime
-        if modification_time <= self._modification_time:
-            self._schedule()
+    def _run(self):
+        while True:
+            with self._lock:
+                num_files = len(self._watched_files)
+                if num_files == 0:
+                    self._thread = None
+                    return
+
+            time.sleep(_get_polling_period(num_files))
+
+            with self._lock:
+                watched_files = list(self._watched_files.values())
+
+            try:
+                self._poll(watched_files)
+            except Exception:
+                # Keep polling, whatever went wrong.
+                LOGGER.exception("Error polling watched files")
+
+    def _poll(self, watched_files):
+        files_by_folder = collections.defaultdict(list)
+        for watched_file in watched_files:
+            folder = os.path.dirname(os.path.abspath(watched_file.file_path))
+            files_by_folder[folder].append(watched_file)
+
+        for folder, folder_files in files_by_folder.items():
+            stats = _stat_files(folder, [f.file_path for f in folder_files])
+            for watched_file in folder_files:
+                stat = stats.get(watched_file.file_path, None)
+                if stat is not None:
+                    self._check_if_file_changed(watched_file, *stat)
+
+    def _check_if_file_changed(self, watched_file, modification_time, size):
+        if (
+            modification_time == watched_file.modification_time
+            and size == watched_file.size
+        ):
             return
 
-        self._modification_time = modification_time
+        watched_file.modification_time = modification_time
+        watched_file.size = size
 
-        md5 = util.calc_md5_with_blocking_retries(self._file_path)
-        if md5 == self._md5:
-            self._schedule()
+        md5 = util.calc_md5_with_blocking_retries(watched_file.file_path)
+        if md5 == watched_file.md5:
             return
 
-        self._md5 = md5
+        watched_file.md5 = md5
 
-        LOGGER.debug("Change detected: %s", self._file_path)
-        self._on_file_changed(self._file_path)
+        LOGGER.debug("Change detected: %s", watched_file.file_path)
 
-        self._schedule()
+        with self._lock:
+            watchers = list(watched_file.watchers)
 
-    def close(self):
-        """Stop watching the file system."""
-        self._active = False
+        for watcher in watchers:
+            watcher._on_file_changed(watcher._file_path)
+
+
+def _get_polling_period(num_files):
+    """Return how long to wait between polls of the given number of files."""
+    polling_period = _POLLING_PERIOD_SECS + num_files * _POLLING_PERIOD_SECS_PER_FILE
+    return min(polling_period, max(_POLLING_PERIOD_SECS, _MAX_POLLING_PERIOD_SECS))
+
+
+def _stat_files(folder, file_paths):
+    """Return the modification times and sizes of the given files.
+
+    Parameters
+    ----------
+    folder : str
+        The absolute path of the folder the files are in.
+
+    file_paths : list of str
+        The paths of the files.
+
+    Returns
+    -------
+    dict
+        A dict of file path -> (modification time, size). Files that can't
+        be stat'ed (e.g. because they're being replaced) are left out.
+
+    """
+    stats = {}
+
+    if len(file_paths) < _MIN_FILES_TO_SCAN_FOLDER:
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            stats[file_path] = (stat.st_mtime, stat.st_size)
+        return stats
+
+    # Dict[absolute path] -> file path
+    paths = {os.path.abspath(file_path): file_path for file_path in file_paths}
+
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                file_path = paths.get(entry.path, None)
+                if file_path is None:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                stats[file_path] = (stat.st_mtime, stat.st_size)
+    except OSError as e:
+        LOGGER.debug("Unable to scan %s: %s", folder, e)
+
+    return stats
+
+
+_poller = _Poller()
@@ -18,7 +18,11 @@ These are functions that only make sense within the watcher. In particular,
 functions that use streamlit.config can go here to avoid a dependency cycle.
 """
 
+import ast
 import hashlib
+import importlib.util
+import os
+import threading
 import time
 
 
@@ -66,3 +70,82 @@ def calc_md5_with_blocking_retries(file_path):
 
     # Use hexdigest() instead of digest(), so it's easier to debug.
     return md5.hexdigest()
+
+
+# Dict[(file path, package)] -> ((mtime, size), set of module names)
+_imported_module_names_cache = {}  # type: ignore[var-annotated]
+_imported_module_names_cache_lock = threading.Lock()
+
+
+def get_imported_module_names(file_path, package):
+    """Return the names of the modules that a Python file imports.
+
+    These include the parent packages of the imported modules, and, for
+    "from x import y" statements, "x.y" (which may or may not be a module).
+    Results are cached until the file's modification time or size changes.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the file.
+
+    package : str | None
+        The package the file's module is in, which relative imports are
+        resolved against.
+
+    Returns
+    -------
+    set of str
+        The module names.
+
+    """
+    stat = os.stat(file_path)
+    stat_key = (stat.st_mtime_ns, stat.st_size)
+    cache_key = (file_path, package)
+
+    with _imported_module_names_cache_lock:
+        cached = _imported_module_names_cache.get(cache_key, None)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+
+    with open(file_path, "rb") as f:
+        tree = ast.parse(f.read(), file_path)
+
+    module_names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                module_names.update(_get_parent_module_names(alias.name))
+
+        elif isinstance(node, ast.ImportFrom):
+            if node.level > 0:
+                if not package:
+                    continue
+                try:
+                    base_name = importlib.util.resolve_name(
+                        "." * node.level + (node.module or ""), package
+                    )
+                except (ImportError, ValueError):
+                    # The import goes beyond the top-level package.
+                    continue
+            else:
+                base_name = node.module
+
+            module_names.update(_get_parent_module_names(base_name))
+            for alias in node.names:
+                if alias.name != "*":
+                    module_names.add("%s.%s" % (base_name, alias.name))
+
+    with _imported_module_names_cache_lock:
+        _imported_module_names_cache[cache_key] = (stat_key, module_names)
+
+    return module_names
+
+
+def _get_parent_module_names(module_name):
+    """Return the given module's name and its parent packages' names.
+
+    "a.b.c" -> ["a", "a.b", "a.b.c"]
+    """
+    parts = module_name.split(".")
+    return [".".join(parts[: i + 1]) for i in range(len(parts))]
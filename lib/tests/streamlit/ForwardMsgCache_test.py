@@ -14,13 +14,16 @@
 
 """Unit tests for MessageCache"""
 
+import gzip
 import unittest
 
 from mock import MagicMock
+from mock import patch
 
 from streamlit import ReportSession
 from streamlit import config
 from streamlit.ForwardMsgCache import ForwardMsgCache
+from streamlit.ForwardMsgCache import ForwardMsgEnvelope
 from streamlit.ForwardMsgCache import create_reference_msg
 from streamlit.ForwardMsgCache import populate_hash_if_needed
 from streamlit.elements import data_frame_proto
@@ -41,6 +44,14 @@ def _create_mock_session():
 
 
 class ForwardMsgCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._orig_max_cache_size = config.get_option("global.maxMessageCacheSize")
+
+    def tearDown(self):
+        config._set_option(
+            "global.maxMessageCacheSize", self._orig_max_cache_size, "test"
+        )
+
     def test_msg_hash(self):
         """Test that ForwardMsg hash generation works as expected"""
         msg1 = _create_dataframe_msg([1, 2, 3])
@@ -65,6 +76,76 @@ class ForwardMsgCacheTest(unittest.TestCase):
         self.assertEqual(populate_hash_if_needed(msg), ref_msg.ref_hash)
         self.assertEqual(msg.metadata, ref_msg.metadata)
 
+    def test_envelope(self):
+        """Test that a ForwardMsgEnvelope serializes to the same message."""
+        msg = _create_dataframe_msg([1, 2, 3], 34)
+        msg.metadata.cacheable = True
+        envelope = ForwardMsgEnvelope(msg)
+
+        self.assertEqual(populate_hash_if_needed(msg.__deepcopy__()), envelope.hash)
+
+        # The body doesn't depend on the message's metadata.
+        other_msg = _create_dataframe_msg([1, 2, 3], 35)
+        self.assertEqual(ForwardMsgEnvelope(other_msg).body, envelope.body)
+
+        parsed = ForwardMsg()
+        parsed.ParseFromString(envelope.serialize())
+        self.assertEqual(msg, parsed)
+        self.assertEqual(envelope.hash, parsed.hash)
+
+        # Metadata changes after the body is computed are still serialized.
+        msg.metadata.cacheable = False
+        parsed.ParseFromString(envelope.serialize())
+        self.assertFalse(parsed.metadata.cacheable)
+
+    def test_envelope_serializes_once(self):
+        """Test that the cache reuses an envelope's body."""
+        msg = _create_dataframe_msg([1, 2, 3])
+        envelope = ForwardMsgEnvelope(msg)
+        body = envelope.body
+
+        cache = ForwardMsgCache()
+        session = _create_mock_session()
+        self.assertFalse(cache.has_message_reference(envelope, session, 0))
+        cache.add_message(envelope, session, 0)
+        self.assertTrue(cache.has_message_reference(envelope, session, 0))
+
+        # The cache keeps a single copy of the full message, which the
+        # envelope reuses when it's sent.
+        cached = cache.get_envelope(envelope.hash)
+        self.assertEqual(body, cached.body)
+        self.assertIs(cached.serialize(), envelope.serialize())
+        self.assertIs(cached.serialize(), cached.serialize())
+
+    def test_shared_payloads(self):
+        """Test that identical messages from different sessions share a
+        single stored payload."""
+        cache = ForwardMsgCache()
+        session1 = _create_mock_session()
+        session2 = _create_mock_session()
+
+        envelope1 = ForwardMsgEnvelope(_create_dataframe_msg([1, 2, 3], 1))
+        envelope2 = ForwardMsgEnvelope(_create_dataframe_msg([1, 2, 3], 2))
+        self.assertIsNot(envelope1.body, envelope2.body)
+
+        cache.add_message(envelope1, session1, 0)
+        cache.add_message(envelope2, session2, 0)
+
+        self.assertIs(cache.get_envelope(envelope1.hash).body, envelope2.body)
+        self.assertEqual(1, cache.get_stats()["num_entries"])
+        self.assertEqual(1, cache.get_stats()["shared_payloads"])
+
+        # The cache doesn't hold on to the sessions' ForwardMsgs, but can
+        # still decode them.
+        cached = cache.get_envelope(envelope1.hash)
+        self.assertIsNot(envelope1.msg, cached.msg)
+        self.assertEqual(envelope1.msg, cached.decode())
+
+        # Each session's message is serialized with its own metadata.
+        parsed = ForwardMsg()
+        parsed.ParseFromString(envelope2.serialize())
+        self.assertEqual(2, parsed.metadata.delta_id)
+
     def test_add_message(self):
         """Test MessageCache.add_message and has_message_reference"""
         cache = ForwardMsgCache()
@@ -86,6 +167,24 @@ class ForwardMsgCacheTest(unittest.TestCase):
         cache.add_message(msg, session, 0)
         self.assertEqual(msg, cache.get_message(msg_hash))
 
+    def test_get_gzipped_message(self):
+        """A message's gzipped form is kept with its entry, and counts toward
+        the cache's size."""
+        cache = ForwardMsgCache()
+        msg = _create_dataframe_msg([1, 2, 3])
+        msg_hash = populate_hash_if_needed(msg)
+        cache.add_message(msg, _create_mock_session(), 0)
+        msg_str = ForwardMsgEnvelope(msg).serialize()
+        size = cache.get_stats()["total_size"]
+
+        gzipped = cache.get_gzipped_message(msg_hash, msg_str, 6)
+        self.assertEqual(msg_str, gzip.decompress(gzipped))
+        self.assertEqual(size + len(gzipped), cache.get_stats()["total_size"])
+
+        with patch("gzip.compress") as compress:
+            self.assertIs(gzipped, cache.get_gzipped_message(msg_hash, msg_str, 6))
+        compress.assert_not_called()
+
     def test_clear(self):
         """Test MessageCache.clear"""
         cache = ForwardMsgCache()
@@ -139,3 +238,153 @@ class ForwardMsgCacheTest(unittest.TestCase):
         runcount2 += 2
         cache.remove_expired_session_entries(session2, runcount2)
         self.assertIsNone(cache.get_message(msg_hash))
+
+    def test_lru_eviction(self):
+        """Test that the cache evicts its least-recently-used entries when
+        it grows past its size budget."""
+        msg1 = _create_dataframe_msg([1, 2, 3])
+        msg2 = _create_dataframe_msg([2, 3, 4])
+        msg3 = _create_dataframe_msg([3, 4, 5])
+        for msg in (msg1, msg2, msg3):
+            populate_hash_if_needed(msg)
+
+        # Room for two messages, but not three.
+        msg_size = ForwardMsgEnvelope(msg1).body_size
+        config._set_option("global.maxMessageCacheSize", msg_size * 2.5, "test")
+
+        cache = ForwardMsgCache()
+        session1 = _create_mock_session()
+        session2 = _create_mock_session()
+
+        cache.add_message(msg1, session1, 0)
+        cache.add_message(msg2, session2, 0)
+
+        # Touch msg1, so that msg2 becomes the least-recently-used entry.
+        self.assertTrue(cache.has_message_reference(msg1, session1, 0))
+
+        cache.add_message(msg3, session1, 0)
+        self.assertIsNotNone(cache.get_message(msg1.hash))
+        self.assertIsNone(cache.get_message(msg2.hash))
+        self.assertIsNotNone(cache.get_message(msg3.hash))
+
+        # session2's reference is gone, so the server will resend msg2 in full.
+        self.assertFalse(cache.has_message_reference(msg2, session2, 0))
+
+        stats = cache.get_stats()
+        self.assertEqual(2, stats["num_entries"])
+        self.assertEqual(1, stats["evictions"])
+        self.assertLessEqual(stats["total_size"], stats["max_size"])
+
+    def test_oversized_message_not_cached(self):
+        """Test that a message larger than the whole budget is not cached."""
+        msg = _create_dataframe_msg([1, 2, 3])
+        msg_size = ForwardMsgEnvelope(msg).body_size
+        config._set_option("global.maxMessageCacheSize", msg_size - 1, "test")
+
+        cache = ForwardMsgCache()
+        session = _create_mock_session()
+        cache.add_message(msg, session, 0)
+
+        self.assertIsNone(cache.get_message(populate_hash_if_needed(msg)))
+        self.assertFalse(cache.has_message_reference(msg, session, 0))
+        self.assertEqual(0, cache.get_stats()["total_size"])
+
+    def test_stats(self):
+        """Test MessageCache.get_stats"""
+        config._set_option("global.maxMessageCacheSize", 0, "test")
+
+        cache = ForwardMsgCache()
+        session = _create_mock_session()
+        msg = _create_dataframe_msg([1, 2, 3])
+        populate_hash_if_needed(msg)
+
+        self.assertFalse(cache.has_message_reference(msg, session, 0))
+        cache.add_message(msg, session, 0)
+        self.assertTrue(cache.has_message_reference(msg, session, 0))
+        self.assertTrue(cache.has_message_reference(msg, session, 0))
+        cache.get_message(msg.hash)
+        cache.get_message("not_a_hash")
+
+        stats = cache.get_stats()
+        self.assertEqual(1, stats["num_entries"])
+        self.assertEqual(ForwardMsgEnvelope(msg).body_size, stats["total_size"])
+        self.assertEqual(2, stats["ref_hits"])
+        self.assertEqual(1, stats["ref_misses"])
+        self.assertAlmostEqual(2 / 3, stats["ref_hit_ratio"])
+        self.assertEqual(1, stats["fetch_hits"])
+        self.assertEqual(1, stats["fetch_misses"])
+
+        cache.clear()
+        self.assertEqual(0, cache.get_stats()["total_size"])
+
+    def test_session_ref_index(self):
+        """Test that re-adding a message moves the session's reference to a
+        newer run count, so it isn't expired along with the old run."""
+        config._set_option("global.maxCachedMessageAge", 1, "test")
+
+        cache = ForwardMsgCache()
+        session = _create_mock_session()
+
+        msg1 = _create_dataframe_msg([1, 2, 3])
+        msg2 = _create_dataframe_msg([2, 3, 4])
+        msg1_hash = populate_hash_if_needed(msg1)
+        msg2_hash = populate_hash_if_needed(msg2)
+
+        cache.add_message(msg1, session, 0)
+        cache.add_message(msg2, session, 0)
+
+        # msg1 is referenced again by a later run.
+        cache.add_message(msg1, session, 2)
+
+        cache.remove_expired_session_entries(session, 3)
+        self.assertIsNotNone(cache.get_message(msg1_hash))
+        self.assertIsNone(cache.get_message(msg2_hash))
+        self.assertTrue(cache.has_message_reference(msg1, session, 3))
+
+        cache.remove_expired_session_entries(session, 4)
+        self.assertIsNone(cache.get_message(msg1_hash))
+
+    def test_expiry_after_eviction(self):
+        """Test that expiring a session's references skips entries that
+        have already been evicted."""
+        config._set_option("global.maxCachedMessageAge", 1, "test")
+
+        msg1 = _create_dataframe_msg([1, 2, 3])
+        msg2 = _create_dataframe_msg([2, 3, 4])
+        msg_size = ForwardMsgEnvelope(msg1).body_size
+        config._set_option("global.maxMessageCacheSize", msg_size * 1.5, "test")
+
+        cache = ForwardMsgCache()
+        session1 = _create_mock_session()
+        session2 = _create_mock_session()
+
+        cache.add_message(msg1, session1, 0)
+        cache.add_message(msg2, session2, 0)
+        self.assertIsNone(cache.get_message(msg1.hash))
+
+        cache.remove_expired_session_entries(session1, 2)
+        cache.remove_expired_session_entries(session2, 2)
+        self.assertEqual(0, cache.get_stats()["num_entries"])
+        self.assertEqual(0, cache.get_stats()["total_size"])
+
+    def test_remove_session_entries(self):
+        """Test that removing all of a session's references keeps the
+        entries other sessions still reference."""
+        cache = ForwardMsgCache()
+        session1 = _create_mock_session()
+        session2 = _create_mock_session()
+
+        msg1 = _create_dataframe_msg([1, 2, 3])
+        msg2 = _create_dataframe_msg([2, 3, 4])
+        msg1_hash = populate_hash_if_needed(msg1)
+        msg2_hash = populate_hash_if_needed(msg2)
+
+        cache.add_message(msg1, session1, 0)
+        cache.add_message(msg2, session1, 1)
+        cache.add_message(msg2, session2, 0)
+
+        cache.remove_session_entries(session1)
+        self.assertIsNone(cache.get_message(msg1_hash))
+        self.assertIsNotNone(cache.get_message(msg2_hash))
+        self.assertFalse(cache.has_message_reference(msg2, session1, 1))
+        self.assertTrue(cache.has_message_reference(msg2, session2, 0))
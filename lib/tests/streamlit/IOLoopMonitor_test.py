@@ -0,0 +1,73 @@
+# Copyright 2018-2020 Streamlit Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""IOLoopMonitor unit tests."""
+
+import time
+
+import tornado.gen
+import tornado.testing
+from mock import patch
+
+from streamlit.server.IOLoopMonitor import IOLoopMonitor
+
+
+class IOLoopMonitorTest(tornado.testing.AsyncTestCase):
+    def setUp(self):
+        super(IOLoopMonitorTest, self).setUp()
+        self.monitor = IOLoopMonitor(self.io_loop, stall_threshold=0.05)
+
+    def tearDown(self):
+        self.monitor.stop()
+        super(IOLoopMonitorTest, self).tearDown()
+
+    @tornado.testing.gen_test
+    def test_no_stall(self):
+        """The lag is recorded, and nothing is logged while the IOLoop runs
+        its callbacks on time."""
+        with patch("streamlit.server.IOLoopMonitor.LOGGER") as logger:
+            self.monitor.start()
+            yield tornado.gen.sleep(0.3)
+
+        logger.warning.assert_not_called()
+        stats = self.monitor.get_stats()
+        self.assertEqual(0, stats["num_stalls"])
+        self.assertLess(stats["max_lag"], 0.05)
+
+    @tornado.testing.gen_test
+    def test_stall(self):
+        """A blocked IOLoop is logged with a sample of its stack."""
+
+        def block_ioloop():
+            time.sleep(0.3)
+
+        with patch("streamlit.server.IOLoopMonitor.LOGGER") as logger:
+            self.monitor.start()
+            self.io_loop.add_callback(block_ioloop)
+
+            # Wait for the monitor to notice that the stall is over.
+            for _ in range(100):
+                yield tornado.gen.sleep(0.02)
+                if self.monitor.get_stats()["num_stalls"] > 0:
+                    break
+
+        stats = self.monitor.get_stats()
+        self.assertEqual(1, stats["num_stalls"])
+        self.assertGreaterEqual(stats["max_lag"], 0.2)
+
+        # One warning when the stall was detected, with a stack sample, and
+        # one when it ended.
+        self.assertEqual(2, logger.warning.call_count)
+        sample = logger.warning.call_args_list[0][0][-1]
+        self.assertIn("block_ioloop", sample)
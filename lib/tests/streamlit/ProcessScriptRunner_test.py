@@ -0,0 +1,339 @@
+# Copyright 2018-2020 Streamlit Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""ProcessScriptRunner unit tests."""
+
+import io
+import os
+import tempfile
+import time
+import unittest
+
+from mock import MagicMock
+from mock import patch
+
+from streamlit import config
+from streamlit.MediaFileManager import media_file_manager
+from streamlit.ProcessScriptRunner import ProcessScriptRunner
+from streamlit.ProcessScriptRunner import _open_uploaded_file
+from streamlit.ProcessScriptRunner import script_process_pool
+from streamlit.Report import Report
+from streamlit.ReportQueue import ReportQueue
+from streamlit.ScriptRequestQueue import RerunData
+from streamlit.ScriptRequestQueue import ScriptRequest
+from streamlit.ScriptRequestQueue import ScriptRequestQueue
+from streamlit.ScriptRunner import ScriptRunnerEvent
+from streamlit.UploadedFileManager import UploadedFile
+from streamlit.UploadedFileManager import UploadedFileManager
+from streamlit.proto.Widget_pb2 import WidgetStates
+from streamlit.watcher.LocalSourcesWatcher import source_watch_registry
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), "scriptrunner", "test_data")
+
+
+class ProcessScriptRunnerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._num_processes = config.get_option("global.numScriptProcesses")
+        config._set_option("global.numScriptProcesses", 1, "test")
+
+    @classmethod
+    def tearDownClass(cls):
+        script_process_pool.shutdown()
+        config._set_option("global.numScriptProcesses", cls._num_processes, "test")
+
+    def test_run_script(self):
+        """The script's deltas and events are relayed from the worker."""
+        scriptrunner = TestProcessScriptRunner(
+            os.path.join(TEST_DATA_DIR, "good_script.py")
+        )
+        scriptrunner.enqueue_rerun()
+        scriptrunner.start()
+        scriptrunner.join()
+
+        self.assertEqual(
+            [
+                ScriptRunnerEvent.SCRIPT_STARTED,
+                ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS,
+                ScriptRunnerEvent.SHUTDOWN,
+            ],
+            scriptrunner.events,
+        )
+        self.assertEqual(["complete! 👨‍🎤"], scriptrunner.text_deltas())
+
+    def test_compile_error(self):
+        """Compile errors are relayed from the worker."""
+        scriptrunner = TestProcessScriptRunner(
+            os.path.join(TEST_DATA_DIR, "compile_error.py.txt")
+        )
+        scriptrunner.enqueue_rerun()
+        scriptrunner.start()
+        scriptrunner.join()
+
+        self.assertEqual(
+            [
+                ScriptRunnerEvent.SCRIPT_STARTED,
+                ScriptRunnerEvent.SCRIPT_STOPPED_WITH_COMPILE_ERROR,
+                ScriptRunnerEvent.SHUTDOWN,
+            ],
+            scriptrunner.events,
+        )
+
+    def test_stop_script(self):
+        """A STOP request interrupts the script in the worker, and the worker
+        is reused for the next run."""
+        num_started = script_process_pool.get_stats()["num_workers_started"]
+
+        scriptrunner = TestProcessScriptRunner(
+            os.path.join(TEST_DATA_DIR, "infinite_loop.py")
+        )
+        scriptrunner.enqueue_rerun()
+        scriptrunner.start()
+
+        while "loop_forever" not in scriptrunner.text_deltas():
+            time.sleep(0.01)
+
+        scriptrunner.enqueue_stop()
+        scriptrunner.join()
+
+        self.assertEqual(
+            [
+                ScriptRunnerEvent.SCRIPT_STARTED,
+                ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS,
+                ScriptRunnerEvent.SHUTDOWN,
+            ],
+            scriptrunner.events,
+        )
+        self.assertLessEqual(
+            script_process_pool.get_stats()["num_workers_started"], num_started + 1
+        )
+
+    def test_worker_crash(self):
+        """If the worker dies, the run ends with an error, and the next run
+        gets a new worker."""
+        with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+            f.write("import os\nos._exit(1)\n")
+        try:
+            scriptrunner = TestProcessScriptRunner(f.name)
+            scriptrunner.enqueue_rerun()
+            scriptrunner.start()
+            scriptrunner.join()
+        finally:
+            os.remove(f.name)
+
+        self.assertEqual(
+            [
+                ScriptRunnerEvent.SCRIPT_STARTED,
+                ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS,
+                ScriptRunnerEvent.SHUTDOWN,
+            ],
+            scriptrunner.events,
+        )
+        self.assertEqual(1, len(scriptrunner.exception_deltas()))
+        self.assertEqual(0, script_process_pool.get_stats()["num_workers"])
+
+        scriptrunner = TestProcessScriptRunner(
+            os.path.join(TEST_DATA_DIR, "good_script.py")
+        )
+        scriptrunner.enqueue_rerun()
+        scriptrunner.start()
+        scriptrunner.join()
+        self.assertEqual(["complete! 👨‍🎤"], scriptrunner.text_deltas())
+
+    def test_media_files(self):
+        """Media files are added to the server process's MediaFileManager,
+        under the URLs that the worker's script gave them. Errors adding
+        files from paths are raised in the script."""
+        with tempfile.NamedTemporaryFile("wb", suffix=".mp4", delete=False) as f:
+            f.write(b"fake video data")
+        with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as script:
+            script.write(
+                "import streamlit as st\n"
+                "st.audio(b'fake audio data')\n"
+                "st.video(%r)\n"
+                "st.video(%r)\n" % (f.name, f.name + ".missing")
+            )
+        try:
+            scriptrunner = TestProcessScriptRunner(script.name)
+            scriptrunner.enqueue_rerun()
+            scriptrunner.start()
+            scriptrunner.join()
+        finally:
+            os.remove(f.name)
+            os.remove(script.name)
+
+        elements = scriptrunner._new_elements()
+        audio_url = elements[0].audio.url
+        video_url = elements[1].video.url
+        for url, content in [
+            (audio_url, b"fake audio data"),
+            (video_url, b"fake video data"),
+        ]:
+            file_id = url.split("/")[-1].split(".")[0]
+            self.assertEqual(content, media_file_manager.get(file_id).content)
+
+        self.assertEqual(1, len(scriptrunner.exception_deltas()))
+
+    def test_shutdown_busy_worker(self):
+        """A worker that's busy when the pool is shut down is shut down once
+        its run is done."""
+        worker = script_process_pool.acquire("test session id")
+        script_process_pool.shutdown()
+        self.assertTrue(worker.is_alive())
+
+        script_process_pool.release(worker)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(0, script_process_pool.get_stats()["num_workers"])
+
+    def test_changed_modules(self):
+        """The modules that the worker's script imports are reported to the
+        source_watch_registry, and the worker unloads them once they
+        change."""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        module_path = os.path.join(tmpdir.name, "process_runner_helper.py")
+        with open(module_path, "w") as f:
+            f.write("VALUE = 'before'\n")
+        script_path = os.path.join(tmpdir.name, "script.py")
+        with open(script_path, "w") as f:
+            f.write(
+                "import sys\n"
+                "sys.path.insert(0, %r)\n"
+                "import streamlit as st\n"
+                "import process_runner_helper\n"
+                "st.text(process_runner_helper.VALUE)\n" % tmpdir.name
+            )
+
+        scriptrunner = TestProcessScriptRunner(script_path)
+        scriptrunner.enqueue_rerun()
+        scriptrunner.start()
+        scriptrunner.join()
+        self.assertEqual(["before"], scriptrunner.text_deltas())
+        self.assertEqual(
+            module_path,
+            source_watch_registry.get_modules()["process_runner_helper"].__file__,
+        )
+
+        with open(module_path, "w") as f:
+            f.write("VALUE = 'after the change'\n")
+        callback = MagicMock()
+        with patch("streamlit.watcher.LocalSourcesWatcher.FileWatcher"):
+            source_watch_registry.subscribe(module_path, callback)
+        self.addCleanup(source_watch_registry.unsubscribe, module_path, callback)
+        source_watch_registry._on_file_changed(module_path)
+
+        scriptrunner = TestProcessScriptRunner(script_path)
+        scriptrunner.enqueue_rerun()
+        scriptrunner.start()
+        scriptrunner.join()
+        self.assertEqual(["after the change"], scriptrunner.text_deltas())
+
+    def test_uploaded_files(self):
+        """Uploaded files on disk are sent to the worker as paths, and
+        in-memory ones as data."""
+        on_disk = tempfile.NamedTemporaryFile()
+        on_disk.write(b"on disk")
+        file_mgr = UploadedFileManager()
+        file_mgr.add_files(
+            "test session id",
+            "widget",
+            [
+                UploadedFile("disk.txt", on_disk),
+                UploadedFile("memory.txt", b"in memory"),
+            ],
+        )
+        scriptrunner = TestProcessScriptRunner(
+            os.path.join(TEST_DATA_DIR, "good_script.py"), file_mgr
+        )
+
+        uploaded_files = scriptrunner._get_uploaded_files()
+        self.assertEqual(
+            [
+                (
+                    "widget",
+                    [
+                        ("disk.txt", on_disk.name, None),
+                        ("memory.txt", None, b"in memory"),
+                    ],
+                )
+            ],
+            uploaded_files,
+        )
+
+        opened = [_open_uploaded_file(*f) for f in uploaded_files[0][1]]
+        self.assertEqual([b"on disk", b"in memory"], [f.read() for f in opened])
+        for f in opened:
+            f.close()
+
+        # A file that's gone by the time the worker opens it is skipped.
+        file_mgr.remove_session_files("test session id")
+        self.assertIsNone(_open_uploaded_file("disk.txt", on_disk.name, None))
+
+
+class TestProcessScriptRunner(ProcessScriptRunner):
+    """Subclasses ProcessScriptRunner to provide some testing features."""
+
+    def __init__(self, script_path, uploaded_file_mgr=None):
+        self.report_queue = ReportQueue()
+        self.script_request_queue = ScriptRequestQueue()
+
+        super(TestProcessScriptRunner, self).__init__(
+            session_id="test session id",
+            report=Report(script_path, "test command line"),
+            enqueue_forward_msg=self.report_queue.enqueue,
+            widget_states=WidgetStates(),
+            request_queue=self.script_request_queue,
+            uploaded_file_mgr=uploaded_file_mgr,
+        )
+
+        self.events = []
+
+        def record_event(event, **kwargs):
+            self.events.append(event)
+
+        self.on_event.connect(record_event, weak=False)
+
+    def enqueue_rerun(self):
+        self.script_request_queue.enqueue(
+            ScriptRequest.RERUN, RerunData(widget_state=None)
+        )
+        self.on_request_enqueued()
+
+    def enqueue_stop(self):
+        self.script_request_queue.enqueue(ScriptRequest.STOP)
+        self.on_request_enqueued()
+
+    def join(self):
+        self._finished.wait()
+
+    def _new_elements(self):
+        return [
+            msg.delta.new_element
+            for msg in list(self.report_queue._queue)
+            if msg.HasField("delta") and msg.delta.HasField("new_element")
+        ]
+
+    def text_deltas(self):
+        return [
+            element.text.body
+            for element in self._new_elements()
+            if element.HasField("text")
+        ]
+
+    def exception_deltas(self):
+        return [
+            element.exception
+            for element in self._new_elements()
+            if element.HasField("exception")
+        ]
@@ -111,6 +111,26 @@ class ReportQueueTest(unittest.TestCase):
         self.assertEqual(queue[1].metadata.delta_id, 0)
         self.assertEqual(queue[1].delta.new_element.text.body, "text2")
 
+    def test_byte_size(self):
+        rq = ReportQueue()
+        self.assertEqual(0, rq.get_byte_size())
+
+        rq.enqueue(INIT_MSG)
+        TEXT_DELTA_MSG1.metadata.delta_id = 0
+        rq.enqueue(TEXT_DELTA_MSG1)
+        DF_DELTA_MSG.metadata.delta_id = 1
+        rq.enqueue(DF_DELTA_MSG)
+        ADD_ROWS_MSG.metadata.delta_id = 1
+        rq.enqueue(ADD_ROWS_MSG)
+
+        # Composed messages are counted once, at their new size.
+        expected_size = sum(msg.ByteSize() for msg in rq)
+        self.assertEqual(expected_size, rq.get_byte_size())
+        self.assertEqual(expected_size, rq.clone().get_byte_size())
+
+        rq.flush()
+        self.assertEqual(0, rq.get_byte_size())
+
     def test_simple_add_rows(self):
         rq = ReportQueue()
         self.assertTrue(rq.is_empty())
@@ -18,6 +18,7 @@ import tornado.gen
 import tornado.testing
 from mock import MagicMock, patch
 
+from streamlit import config
 from streamlit.ReportSession import ReportSession
 from streamlit.ReportSession import ReportSessionState
 from streamlit.ReportThread import ReportContext
@@ -27,6 +28,7 @@ from streamlit.ScriptRunner import ScriptRunner
 from streamlit.UploadedFileManager import UploadedFileManager
 from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
 from streamlit.proto.StaticManifest_pb2 import StaticManifest
+from streamlit.proto.Widget_pb2 import WidgetStates
 from tests.MockStorage import MockStorage
 import streamlit as st
 
@@ -125,6 +127,167 @@ class ReportSessionTest(unittest.TestCase):
         rs1 = ReportSession(None, "", "", file_mgr)
         rs2 = ReportSession(None, "", "", file_mgr)
         self.assertNotEqual(rs1.id, rs2.id)
+        self.assertNotEqual(rs1.resume_token, rs2.resume_token)
+
+    @patch("streamlit.ReportSession.LocalSourcesWatcher")
+    def test_resume_skips_unchanged_rerun(self, _1):
+        """After a resume, the browser's rerun request is skipped if its
+        widget state hasn't changed."""
+        rs = ReportSession(None, "", "", MagicMock(spec=UploadedFileManager))
+        rs.request_rerun = MagicMock()
+
+        widget_states = WidgetStates()
+        widget_states.widgets.add(id="widget1").int_value = 1
+        widget_states.widgets.add(id="widget2").int_value = 2
+        rs._widget_states = widget_states
+
+        same_states = WidgetStates()
+        same_states.widgets.add(id="widget2").int_value = 2
+        same_states.widgets.add(id="widget1").int_value = 1
+
+        rs.handle_resume()
+        self.assertFalse(rs.handle_rerun_script_request(widget_state=same_states))
+        rs.request_rerun.assert_not_called()
+
+        # Only the first rerun request after the resume is skipped.
+        self.assertTrue(rs.handle_rerun_script_request(widget_state=same_states))
+        rs.request_rerun.assert_called_once_with(same_states, is_interactive=True)
+
+    @patch("streamlit.ReportSession.LocalSourcesWatcher")
+    def test_resume_reruns_changed_widgets(self, _1):
+        rs = ReportSession(None, "", "", MagicMock(spec=UploadedFileManager))
+        rs.request_rerun = MagicMock()
+
+        new_states = WidgetStates()
+        new_states.widgets.add(id="widget1").int_value = 1
+
+        rs.handle_resume()
+        rs.handle_rerun_script_request(widget_state=new_states)
+        rs.request_rerun.assert_called_once_with(new_states, is_interactive=True)
+
+    @patch("streamlit.ReportSession.LocalSourcesWatcher")
+    def test_debounce_rerun(self, _1):
+        """Widget reruns requested while the script runs are merged into a
+        single rerun, which is requested once the debounce window passes."""
+        debounce_ms = config.get_option("runner.rerunDebounceMs")
+        config._set_option("runner.rerunDebounceMs", 100, "test")
+        try:
+            ioloop = MagicMock()
+            rs = ReportSession(ioloop, "", "", MagicMock(spec=UploadedFileManager))
+            rs.request_rerun = MagicMock()
+            rs._state = ReportSessionState.REPORT_IS_RUNNING
+
+            states1 = WidgetStates()
+            states1.widgets.add(id="widget1").int_value = 1
+            states2 = WidgetStates()
+            states2.widgets.add(id="widget1").int_value = 2
+
+            rs.handle_rerun_script_request(widget_state=states1)
+            rs.handle_rerun_script_request(widget_state=states2)
+            rs.request_rerun.assert_not_called()
+            ioloop.call_later.assert_called_once()
+
+            # The window passes.
+            delay, callback = ioloop.call_later.call_args[0]
+            self.assertEqual(0.1, delay)
+            callback()
+            rs.request_rerun.assert_called_once_with(states2, is_interactive=True)
+        finally:
+            config._set_option("runner.rerunDebounceMs", debounce_ms, "test")
+
+    @patch("streamlit.ReportSession.LocalSourcesWatcher")
+    def test_debounce_rerun_session_override(self, _1):
+        """A session's own debounce window overrides runner.rerunDebounceMs,
+        until it's reset."""
+        debounce_ms = config.get_option("runner.rerunDebounceMs")
+        config._set_option("runner.rerunDebounceMs", 100, "test")
+        try:
+            ioloop = MagicMock()
+            rs = ReportSession(ioloop, "", "", MagicMock(spec=UploadedFileManager))
+            rs.request_rerun = MagicMock()
+            rs._state = ReportSessionState.REPORT_IS_RUNNING
+
+            states = WidgetStates()
+            states.widgets.add(id="widget1").int_value = 1
+
+            # 0 disables debouncing for the session.
+            rs.handle_set_rerun_debounce_ms_request(0)
+            rs.handle_rerun_script_request(widget_state=states)
+            rs.request_rerun.assert_called_once_with(states, is_interactive=True)
+            ioloop.call_later.assert_not_called()
+
+            rs.handle_set_rerun_debounce_ms_request(250)
+            rs.handle_rerun_script_request(widget_state=states)
+            self.assertEqual(0.25, ioloop.call_later.call_args[0][0])
+            ioloop.call_later.call_args[0][1]()
+
+            # A negative value restores the configured window.
+            rs.handle_set_rerun_debounce_ms_request(-1)
+            rs.handle_rerun_script_request(widget_state=states)
+            self.assertEqual(0.1, ioloop.call_later.call_args[0][0])
+        finally:
+            config._set_option("runner.rerunDebounceMs", debounce_ms, "test")
+
+    @patch("streamlit.ReportSession.LocalSourcesWatcher")
+    def test_debounce_rerun_with_trigger(self, _1):
+        """Button clicks aren't debounced, and take any held-back rerun
+        with them."""
+        debounce_ms = config.get_option("runner.rerunDebounceMs")
+        config._set_option("runner.rerunDebounceMs", 100, "test")
+        try:
+            ioloop = MagicMock()
+            rs = ReportSession(ioloop, "", "", MagicMock(spec=UploadedFileManager))
+            rs.request_rerun = MagicMock()
+            rs._state = ReportSessionState.REPORT_IS_RUNNING
+
+            states1 = WidgetStates()
+            states1.widgets.add(id="widget1").int_value = 1
+            states2 = WidgetStates()
+            states2.widgets.add(id="widget1").int_value = 1
+            states2.widgets.add(id="button").trigger_value = True
+
+            rs.handle_rerun_script_request(widget_state=states1)
+            rs.handle_rerun_script_request(widget_state=states2)
+
+            self.assertEqual(2, rs.request_rerun.call_count)
+            rs.request_rerun.assert_called_with(states2, is_interactive=True)
+            ioloop.remove_timeout.assert_called_once()
+        finally:
+            config._set_option("runner.rerunDebounceMs", debounce_ms, "test")
+
+    @patch("streamlit.ReportSession.media_file_manager")
+    @patch("streamlit.ReportSession.LocalSourcesWatcher")
+    def test_hibernate(self, _1, media_file_mgr):
+        """Hibernating a session clears its report and spills its media
+        files, but keeps its widget states and uploaded files."""
+        file_mgr = MagicMock(spec=UploadedFileManager)
+        rs = ReportSession(None, "", "", file_mgr)
+        widget_states = WidgetStates()
+        widget_states.widgets.add(id="widget1").int_value = 1
+        rs._widget_states = widget_states
+
+        new_report_msg = ForwardMsg()
+        new_report_msg.new_report.name = "report"
+        rs._report.enqueue(new_report_msg)
+        msg = ForwardMsg()
+        msg.delta.new_element.text.body = "hello"
+        rs._report.enqueue(msg)
+
+        # Messages the browser hasn't been sent yet aren't dropped.
+        self.assertFalse(rs.hibernate())
+
+        rs.flush_browser_queue()
+        rs._state = ReportSessionState.REPORT_IS_RUNNING
+        self.assertFalse(rs.hibernate())
+
+        rs._state = ReportSessionState.REPORT_NOT_RUNNING
+        self.assertTrue(rs.hibernate())
+        # Only the report's initial message is kept.
+        self.assertEqual(new_report_msg.ByteSize(), rs._report.get_memory_size())
+        media_file_mgr.spill_session_files.assert_called_once_with(rs.id)
+        media_file_mgr.clear_session_files.assert_not_called()
+        file_mgr.remove_session_files.assert_not_called()
+        self.assertEqual(widget_states, rs._widget_states)
 
 
 def _create_mock_websocket():
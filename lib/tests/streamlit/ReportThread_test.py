@@ -0,0 +1,111 @@
+# Copyright 2018-2020 Streamlit Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""ReportThreadPool unit tests."""
+
+import sys
+import threading
+import time
+import unittest
+
+from mock import MagicMock, patch
+
+from streamlit.ReportThread import ReportContext
+from streamlit.ReportThread import ReportThreadPool
+from streamlit.ReportThread import _WidgetIDSet
+from streamlit.ReportThread import get_report_ctx
+
+
+def _create_ctx(session_id):
+    return ReportContext(
+        session_id=session_id,
+        enqueue=MagicMock(),
+        widgets=MagicMock(),
+        widget_ids_this_run=_WidgetIDSet(),
+        uploaded_file_mgr=MagicMock(),
+    )
+
+
+class ReportThreadPoolTest(unittest.TestCase):
+    def _run(self, pool, ctx, target=None):
+        """Run a task on the pool and wait for the thread to be idle again.
+        Returns (thread, the task's ReportContext, the thread's name)."""
+        result = {}
+        done = threading.Event()
+
+        def task():
+            result["ctx"] = get_report_ctx()
+            result["name"] = threading.current_thread().name
+            try:
+                if target is not None:
+                    target()
+            finally:
+                done.set()
+
+        thread = pool.submit(ctx, task, name="test thread")
+        done.wait()
+        while thread not in pool._idle_threads:
+            time.sleep(0.01)
+        return thread, result["ctx"], result["name"]
+
+    def test_reuse_thread(self):
+        """Tasks run on the same thread, each with its own ReportContext."""
+        pool = ReportThreadPool()
+        ctx1 = _create_ctx("session1")
+        ctx2 = _create_ctx("session2")
+
+        thread1, task_ctx1, name = self._run(pool, ctx1)
+        thread2, task_ctx2, _ = self._run(pool, ctx2)
+
+        self.assertIs(thread1, thread2)
+        self.assertIs(ctx1, task_ctx1)
+        self.assertIs(ctx2, task_ctx2)
+        self.assertEqual("test thread", name)
+        self.assertEqual(
+            {
+                "num_threads": 1,
+                "num_idle": 1,
+                "num_threads_started": 1,
+                "num_tasks": 2,
+            },
+            pool.get_stats(),
+        )
+
+        # The task's ReportContext isn't left on the idle thread.
+        self.assertIsNone(thread1.streamlit_report_ctx)
+
+    def test_task_cleanup(self):
+        """A task's tracer and exceptions don't affect the next task."""
+        pool = ReportThreadPool()
+
+        def bad_task():
+            sys.settrace(lambda *args: None)
+            raise RuntimeError("oops")
+
+        self._run(pool, _create_ctx("session1"), bad_task)
+
+        tracers = []
+        self._run(pool, _create_ctx("session2"), lambda: tracers.append(sys.gettrace()))
+        self.assertEqual([None], tracers)
+        self.assertEqual(1, pool.get_stats()["num_threads"])
+
+    @patch("streamlit.ReportThread.POOLED_THREAD_IDLE_TIMEOUT", 0.05)
+    def test_idle_timeout(self):
+        """Threads exit after being idle for a while."""
+        pool = ReportThreadPool()
+        thread, _, _ = self._run(pool, _create_ctx("session1"))
+
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(0, pool.get_stats()["num_threads"])
@@ -0,0 +1,111 @@
+# Copyright 2018-2020 Streamlit Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""ScriptCache unit tests."""
+
+import os
+import tempfile
+import unittest
+
+from mock import patch
+
+from streamlit import config
+from streamlit.ScriptCache import ScriptCache
+
+
+class ScriptCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.script_path = os.path.join(self._tmpdir.name, "script.py")
+        self._write_script("x = 1")
+        self.cache = ScriptCache()
+        self._magic_enabled = config.get_option("runner.magicEnabled")
+        self._persist = config.get_option("global.persistScriptCache")
+
+    def tearDown(self):
+        config._set_option("runner.magicEnabled", self._magic_enabled, "test")
+        config._set_option("global.persistScriptCache", self._persist, "test")
+        self._tmpdir.cleanup()
+
+    def _write_script(self, body, mtime_ns=None):
+        with open(self.script_path, "w") as f:
+            f.write(body)
+        if mtime_ns is not None:
+            os.utime(self.script_path, ns=(mtime_ns, mtime_ns))
+
+    def test_hit(self):
+        """An unchanged script is only compiled once."""
+        code = self.cache.get_code(self.script_path)
+        self.assertIs(code, self.cache.get_code(self.script_path))
+
+        stats = self.cache.get_stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(1, stats["num_scripts"])
+
+    def test_changed_script(self):
+        """A script whose mtime or size changed is recompiled."""
+        code = self.cache.get_code(self.script_path)
+
+        self._write_script("x = 12")
+        new_code = self.cache.get_code(self.script_path)
+        self.assertIsNot(code, new_code)
+        self.assertIn(12, new_code.co_consts)
+
+    def test_invalidate(self):
+        """An invalidated script is recompiled, even if its mtime and size
+        are unchanged."""
+        self._write_script("x = 1", mtime_ns=1000000000)
+        code = self.cache.get_code(self.script_path)
+
+        self._write_script("x = 2", mtime_ns=1000000000)
+        self.assertIs(code, self.cache.get_code(self.script_path))
+
+        self.cache.invalidate(self.script_path)
+        self.assertIn(2, self.cache.get_code(self.script_path).co_consts)
+
+    def test_magic_enabled(self):
+        """runner.magicEnabled is part of the key."""
+        config._set_option("runner.magicEnabled", True, "test")
+        code = self.cache.get_code(self.script_path)
+
+        config._set_option("runner.magicEnabled", False, "test")
+        self.assertIsNot(code, self.cache.get_code(self.script_path))
+        self.assertEqual(2, self.cache.get_stats()["misses"])
+
+    def test_compile_error(self):
+        """Compile errors are raised, and not cached."""
+        self._write_script("x = ")
+        with self.assertRaises(SyntaxError):
+            self.cache.get_code(self.script_path)
+        self.assertEqual(0, self.cache.get_stats()["num_scripts"])
+
+    def test_disk_cache(self):
+        """With global.persistScriptCache, a new cache loads code that an
+        earlier one compiled from disk."""
+        config._set_option("global.persistScriptCache", True, "test")
+
+        def get_path(*filepath):
+            return os.path.join(self._tmpdir.name, ".streamlit", *filepath)
+
+        with patch("streamlit.file_util.get_streamlit_file_path", get_path):
+            code = self.cache.get_code(self.script_path)
+
+            other_cache = ScriptCache()
+            other_code = other_cache.get_code(self.script_path)
+
+        self.assertEqual(code.co_code, other_code.co_code)
+        self.assertEqual(self.script_path, other_code.co_filename)
+        self.assertEqual(1, other_cache.get_stats()["disk_hits"])
+        self.assertEqual(0, other_cache.get_stats()["misses"])
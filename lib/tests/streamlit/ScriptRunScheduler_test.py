@@ -0,0 +1,107 @@
+# Copyright 2018-2020 Streamlit Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""ScriptRunScheduler unit tests."""
+
+import unittest
+
+from streamlit import config
+from streamlit.ScriptRunScheduler import ScriptRunScheduler
+
+
+class ScriptRunSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self._max_runs = config.get_option("global.maxConcurrentScriptRuns")
+
+    def tearDown(self):
+        config._set_option("global.maxConcurrentScriptRuns", self._max_runs, "test")
+
+    def test_unlimited(self):
+        """With no limit, every run is admitted right away."""
+        config._set_option("global.maxConcurrentScriptRuns", 0, "test")
+        scheduler = ScriptRunScheduler()
+        tickets = [scheduler.request_run("session%s" % i, True) for i in range(5)]
+        self.assertTrue(all(ticket.wait() for ticket in tickets))
+        self.assertEqual(5, scheduler.get_stats()["num_running"])
+
+    def test_admission_order(self):
+        """Runs beyond the limit wait, interactive ones first."""
+        config._set_option("global.maxConcurrentScriptRuns", 1, "test")
+        scheduler = ScriptRunScheduler()
+
+        running = scheduler.request_run("session1", True)
+        background = scheduler.request_run("session2", False)
+        interactive1 = scheduler.request_run("session3", True)
+        interactive2 = scheduler.request_run("session4", True)
+        self.assertTrue(running.is_admitted)
+        self.assertEqual(3, scheduler.get_stats()["num_waiting"])
+
+        admitted = []
+        for ticket in [running, interactive1, interactive2, background]:
+            scheduler.release(ticket)
+            admitted.append(
+                [t for t in [background, interactive1, interactive2] if t.is_admitted]
+            )
+
+        self.assertEqual(
+            [
+                [interactive1],
+                [interactive1, interactive2],
+                [background, interactive1, interactive2],
+                [background, interactive1, interactive2],
+            ],
+            admitted,
+        )
+        self.assertEqual(0, scheduler.get_stats()["num_running"])
+
+    def test_promote(self):
+        """A promoted run is admitted before later interactive runs."""
+        config._set_option("global.maxConcurrentScriptRuns", 1, "test")
+        scheduler = ScriptRunScheduler()
+
+        running = scheduler.request_run("session1", True)
+        background = scheduler.request_run("session2", False)
+        interactive = scheduler.request_run("session3", True)
+
+        scheduler.promote(background)
+        scheduler.release(running)
+        self.assertTrue(background.is_admitted)
+        self.assertFalse(interactive.is_admitted)
+
+    def test_release_waiting(self):
+        """Releasing a waiting run removes it from the queue."""
+        config._set_option("global.maxConcurrentScriptRuns", 1, "test")
+        scheduler = ScriptRunScheduler()
+
+        running = scheduler.request_run("session1", True)
+        cancelled = scheduler.request_run("session2", True)
+        waiting = scheduler.request_run("session3", True)
+
+        scheduler.release(cancelled)
+        scheduler.release(cancelled)
+        self.assertEqual(1, scheduler.get_stats()["num_waiting"])
+
+        scheduler.release(running)
+        self.assertFalse(cancelled.is_admitted)
+        self.assertTrue(waiting.is_admitted)
+
+    def test_wake(self):
+        """wake() returns from wait() without admitting the run."""
+        config._set_option("global.maxConcurrentScriptRuns", 1, "test")
+        scheduler = ScriptRunScheduler()
+
+        scheduler.request_run("session1", True)
+        waiting = scheduler.request_run("session2", True)
+        waiting.wake()
+        self.assertFalse(waiting.wait())
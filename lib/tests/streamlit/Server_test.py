@@ -14,6 +14,8 @@
 
 """Server.py unit tests"""
 
+import collections
+import gzip
 import unittest
 
 import mock
@@ -28,12 +30,14 @@ from tornado import gen
 
 import streamlit.server.Server
 from streamlit import config
+from streamlit.MediaFileManager import media_file_manager
 from streamlit.ReportSession import ReportSession
 from streamlit.UploadedFileManager import UploadedFile
 from streamlit.server.Server import MAX_PORT_SEARCH_RETRIES
 from streamlit.ForwardMsgCache import ForwardMsgCache
 from streamlit.ForwardMsgCache import populate_hash_if_needed
 from streamlit.elements import data_frame_proto
+from streamlit.proto.BackMsg_pb2 import BackMsg
 from streamlit.proto.BlockPath_pb2 import BlockPath
 from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
 from streamlit.server.Server import State
@@ -41,8 +45,11 @@ from streamlit.server.Server import start_listening
 from streamlit.server.Server import RetriesExceeded
 from streamlit.server.routes import DebugHandler
 from streamlit.server.routes import HealthHandler
+from streamlit.server.routes import IMMUTABLE_CACHE_CONTROL
+from streamlit.server.routes import MediaFileHandler
 from streamlit.server.routes import MessageCacheHandler
 from streamlit.server.routes import MetricsHandler
+from streamlit.server.routes import _accepts_gzip
 from streamlit.server.server_util import is_cacheable_msg
 from streamlit.server.server_util import is_url_from_allowed_origins
 from streamlit.server.server_util import serialize_forward_msg
@@ -67,9 +74,51 @@ def _create_report_finished_msg(status):
     return msg
 
 
+def _create_initialize_msg():
+    msg = ForwardMsg()
+    msg.initialize.session_id = "session_id"
+    return msg
+
+
+def _create_new_report_msg():
+    msg = ForwardMsg()
+    msg.new_report.id = "report_id"
+    return msg
+
+
+def _create_text_msg(text, id=0):
+    msg = ForwardMsg()
+    msg.metadata.delta_id = id
+    msg.delta.new_element.text.body = text
+    return msg
+
+
 class ServerTest(ServerTestCase):
     _next_report_id = 0
 
+    _restored_options = [
+        "global.sessionResumeGracePeriod",
+        "global.maxSessionReplaySize",
+        "global.minCachedMessageSize",
+        "global.sessionIdleTimeout",
+        "global.maxSessionsMemorySize",
+        "global.numPreheatedSessions",
+        "global.preheatCpuBudget",
+    ]
+
+    def setUp(self):
+        super(ServerTest, self).setUp()
+        self._options = {key: config.get_option(key) for key in self._restored_options}
+        # Most tests expect sessions to close as soon as their websocket does.
+        config._set_option("global.sessionResumeGracePeriod", 0.0, "test")
+        # ...and that only browsers create sessions.
+        config._set_option("global.numPreheatedSessions", 0, "test")
+
+    def tearDown(self):
+        for key, value in self._options.items():
+            config._set_option(key, value, "test")
+        super(ServerTest, self).tearDown()
+
     @tornado.testing.gen_test
     def test_start_stop(self):
         """Test that we can start and stop the server."""
@@ -80,11 +129,13 @@ class ServerTest(ServerTestCase):
             yield self.ws_connect()
             self.assertEqual(State.ONE_OR_MORE_BROWSERS_CONNECTED, self.server._state)
 
-            self.server.stop()
-            self.assertEqual(State.STOPPING, self.server._state)
+            with patch("streamlit.server.Server.script_process_pool") as pool:
+                self.server.stop()
+                self.assertEqual(State.STOPPING, self.server._state)
 
-            yield gen.sleep(0.1)
-            self.assertEqual(State.STOPPED, self.server._state)
+                yield gen.sleep(0.1)
+                self.assertEqual(State.STOPPED, self.server._state)
+                pool.shutdown.assert_called_once()
 
     @tornado.testing.gen_test
     def test_websocket_connect(self):
@@ -336,6 +387,431 @@ class ServerTest(ServerTestCase):
                 self.server._uploaded_file_mgr.get_files("no_such_session", "widget_id")
             )
 
+    def _send_msgs(self, session, msgs):
+        """Make the given mock ReportSession deliver the given messages on
+        the server's next flush."""
+        queue = [msgs]
+        session.flush_browser_queue.side_effect = lambda: queue.pop() if queue else []
+
+    def _ws_connect_resume(self, session_id, resume_token, num_msgs_received):
+        return tornado.websocket.websocket_connect(
+            self.get_ws_url(
+                "/stream?resumeSessionId=%s&resumeToken=%s&numMessagesReceived=%s"
+                % (session_id, resume_token, num_msgs_received)
+            )
+        )
+
+    @tornado.gen.coroutine
+    def _connect_and_disconnect(self):
+        """Connect a browser, send it 3 messages, then disconnect it.
+        Returns its SessionInfo."""
+        ws_client = yield self.ws_connect()
+        session_info = list(self.server._session_info_by_id.values())[0]
+        session_info.session.resume_token = "token"
+
+        self._send_msgs(
+            session_info.session,
+            [
+                _create_initialize_msg(),
+                _create_new_report_msg(),
+                _create_text_msg("hello"),
+            ],
+        )
+        for _ in range(3):
+            yield self.read_forward_msg(ws_client)
+
+        ws_client.close()
+        yield gen.sleep(0.1)
+        raise gen.Return(session_info)
+
+    @tornado.testing.gen_test
+    def test_session_resume(self):
+        """A browser can resume its session after disconnecting, and gets
+        the messages it missed replayed."""
+        config._set_option("global.sessionResumeGracePeriod", 10.0, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            session_info = yield self._connect_and_disconnect()
+            session = session_info.session
+
+            # The session is kept around, waiting to be resumed.
+            self.assertFalse(self.server.browser_is_connected)
+            session.shutdown.assert_not_called()
+            self.assertIsNone(session_info.ws)
+
+            # Resume, claiming to have missed the last message.
+            ws_client = yield self._ws_connect_resume(session.id, "token", 2)
+            msg = yield self.read_forward_msg(ws_client)
+            self.assertEqual("hello", msg.delta.new_element.text.body)
+
+            self.assertTrue(self.server.browser_is_connected)
+            self.assertEqual(1, len(self.server._session_info_by_id))
+            self.assertIsNotNone(session_info.ws)
+            session.handle_resume.assert_called_once()
+
+            # New messages continue to be delivered.
+            self._send_msgs(session, [_create_text_msg("again")])
+            msg = yield self.read_forward_msg(ws_client)
+            self.assertEqual("again", msg.delta.new_element.text.body)
+            self.assertEqual(4, session_info.num_msgs_sent)
+
+    @tornado.testing.gen_test
+    def test_session_resume_missed_report_start(self):
+        """A browser that missed the start of the current report gets the
+        whole report replayed."""
+        config._set_option("global.sessionResumeGracePeriod", 10.0, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            session_info = yield self._connect_and_disconnect()
+
+            ws_client = yield self._ws_connect_resume(
+                session_info.session.id, "token", 1
+            )
+            msg = yield self.read_forward_msg(ws_client)
+            self.assertEqual("new_report", msg.WhichOneof("type"))
+            msg = yield self.read_forward_msg(ws_client)
+            self.assertEqual("hello", msg.delta.new_element.text.body)
+            self.assertEqual(3, session_info.num_msgs_sent)
+
+    @tornado.testing.gen_test
+    def test_session_resume_evicted_msg_ref(self):
+        """A message that was sent as a reference to a cached message is
+        replayed in full if it's been evicted from the cache."""
+        config._set_option("global.sessionResumeGracePeriod", 10.0, "test")
+        config._set_option("global.minCachedMessageSize", 0, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            ws_client = yield self.ws_connect()
+            session_info = list(self.server._session_info_by_id.values())[0]
+            session_info.session.resume_token = "token"
+
+            # The second message is sent as a reference to the first.
+            self._send_msgs(
+                session_info.session,
+                [_create_text_msg("hello"), _create_text_msg("hello")],
+            )
+            yield self.read_forward_msg(ws_client)
+            msg = yield self.read_forward_msg(ws_client)
+            self.assertEqual("ref_hash", msg.WhichOneof("type"))
+
+            ws_client.close()
+            yield gen.sleep(0.1)
+            self.server._message_cache.clear()
+
+            ws_client = yield self._ws_connect_resume(
+                session_info.session.id, "token", 1
+            )
+            msg = yield self.read_forward_msg(ws_client)
+            self.assertEqual("hello", msg.delta.new_element.text.body)
+
+    @tornado.testing.gen_test
+    def test_session_resume_bad_token(self):
+        """A browser with the wrong token gets a new session."""
+        config._set_option("global.sessionResumeGracePeriod", 10.0, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            session_info = yield self._connect_and_disconnect()
+
+            yield self._ws_connect_resume(session_info.session.id, "bad_token", 3)
+            yield gen.sleep(0.1)
+
+            self.assertEqual(2, len(self.server._session_info_by_id))
+            self.assertIsNone(session_info.ws)
+            session_info.session.handle_resume.assert_not_called()
+
+    @tornado.testing.gen_test
+    def test_session_resume_non_ascii_token(self):
+        """A browser with a non-ASCII token gets a new session, rather than
+        an error."""
+        config._set_option("global.sessionResumeGracePeriod", 10.0, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            session_info = yield self._connect_and_disconnect()
+
+            ws_client = yield self._ws_connect_resume(
+                session_info.session.id, "t%C3%B6ken", 3
+            )
+            yield gen.sleep(0.1)
+
+            self.assertIsNotNone(ws_client)
+            self.assertEqual(2, len(self.server._session_info_by_id))
+            session_info.session.handle_resume.assert_not_called()
+
+    @tornado.testing.gen_test
+    def test_session_resume_dropped_msgs(self):
+        """Messages over global.maxSessionReplaySize aren't kept. A browser
+        that missed them gets a rerun of the script instead."""
+        config._set_option("global.sessionResumeGracePeriod", 10.0, "test")
+        config._set_option("global.maxSessionReplaySize", 1.0, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            session_info = yield self._connect_and_disconnect()
+            self.assertEqual(1, len(session_info.sent_msgs))
+            self.assertTrue(session_info.sent_msgs_truncated)
+
+            yield self._ws_connect_resume(session_info.session.id, "token", 1)
+            yield gen.sleep(0.1)
+
+            self.assertIsNotNone(session_info.ws)
+            self.assertEqual(1, session_info.num_msgs_sent)
+            session_info.session.request_rerun.assert_called_once_with()
+            session_info.session.handle_resume.assert_not_called()
+
+    @tornado.testing.gen_test
+    def test_session_resume_grace_period_expired(self):
+        """A session is closed if it's not resumed within the grace period."""
+        config._set_option("global.sessionResumeGracePeriod", 0.1, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            session_info = yield self._connect_and_disconnect()
+
+            yield gen.sleep(0.2)
+            session_info.session.shutdown.assert_called_once()
+            self.assertEqual(0, len(self.server._session_info_by_id))
+
+            # It can no longer be resumed.
+            yield self._ws_connect_resume(session_info.session.id, "token", 3)
+            yield gen.sleep(0.1)
+            self.assertEqual(1, len(self.server._session_info_by_id))
+            session_info.session.handle_resume.assert_not_called()
+
+    @tornado.gen.coroutine
+    def _connect_sessions(self, memory_sizes):
+        """Connect a browser for each of the given session memory sizes.
+        Hibernating a session frees all of its memory. Returns the sessions'
+        SessionInfos, from least- to most-recently active."""
+        session_infos = []
+        for i, memory_size in enumerate(memory_sizes):
+            yield self.ws_connect()
+            session_info = [
+                info
+                for info in self.server._session_info_by_id.values()
+                if info not in session_infos
+            ][0]
+            session_info.last_active_at -= 100 - i
+            session = session_info.session
+            session.get_memory_size.return_value = memory_size
+
+            def hibernate(session=session):
+                session.get_memory_size.return_value = 0
+                return True
+
+            session.hibernate.side_effect = hibernate
+            session_infos.append(session_info)
+        raise gen.Return(session_infos)
+
+    @tornado.testing.gen_test
+    def test_idle_session_hibernation(self):
+        """Sessions that haven't heard from their browser for
+        global.sessionIdleTimeout seconds are hibernated."""
+        config._set_option("global.sessionIdleTimeout", 50.0, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            idle_info, active_info = yield self._connect_sessions([10, 10])
+            active_info.last_active_at = self.server._ioloop.time()
+            idle_info.sent_msgs = [_create_text_msg("hello")]
+
+            self.server._reap_sessions()
+            idle_info.session.hibernate.assert_called_once()
+            active_info.session.hibernate.assert_not_called()
+            self.assertTrue(idle_info.is_hibernated)
+            self.assertEqual([], idle_info.sent_msgs)
+            self.assertEqual(1, idle_info.num_msgs_sent)
+            self.assertIsNotNone(idle_info.ws)
+
+            # A hibernated session isn't hibernated again until it's used.
+            self.server._reap_sessions()
+            idle_info.session.hibernate.assert_called_once()
+
+            self._send_msgs(idle_info.session, [_create_text_msg("again")])
+            yield gen.sleep(0.1)
+            self.assertFalse(idle_info.is_hibernated)
+
+    @tornado.testing.gen_test
+    def test_backmsg_marks_session_active(self):
+        """A BackMsg from the browser resets the session's idle time."""
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            ws_client = yield self.ws_connect()
+            session_info = list(self.server._session_info_by_id.values())[0]
+            session_info.last_active_at = 0
+
+            back_msg = BackMsg()
+            back_msg.rerun_script = True
+            ws_client.write_message(back_msg.SerializeToString(), binary=True)
+            yield gen.sleep(0.1)
+            self.assertGreater(session_info.last_active_at, 0)
+
+    @tornado.testing.gen_test
+    def test_rerun_metrics(self):
+        """The time from a rerun request to the first delta sent back is
+        recorded, and sessions are counted when metrics are served."""
+        config._set_option("global.numPreheatedSessions", 1, "test")
+        metric_mocks = collections.defaultdict(MagicMock)
+        with self._patch_report_session(), patch(
+            "streamlit.metrics.Client.get", side_effect=metric_mocks.__getitem__
+        ):
+            yield self.start_server_loop()
+            ws_client = yield self.ws_connect()
+            session_info = list(self.server._session_info_by_id.values())[0]
+            self.server.add_preheated_report_session()
+
+            back_msg = BackMsg()
+            back_msg.rerun_script = True
+            ws_client.write_message(back_msg.SerializeToString(), binary=True)
+            yield gen.sleep(0.1)
+            self.assertIsNotNone(session_info.rerun_requested_at)
+
+            # Deltas from the run the rerun interrupted aren't timed.
+            latency = metric_mocks["streamlit_rerun_first_delta_seconds"]
+            self.server._send_message(session_info, _create_text_msg("old"))
+            self.assertIsNotNone(session_info.rerun_requested_at)
+            self.assertEqual(0, latency.observe.call_count)
+
+            self.server._send_message(session_info, _create_new_report_msg())
+            self.server._send_message(session_info, _create_text_msg("hi"))
+            self.assertIsNone(session_info.rerun_requested_at)
+            self.assertEqual(1, latency.observe.call_count)
+
+            self.server.update_metrics()
+            sessions = metric_mocks["streamlit_sessions"]
+            self.assertEqual(
+                [
+                    mock.call("connected"),
+                    mock.call("preheated"),
+                    mock.call("disconnected"),
+                ],
+                sessions.labels.call_args_list,
+            )
+            self.assertEqual(
+                [mock.call(1), mock.call(1), mock.call(0)],
+                sessions.labels.return_value.set.call_args_list,
+            )
+
+    @tornado.testing.gen_test
+    def test_skipped_rerun_not_timed(self):
+        """A rerun request that the session skips isn't timed."""
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            ws_client = yield self.ws_connect()
+            session_info = list(self.server._session_info_by_id.values())[0]
+            session_info.rerun_requested_at = 1.0
+            session_info.rerun_started = True
+            session_info.session.handle_rerun_script_request.return_value = False
+
+            back_msg = BackMsg()
+            back_msg.update_widgets.SetInParent()
+            ws_client.write_message(back_msg.SerializeToString(), binary=True)
+            yield gen.sleep(0.1)
+            self.assertIsNone(session_info.rerun_requested_at)
+            self.assertFalse(session_info.rerun_started)
+
+    @tornado.testing.gen_test
+    def test_sessions_memory_limit(self):
+        """When the sessions use more than global.maxSessionsMemorySize,
+        the least-recently-active ones are hibernated."""
+        config._set_option("global.maxSessionsMemorySize", 250.0, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            session_infos = yield self._connect_sessions([100, 100, 100, 100])
+
+            self.server._reap_sessions()
+            self.assertEqual(
+                [True, True, False, False],
+                [info.is_hibernated for info in session_infos],
+            )
+
+            stats = self.server.get_debug()["sessions"]
+            self.assertEqual(4, stats["num_sessions"])
+            self.assertEqual(200, stats["memory_size"])
+            self.assertEqual(2, stats["hibernations"])
+            self.assertEqual(
+                [100, 100, 0, 0],
+                [session["memory_size"] for session in stats["largest_sessions"]],
+            )
+
+    @tornado.testing.gen_test
+    def test_preheated_session_pool(self):
+        """Browsers are handed preheated sessions, oldest first, until the
+        pool is empty."""
+        config._set_option("global.numPreheatedSessions", 2, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            for _ in range(3):
+                self.server.add_preheated_report_session()
+
+            # The pool is full after two sessions.
+            preheated_ids = list(self.server._preheated_session_ids)
+            self.assertEqual(2, len(preheated_ids))
+            self.assertEqual(2, len(self.server._session_info_by_id))
+            for session_id in preheated_ids:
+                session = self.server._session_info_by_id[session_id].session
+                session.handle_rerun_script_request.assert_called_once_with(
+                    is_preheat=True
+                )
+            self.assertFalse(self.server.browser_is_connected)
+
+            for session_id in preheated_ids:
+                yield self.ws_connect()
+                session_info = self.server._session_info_by_id[session_id]
+                self.assertIsNotNone(session_info.ws)
+            self.assertEqual(0, len(self.server._preheated_session_ids))
+            self.assertTrue(self.server.browser_is_connected)
+
+            # Once the pool is empty, browsers get new sessions.
+            yield self.ws_connect()
+            self.assertEqual(3, len(self.server._session_info_by_id))
+
+    @tornado.testing.gen_test
+    def test_preheated_session_pool_not_refilled_by_default(self):
+        """By default, only one session is preheated, and it isn't replaced
+        once a browser takes it."""
+        config._set_option("global.numPreheatedSessions", 0, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            self.server._get_cpu_usage = mock.MagicMock(return_value=0.0)
+
+            self.server.add_preheated_report_session()
+            self.server.add_preheated_report_session()
+            self.assertEqual(1, len(self.server._preheated_session_ids))
+
+            yield self.ws_connect()
+            self.assertEqual(0, len(self.server._preheated_session_ids))
+
+            self.server._maybe_add_preheated_report_session()
+            self.assertEqual(0, len(self.server._preheated_session_ids))
+            self.assertEqual(1, len(self.server._session_info_by_id))
+
+    @tornado.testing.gen_test
+    def test_preheated_session_pool_refill(self):
+        """The pool is refilled one session at a time, within the CPU
+        budget."""
+        config._set_option("global.numPreheatedSessions", 2, "test")
+        config._set_option("global.preheatCpuBudget", 0.5, "test")
+        with self._patch_report_session():
+            yield self.start_server_loop()
+            self.server._get_cpu_usage = mock.MagicMock(return_value=0.1)
+
+            self.server._maybe_add_preheated_report_session()
+            self.assertEqual(1, len(self.server._preheated_session_ids))
+            session_id = self.server._preheated_session_ids[0]
+            session = self.server._session_info_by_id[session_id].session
+
+            # Wait for the previous preheated session to finish running.
+            session.is_script_running = True
+            self.server._maybe_add_preheated_report_session()
+            self.assertEqual(1, len(self.server._preheated_session_ids))
+
+            # Stay within the CPU budget.
+            session.is_script_running = False
+            self.server._get_cpu_usage.return_value = 0.9
+            self.server._maybe_add_preheated_report_session()
+            self.assertEqual(1, len(self.server._preheated_session_ids))
+
+            self.server._get_cpu_usage.return_value = 0.1
+            self.server._maybe_add_preheated_report_session()
+            self.assertEqual(2, len(self.server._preheated_session_ids))
+
     @staticmethod
     def _create_mock_report_session(*args, **kwargs):
         """Create a mock ReportSession. Each mocked instance will have
@@ -347,6 +823,7 @@ class ServerTest(ServerTestCase):
 
         mock_session = mock.MagicMock(ReportSession, autospec=True, *args, **kwargs)
         type(mock_session).id = mock_id
+        mock_session.is_script_running = False
         return mock_session
 
     def _patch_report_session(self):
@@ -532,3 +1009,144 @@ class MessageCacheHandlerTest(tornado.testing.AsyncHTTPTestCase):
         # Cache misses
         self.assertEqual(404, self.fetch("/message").code)
         self.assertEqual(404, self.fetch("/message?id=non_existent").code)
+
+    def test_etag(self):
+        msg = _create_dataframe_msg([1, 2, 3])
+        msg_hash = populate_hash_if_needed(msg)
+        self._cache.add_message(msg, MagicMock(), 0)
+
+        response = self.fetch("/message?hash=%s" % msg_hash)
+        self.assertEqual(200, response.code)
+        self.assertEqual('"%s"' % msg_hash, response.headers["Etag"])
+        self.assertEqual(IMMUTABLE_CACHE_CONTROL, response.headers["Cache-Control"])
+
+        response = self.fetch(
+            "/message?hash=%s" % msg_hash, headers={"If-None-Match": '"%s"' % msg_hash},
+        )
+        self.assertEqual(304, response.code)
+        self.assertEqual(b"", response.body)
+
+    def test_gzip(self):
+        msg = _create_dataframe_msg(list(range(1000)))
+        msg_hash = populate_hash_if_needed(msg)
+        self._cache.add_message(msg, MagicMock(), 0)
+
+        response = self.fetch(
+            "/message?hash=%s" % msg_hash,
+            headers={"Accept-Encoding": "gzip"},
+            decompress_response=False,
+        )
+        self.assertEqual(200, response.code)
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertEqual("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(serialize_forward_msg(msg), gzip.decompress(response.body))
+
+        for accept_encoding in ["identity", "gzip;q=0, identity", "*;q=0"]:
+            response = self.fetch(
+                "/message?hash=%s" % msg_hash,
+                headers={"Accept-Encoding": accept_encoding},
+                decompress_response=False,
+            )
+            self.assertNotIn("Content-Encoding", response.headers)
+            self.assertEqual("Accept-Encoding", response.headers["Vary"])
+            self.assertEqual(serialize_forward_msg(msg), response.body)
+
+    def test_accepts_gzip(self):
+        for accept_encoding, accepts_gzip in [
+            ("", False),
+            ("gzip", True),
+            ("deflate, gzip;q=0.5", True),
+            ("GZIP; q=1.0", True),
+            ("gzip;q=0", False),
+            ("gzip;q=0.000", False),
+            ("*", True),
+            ("identity, *;q=0", False),
+            ("gzip;q=0.1, *;q=0", True),
+            ("gzip;q=bad", False),
+        ]:
+            request = MagicMock()
+            request.headers = {"Accept-Encoding": accept_encoding}
+            self.assertEqual(accepts_gzip, _accepts_gzip(request), accept_encoding)
+
+
+class MediaFileHandlerTest(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        return tornado.web.Application([(r"/media/(.*)", MediaFileHandler)])
+
+    def tearDown(self):
+        media_file_manager.clear_session_files()
+        super(MediaFileHandlerTest, self).tearDown()
+
+    def test_media_file(self):
+        media = media_file_manager.add(b"fake image data", "image/png", "1.0")
+
+        response = self.fetch("/media/%s.png" % media.id)
+        self.assertEqual(200, response.code)
+        self.assertEqual(b"fake image data", response.body)
+        self.assertEqual("image/png", response.headers["Content-Type"])
+        self.assertEqual('"%s"' % media.id, response.headers["Etag"])
+        self.assertEqual(IMMUTABLE_CACHE_CONTROL, response.headers["Cache-Control"])
+
+        response = self.fetch(
+            "/media/%s.png" % media.id, headers={"If-None-Match": '"%s"' % media.id}
+        )
+        self.assertEqual(304, response.code)
+
+    def test_missing_media_file(self):
+        response = self.fetch("/media/non_existent.png")
+        self.assertEqual(404, response.code)
+        self.assertNotIn("Cache-Control", response.headers)
+
+    def test_media_file_removed_during_request(self):
+        """A file that's removed from the MediaFileManager after the request
+        resolved it should still be served in full."""
+        media = media_file_manager.add(b"fake image data", "image/png", "1.0")
+        validate_absolute_path = MediaFileHandler.validate_absolute_path
+
+        def validate_and_remove(handler, root, absolute_path):
+            absolute_path = validate_absolute_path(handler, root, absolute_path)
+            del media_file_manager._files_by_id[absolute_path]
+            return absolute_path
+
+        with patch.object(
+            MediaFileHandler, "validate_absolute_path", validate_and_remove
+        ):
+            response = self.fetch("/media/%s.png" % media.id)
+
+        self.assertEqual(200, response.code)
+        self.assertEqual(b"fake image data", response.body)
+
+    def test_range_request(self):
+        content = bytes(range(256)) * 1024
+        media = media_file_manager.add(content, "video/mp4", "1.0")
+
+        response = self.fetch("/media/%s.mp4" % media.id)
+        self.assertEqual(200, response.code)
+        self.assertEqual(content, response.body)
+        self.assertEqual("bytes", response.headers["Accept-Ranges"])
+        self.assertEqual(str(len(content)), response.headers["Content-Length"])
+
+        response = self.fetch(
+            "/media/%s.mp4" % media.id, headers={"Range": "bytes=1000-199999"}
+        )
+        self.assertEqual(206, response.code)
+        self.assertEqual(content[1000:200000], response.body)
+        self.assertEqual(
+            "bytes 1000-199999/%s" % len(content), response.headers["Content-Range"]
+        )
+        self.assertEqual('"%s"' % media.id, response.headers["Etag"])
+
+        response = self.fetch(
+            "/media/%s.mp4" % media.id,
+            headers={"Range": "bytes=%s-" % (len(content) + 1)},
+        )
+        self.assertEqual(416, response.code)
+
+    def test_head_request(self):
+        media = media_file_manager.add(b"fake audio data", "audio/wav", "1.0")
+
+        response = self.fetch("/media/%s.wav" % media.id, method="HEAD")
+        self.assertEqual(200, response.code)
+        self.assertEqual(b"", response.body)
+        self.assertEqual("15", response.headers["Content-Length"])
+        self.assertEqual("audio/wav", response.headers["Content-Type"])
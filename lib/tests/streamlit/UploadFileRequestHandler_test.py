@@ -14,23 +14,31 @@
 
 """UploadFileHandler.py unit tests"""
 
+import os
+import tempfile
+import unittest
+
+import mock
 import requests
 import tornado.gen
 import tornado.testing
 import tornado.web
 import tornado.websocket
 
+from streamlit import config
 from streamlit.UploadedFileManager import UploadedFile
 from streamlit.UploadedFileManager import UploadedFileManager
 from streamlit.logger import get_logger
 from streamlit.server.UploadFileRequestHandler import UploadFileRequestHandler
+from streamlit.server.UploadFileRequestHandler import _MultipartParser
 
 LOGGER = get_logger(__name__)
 
 
-def _get_filename(file):
-    """Sort key for lists of UploadedFiles"""
-    return file.name
+def _get_names_and_data(files):
+    """Return a sorted list of the name and data of each UploadedFile, for
+    comparison."""
+    return sorted((file.name, file.getvalue()) for file in files)
 
 
 class UploadFileRequestHandlerTest(tornado.testing.AsyncHTTPTestCase):
@@ -65,7 +73,10 @@ class UploadFileRequestHandlerTest(tornado.testing.AsyncHTTPTestCase):
         }
         response = self._upload_files(params)
         self.assertEqual(200, response.code)
-        self.assertEqual([file], self.file_mgr.get_files("fooReport", "barWidget"))
+        self.assertEqual(
+            [("image.png", b"123")],
+            _get_names_and_data(self.file_mgr.get_files("fooReport", "barWidget")),
+        )
 
     def test_upload_multiple_files(self):
         file1 = UploadedFile("image1.png", b"123")
@@ -82,10 +93,8 @@ class UploadFileRequestHandlerTest(tornado.testing.AsyncHTTPTestCase):
         response = self._upload_files(params)
         self.assertEqual(200, response.code)
         self.assertEqual(
-            sorted([file1, file2, file3], key=_get_filename),
-            sorted(
-                self.file_mgr.get_files("fooReport", "barWidget"), key=_get_filename
-            ),
+            _get_names_and_data([file1, file2, file3]),
+            _get_names_and_data(self.file_mgr.get_files("fooReport", "barWidget")),
         )
 
     def test_missing_params(self):
@@ -110,3 +119,127 @@ class UploadFileRequestHandlerTest(tornado.testing.AsyncHTTPTestCase):
         response = self._upload_files(params)
         self.assertEqual(400, response.code)
         self.assertIn("Expected at least 1 file, but got 0", response.reason)
+
+    @mock.patch("streamlit.server.UploadFileRequestHandler.SPOOL_MAX_SIZE", 10)
+    def test_upload_spooled_file(self):
+        """Files larger than SPOOL_MAX_SIZE are spooled to disk."""
+        data = b"0123456789" * 100
+        params = {
+            "big.bin": ("big.bin", data),
+            "sessionId": (None, "fooReport"),
+            "widgetId": (None, "barWidget"),
+        }
+        response = self._upload_files(params)
+        self.assertEqual(200, response.code)
+
+        files = self.file_mgr.get_files("fooReport", "barWidget")
+        self.assertEqual(1, len(files))
+        self.assertEqual(len(data), files[0].size)
+        self.assertEqual(data, files[0].getvalue())
+        self.assertEqual(data[:4], files[0].read(4))
+        self.assertEqual(data, bytes(files[0].getbuffer()))
+
+    @mock.patch("streamlit.server.UploadFileRequestHandler.SPOOL_MAX_SIZE", 10)
+    def test_missing_params_closes_spooled_file(self):
+        """When the upload is rejected, its spooled files are closed, which
+        deletes them."""
+        spooled_files = []
+        create_file = tempfile.NamedTemporaryFile
+
+        def named_temporary_file(*args, **kwargs):
+            spooled_files.append(create_file(*args, **kwargs))
+            return spooled_files[-1]
+
+        params = {
+            "big.bin": ("big.bin", b"0123456789" * 100),
+            "sessionId": (None, "fooReport"),
+        }
+        with mock.patch(
+            "streamlit.server.UploadFileRequestHandler.tempfile.NamedTemporaryFile",
+            side_effect=named_temporary_file,
+        ):
+            response = self._upload_files(params)
+        self.assertEqual(400, response.code)
+        self.assertEqual(1, len(spooled_files))
+        self.assertTrue(spooled_files[0].closed)
+        self.assertFalse(os.path.exists(spooled_files[0].name))
+
+    def test_upload_too_large(self):
+        """Uploads larger than server.maxUploadSize fail with 413 status."""
+        max_upload_size = config.get_option("server.maxUploadSize")
+        config._set_option("server.maxUploadSize", 1, "test")
+        try:
+            params = {
+                "big.bin": ("big.bin", b"0" * (1024 * 1024 + 1)),
+                "sessionId": (None, "fooReport"),
+                "widgetId": (None, "barWidget"),
+            }
+            response = self._upload_files(params)
+        finally:
+            config._set_option("server.maxUploadSize", max_upload_size, "test")
+
+        self.assertEqual(413, response.code)
+        self.assertIsNone(self.file_mgr.get_files("fooReport", "barWidget"))
+
+    def test_upload_over_quota(self):
+        """Uploads that don't fit within the upload quotas fail with 413
+        status."""
+        max_session_size = config.get_option("global.maxSessionUploadedFilesSize")
+        config._set_option("global.maxSessionUploadedFilesSize", 5, "test")
+        try:
+            params = {
+                "file.bin": ("file.bin", b"0123456789"),
+                "sessionId": (None, "fooReport"),
+                "widgetId": (None, "barWidget"),
+            }
+            response = self._upload_files(params)
+        finally:
+            config._set_option(
+                "global.maxSessionUploadedFilesSize", max_session_size, "test"
+            )
+
+        self.assertEqual(413, response.code)
+        self.assertIsNone(self.file_mgr.get_files("fooReport", "barWidget"))
+
+    def test_malformed_body(self):
+        """A truncated multipart body should fail with 400 status."""
+        req = requests.Request(
+            method="POST",
+            url=self.get_url("/upload_file"),
+            files={"image.png": ("image.png", b"1234")},
+        ).prepare()
+
+        response = self.fetch(
+            "/upload_file", method="POST", headers=req.headers, body=req.body[:-10]
+        )
+        self.assertEqual(400, response.code)
+
+
+class MultipartParserTest(unittest.TestCase):
+    def test_parse_in_small_chunks(self):
+        """Parsing should work however the body is split into chunks."""
+        req = requests.Request(
+            method="POST",
+            url="http://localhost/upload_file",
+            files={
+                "file1": ("image1.png", b"123\r\n--456"),
+                "file2": ("image2.png", b""),
+                "sessionId": (None, "fooReport"),
+            },
+        ).prepare()
+
+        for chunk_size in (1, 7, len(req.body)):
+            parser = _MultipartParser.from_content_type(req.headers["Content-Type"])
+            for i in range(0, len(req.body), chunk_size):
+                parser.feed(req.body[i : i + chunk_size])
+            parser.close()
+
+            self.assertEqual({"sessionId": [b"fooReport"]}, parser.args)
+            self.assertEqual(
+                [("image1.png", b"123\r\n--456"), ("image2.png", b"")],
+                _get_names_and_data(parser.files),
+            )
+
+    def test_bad_content_type(self):
+        with self.assertRaises(ValueError):
+            _MultipartParser.from_content_type("application/json")
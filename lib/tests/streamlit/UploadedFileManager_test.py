@@ -14,21 +14,74 @@
 
 """Unit tests for UploadedFileManager"""
 
+import tempfile
 import unittest
 
+from streamlit import config
 from streamlit.UploadedFileManager import UploadedFile
 from streamlit.UploadedFileManager import UploadedFileList
 from streamlit.UploadedFileManager import UploadedFileManager
+from streamlit.UploadedFileManager import UploadedFileQuotaError
 
 file1 = UploadedFile(name="file1", data=b"file1")
 file2 = UploadedFile(name="file2", data=b"file2")
 
 
+def _create_file_on_disk(data):
+    temp_file = tempfile.TemporaryFile()
+    temp_file.write(data)
+    return UploadedFile("file", temp_file)
+
+
+class UploadedFileTest(unittest.TestCase):
+    def test_view(self):
+        """Views share the file's data, but have their own position, and can
+        be closed independently."""
+        file = _create_file_on_disk(b"0123456789")
+
+        view1 = file.view()
+        view2 = file.view()
+        self.assertEqual(b"012", view1.read(3))
+        self.assertEqual(b"0123456789", view2.read())
+        self.assertEqual(b"3456789", view1.read())
+
+        view1.close()
+        self.assertTrue(view1.closed)
+        self.assertEqual(b"0123456789", file.view().getvalue())
+
+    def test_close_releases_mmap(self):
+        """Closing a file on disk unmaps it, once its views are gone."""
+        file = _create_file_on_disk(b"0123456789")
+
+        view = file.view()
+        mapped = file._mmap
+        self.assertIsNotNone(mapped)
+
+        # A view that's still in use keeps the data readable.
+        file.close()
+        self.assertEqual(b"0123456789", view.read())
+        self.assertFalse(mapped.closed)
+
+        other_file = _create_file_on_disk(b"0123456789")
+        other_file.is_binary()
+        mapped = other_file._mmap
+        other_file.close()
+        self.assertTrue(mapped.closed)
+
+
 class UploadedFileManagerTest(unittest.TestCase):
     def setUp(self):
         self.mgr = UploadedFileManager()
         self.filemgr_events = []
         self.mgr.on_files_added.connect(self._on_files_added)
+        self._max_size = config.get_option("global.maxUploadedFilesSize")
+        self._max_session_size = config.get_option("global.maxSessionUploadedFilesSize")
+
+    def tearDown(self):
+        config._set_option("global.maxUploadedFilesSize", self._max_size, "test")
+        config._set_option(
+            "global.maxSessionUploadedFilesSize", self._max_session_size, "test"
+        )
 
     def _on_files_added(self, file_list, **kwargs):
         self.filemgr_events.append(file_list)
@@ -73,3 +126,95 @@ class UploadedFileManagerTest(unittest.TestCase):
         self.assertIsNone(self.mgr.get_files("session1", "widget"))
         self.assertEqual([file1], self.mgr.get_files("session2", "widget"))
         self.assertEqual([event1, event2], self.filemgr_events)
+
+        self.mgr.remove_session_files("session2")
+        self.assertIsNone(self.mgr.get_files("session2", "widget"))
+        self.assertEqual(0, self.mgr.get_stats()["total_size"])
+        self.assertEqual(0, self.mgr.get_stats()["num_sessions"])
+
+    def test_get_session_files(self):
+        self.assertEqual([], self.mgr.get_session_files("non-report"))
+
+        self.mgr.add_files("session1", "widget1", [file1])
+        self.mgr.add_files("session1", "widget2", [file2])
+        self.mgr.add_files("session2", "widget1", [file2])
+
+        self.assertEqual(
+            [
+                UploadedFileList("session1", "widget1", [file1]),
+                UploadedFileList("session1", "widget2", [file2]),
+            ],
+            self.mgr.get_session_files("session1"),
+        )
+
+    def test_replace_file_size(self):
+        """Replacing a file list updates the total size."""
+        self.mgr.add_files("session", "widget", [file1])
+        self.mgr.add_files("session", "widget", [file1, file2])
+        self.assertEqual(10, self.mgr.get_stats()["total_size"])
+        self.assertEqual(1, self.mgr.get_stats()["num_file_lists"])
+
+    def test_session_quota(self):
+        """A list that would put its session over its quota is rejected,
+        and the list it would have replaced is kept."""
+        config._set_option("global.maxSessionUploadedFilesSize", 10, "test")
+
+        self.mgr.add_files("session1", "widget1", [file1])
+        self.mgr.add_files("session1", "widget2", [file1])
+        self.mgr.add_files("session2", "widget1", [file1])
+
+        with self.assertRaises(UploadedFileQuotaError):
+            self.mgr.add_files("session1", "widget3", [file2])
+        with self.assertRaises(UploadedFileQuotaError):
+            self.mgr.add_files("session1", "widget2", [file1, file2])
+
+        # Replacing a list only counts the difference in size.
+        self.mgr.add_files("session1", "widget2", [file2])
+
+        self.assertEqual([file1], self.mgr.get_files("session1", "widget1"))
+        self.assertEqual([file2], self.mgr.get_files("session1", "widget2"))
+        self.assertIsNone(self.mgr.get_files("session1", "widget3"))
+        self.assertEqual([file1], self.mgr.get_files("session2", "widget1"))
+        self.assertEqual(0, self.mgr.get_stats()["evictions"])
+        self.assertEqual(2, self.mgr.get_stats()["rejections"])
+
+    def test_global_quota(self):
+        """When the manager is over its quota, the least-recently-used lists
+        of disconnected sessions are evicted. If that isn't enough, the new
+        list is rejected."""
+        config._set_option("global.maxUploadedFilesSize", 10, "test")
+        connected_sessions = {"session2", "session3"}
+        mgr = UploadedFileManager(
+            is_session_connected=lambda session_id: session_id in connected_sessions
+        )
+
+        mgr.add_files("session1", "widget", [file1])
+        mgr.add_files("session2", "widget", [file1])
+        mgr.add_files("session3", "widget", [file1])
+
+        self.assertIsNone(mgr.get_files("session1", "widget"))
+        self.assertEqual([file1], mgr.get_files("session2", "widget"))
+        self.assertEqual([file1], mgr.get_files("session3", "widget"))
+        self.assertEqual(1, mgr.get_stats()["evictions"])
+
+        # The connected sessions' lists are never evicted.
+        with self.assertRaises(UploadedFileQuotaError):
+            mgr.add_files("session4", "widget", [file1])
+        self.assertEqual(2, mgr.get_stats()["num_file_lists"])
+        self.assertEqual(10, mgr.get_stats()["total_size"])
+
+        # Once a session disconnects, its lists can be evicted.
+        connected_sessions.remove("session2")
+        mgr.add_files("session4", "widget", [file1])
+        self.assertIsNone(mgr.get_files("session2", "widget"))
+        self.assertEqual([file1], mgr.get_files("session4", "widget"))
+
+    def test_global_quota_without_connection_info(self):
+        """Without a way to tell which sessions are connected, no lists are
+        evicted."""
+        config._set_option("global.maxUploadedFilesSize", 10, "test")
+
+        self.mgr.add_files("session1", "widget", [file1, file1])
+        with self.assertRaises(UploadedFileQuotaError):
+            self.mgr.add_files("session2", "widget", [file1])
+        self.assertEqual([file1, file1], self.mgr.get_files("session1", "widget"))
@@ -276,8 +276,23 @@ class ConfigTest(unittest.TestCase):
                 "global.developmentMode",
                 "global.disableWatchdogWarning",
                 "logger.level",
+                "global.ioloopStallThresholdMs",
                 "global.maxCachedMessageAge",
+                "global.maxConcurrentScriptRuns",
+                "global.maxMediaFileMemorySize",
+                "global.maxSessionReplaySize",
+                "global.maxSessionUploadedFilesSize",
+                "global.maxSessionsMemorySize",
+                "global.maxUploadedFilesSize",
+                "global.mediaFileSpillSize",
+                "global.sessionIdleTimeout",
+                "global.sessionResumeGracePeriod",
+                "global.maxMessageCacheSize",
                 "global.minCachedMessageSize",
+                "global.numPreheatedSessions",
+                "global.numScriptProcesses",
+                "global.persistScriptCache",
+                "global.preheatCpuBudget",
                 "global.metrics",
                 "global.sharingMode",
                 "global.showWarningOnDirectExecution",
@@ -286,6 +301,8 @@ class ConfigTest(unittest.TestCase):
                 "global.useNode",
                 "runner.magicEnabled",
                 "runner.installTracer",
+                "runner.asyncInterrupts",
+                "runner.rerunDebounceMs",
                 "runner.fixMatplotlib",
                 "mapbox.token",
                 "s3.accessKeyId",
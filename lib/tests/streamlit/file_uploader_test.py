@@ -69,6 +69,28 @@ class FileUploaderTest(testutil.DeltaGeneratorTestCase):
             else:
                 self.assertEqual(file_vals[0], return_val.getvalue())
 
+    @patch("streamlit.UploadedFileManager.UploadedFileManager.get_files")
+    def test_return_value(self, get_files_patch):
+        """Binary files are returned as views of the UploadedFiles, and text
+        files as StringIOs."""
+        binary_file = UploadedFile("file.bin", b"\x00\x01\x02")
+        binary_file.read()
+        get_files_patch.return_value = [binary_file]
+
+        return_val = st.file_uploader("label")
+        self.assertIsInstance(return_val, UploadedFile)
+        self.assertIsNot(binary_file, return_val)
+        self.assertEqual(b"\x00\x01\x02", return_val.read())
+
+        # Closing the returned file doesn't affect the next rerun's.
+        return_val.close()
+        return_val = st.file_uploader("label", key="rerun")
+        self.assertEqual(b"\x00\x01\x02", return_val.read())
+
+        get_files_patch.return_value = [UploadedFile("file.txt", b"some text")]
+        return_val = st.file_uploader("label", key="text")
+        self.assertEqual("some text", return_val.getvalue())
+
     def test_max_upload_size_mb(self):
         """Test that the max upload size is the configuration value."""
         st.file_uploader("the label")
@@ -14,12 +14,16 @@
 
 """Unit tests for MediaFileManager"""
 
+import os
+import tempfile
 import unittest
 import mock
 import random
 
+from streamlit import config
 from streamlit.MediaFileManager import MediaFileManager
 from streamlit.MediaFileManager import _calculate_file_id
+from streamlit.MediaFileManager import _copy_file_and_calculate_id
 
 
 mfm = MediaFileManager()
@@ -95,7 +99,8 @@ class UploadedFileManagerTest(unittest.TestCase):
 
         # Make sure we get different file ids for files with same bytes but diff't mimetypes.
         self.assertNotEqual(
-            _calculate_file_id(fake_bytes, "audio/wav"), _calculate_file_id(fake_bytes, "video/mp4")
+            _calculate_file_id(fake_bytes, "audio/wav"),
+            _calculate_file_id(fake_bytes, "video/mp4"),
         )
 
     @mock.patch("streamlit.MediaFileManager._get_session_id")
@@ -262,3 +267,208 @@ class UploadedFileManagerTest(unittest.TestCase):
 
         # There should be 0 session with registered files.
         self.assertEqual(len(mfm._files_by_session_and_coord), 0)
+
+
+class MediaFileSpillTest(unittest.TestCase):
+    def setUp(self):
+        self._max_memory_size = config.get_option("global.maxMediaFileMemorySize")
+        self._spill_size = config.get_option("global.mediaFileSpillSize")
+        self.mfm = MediaFileManager()
+
+    def tearDown(self):
+        config._set_option(
+            "global.maxMediaFileMemorySize", self._max_memory_size, "test"
+        )
+        config._set_option("global.mediaFileSpillSize", self._spill_size, "test")
+
+    @mock.patch("streamlit.MediaFileManager._get_session_id")
+    def test_large_file_spilled(self, _get_session_id):
+        """Files at least global.mediaFileSpillSize bytes go straight to disk."""
+        _get_session_id.return_value = "SESSION1"
+        config._set_option("global.mediaFileSpillSize", 10, "test")
+
+        small = self.mfm.add(b"0123", "image/png", "1.1")
+        large = self.mfm.add(b"0123456789abcdef", "image/png", "1.2")
+
+        self.assertFalse(small.is_spilled)
+        self.assertTrue(large.is_spilled)
+        self.assertEqual(b"0123456789abcdef", large.content)
+        self.assertEqual(16, large.size)
+        self.assertEqual([b"2345", b"6789", b"ab"], list(large.read_chunks(2, 12, 4)))
+        self.assertEqual([b"01", b"23"], list(small.read_chunks(0, 4, 2)))
+
+        stats = self.mfm.get_stats()
+        self.assertEqual(2, stats["num_files"])
+        self.assertEqual(1, stats["num_in_memory"])
+        self.assertEqual(4, stats["memory_size"])
+        self.assertEqual(1, stats["num_on_disk"])
+        self.assertEqual(16, stats["disk_size"])
+
+    @mock.patch("streamlit.MediaFileManager._get_session_id")
+    def test_lru_spill(self, _get_session_id):
+        """The least-recently-used files are spilled when the memory budget
+        is exceeded."""
+        _get_session_id.return_value = "SESSION1"
+        config._set_option("global.maxMediaFileMemorySize", 10, "test")
+
+        f1 = self.mfm.add(b"1111", "image/png", "1.1")
+        f2 = self.mfm.add(b"2222", "image/png", "1.2")
+
+        # Touch f1, so that f2 is the least-recently used.
+        self.mfm.get(f1.id)
+
+        f3 = self.mfm.add(b"3333", "image/png", "1.3")
+
+        self.assertFalse(f1.is_spilled)
+        self.assertTrue(f2.is_spilled)
+        self.assertFalse(f3.is_spilled)
+        self.assertEqual(b"2222", self.mfm.get(f2.id).content)
+        self.assertEqual(8, self.mfm.get_stats()["memory_size"])
+        self.assertEqual(1, self.mfm.get_stats()["num_spills"])
+
+    @mock.patch("streamlit.MediaFileManager._get_session_id")
+    def test_spill_session_files(self, _get_session_id):
+        """Spilling a session's files frees their memory, but keeps them
+        available."""
+        _get_session_id.return_value = "SESSION1"
+        f1 = self.mfm.add(b"1111", "image/png", "1.1")
+        _get_session_id.return_value = "SESSION2"
+        f2 = self.mfm.add(b"2222", "image/png", "1.1")
+
+        self.mfm.spill_session_files("SESSION1")
+
+        self.assertTrue(f1.is_spilled)
+        self.assertFalse(f2.is_spilled)
+        self.assertEqual(b"1111", self.mfm.get(f1.id).content)
+        self.assertEqual(0, self.mfm.get_session_memory_size("SESSION1"))
+        self.assertEqual(4, self.mfm.get_session_memory_size("SESSION2"))
+        self.assertEqual(4, self.mfm.get_stats()["memory_size"])
+
+    @mock.patch("streamlit.MediaFileManager._get_session_id")
+    def test_spilled_file_removed(self, _get_session_id):
+        """Spilled files are deleted from disk, and in-memory files are no
+        longer counted, once they're no longer used."""
+        _get_session_id.return_value = "SESSION1"
+        config._set_option("global.mediaFileSpillSize", 10, "test")
+
+        self.mfm.add(b"0123", "image/png", "1.1")
+        large = self.mfm.add(b"0123456789abcdef", "image/png", "1.2")
+        path = large._path
+        self.assertTrue(os.path.exists(path))
+
+        del large
+        self.mfm.clear_session_files()
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(0, len(self.mfm))
+        self.assertEqual(0, self.mfm.get_stats()["memory_size"])
+
+
+class FileBackedMediaFileTest(unittest.TestCase):
+    def setUp(self):
+        self.mfm = MediaFileManager()
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"0123456789")
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_copy_file_and_calculate_id(self):
+        """Copying a file gives the same ID as hashing its contents."""
+        with tempfile.TemporaryDirectory() as directory:
+            copy_path, file_id = _copy_file_and_calculate_id(
+                self.path, "video/mp4", directory
+            )
+            self.assertEqual(_calculate_file_id(b"0123456789", "video/mp4"), file_id)
+            self.assertEqual(directory, os.path.dirname(copy_path))
+            with open(copy_path, "rb") as f:
+                self.assertEqual(b"0123456789", f.read())
+
+    @mock.patch("streamlit.MediaFileManager._get_session_id")
+    def test_add_file(self, _get_session_id):
+        _get_session_id.return_value = "SESSION1"
+
+        f = self.mfm.add_file(self.path, "video/mp4", "1.1")
+
+        self.assertTrue(f.id in self.mfm)
+        self.assertTrue(f.is_spilled)
+        self.assertEqual(10, f.size)
+        self.assertEqual(b"0123456789", f.content)
+        self.assertEqual([b"234", b"56"], list(f.read_chunks(2, 7, 3)))
+        self.assertEqual(0, self.mfm.get_stats()["memory_size"])
+
+        # The same content added as bytes is the same MediaFile.
+        self.assertIs(f, self.mfm.add(b"0123456789", "video/mp4", "1.2"))
+
+    @mock.patch("streamlit.MediaFileManager._get_session_id")
+    def test_add_file_is_a_snapshot(self, _get_session_id):
+        """A file's ID keeps serving the content it was added with, even if
+        the original is rewritten or deleted."""
+        _get_session_id.return_value = "SESSION1"
+
+        f = self.mfm.add_file(self.path, "video/mp4", "1.1")
+        with open(self.path, "wb") as out:
+            out.write(b"BBBBBBBB")
+        self.assertEqual(b"0123456789", self.mfm.get(f.id).content)
+
+        new_f = self.mfm.add_file(self.path, "video/mp4", "1.2")
+        self.assertNotEqual(f.id, new_f.id)
+        self.assertEqual(b"BBBBBBBB", new_f.content)
+
+        os.remove(self.path)
+        self.assertEqual([b"0123456789"], list(f.read_chunks(0, 10, 100)))
+        open(self.path, "wb").close()
+
+        # The copy is deleted once the file isn't used anymore.
+        copy_path = f._path
+        del f
+        self.mfm.clear_session_files()
+        self.assertFalse(os.path.exists(copy_path))
+
+    @mock.patch(
+        "streamlit.MediaFileManager._copy_file_and_calculate_id",
+        wraps=_copy_file_and_calculate_id,
+    )
+    @mock.patch("streamlit.MediaFileManager._get_session_id")
+    def test_copied_until_file_changes(self, _get_session_id, copy_file):
+        """Like a script run, each add_file comes after the session's files
+        are cleared, and the caller doesn't hold on to the MediaFile."""
+        _get_session_id.return_value = "SESSION1"
+
+        file_id = self.mfm.add_file(self.path, "video/mp4", "1.1").id
+        for _ in range(3):
+            self.mfm.clear_session_files()
+            self.assertEqual(
+                file_id, self.mfm.add_file(self.path, "video/mp4", "1.1").id
+            )
+        self.assertEqual(1, copy_file.call_count)
+
+        # A different mimetype means a different ID.
+        self.mfm.clear_session_files()
+        self.mfm.add_file(self.path, "video/webm", "1.1")
+        self.assertEqual(2, copy_file.call_count)
+
+        with open(self.path, "ab") as out:
+            out.write(b"more")
+        self.mfm.clear_session_files()
+        self.mfm.add_file(self.path, "video/mp4", "1.1")
+        self.assertEqual(3, copy_file.call_count)
+
+    @mock.patch("streamlit.MediaFileManager._MAX_RECENT_PATH_FILES", 1)
+    @mock.patch("streamlit.MediaFileManager._get_session_id")
+    def test_recent_path_files_evicted(self, _get_session_id):
+        """Only the most recently added path-backed files are kept alive
+        once no session uses them."""
+        _get_session_id.return_value = "SESSION1"
+        other_path = self.path + ".other"
+        with open(other_path, "wb") as out:
+            out.write(b"other")
+        self.addCleanup(os.remove, other_path)
+
+        file_id = self.mfm.add_file(self.path, "video/mp4", "1.1").id
+        other_id = self.mfm.add_file(other_path, "video/mp4", "1.2").id
+        self.mfm.clear_session_files()
+
+        self.assertFalse(file_id in self.mfm)
+        self.assertTrue(other_id in self.mfm)
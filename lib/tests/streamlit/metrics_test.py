@@ -102,12 +102,36 @@ class MetricsTest(unittest.TestCase):
         metrics = [str(x) for x in metrics if "_created" not in x]
         self.assertEqual(sorted(truth), sorted(metrics))
 
+    def test_enabled_metrics_options(self):
+        """Metrics can have extra constructor arguments, and are reused when
+        metrics are toggled on again."""
+        config.set_option("global.metrics", True)
+        client = streamlit.metrics.Client.get_current()
+
+        # yapf: disable
+        client._raw_metrics = [
+            ('Histogram', 'unittest_histogram', 'Unittest histogram', [], {'buckets': (1, 10)}),
+        ]
+        # yapf: enable
+
+        client.toggle_metrics()
+        histogram = client.get("unittest_histogram")
+        histogram.observe(5)
+
+        client.toggle_metrics()
+        self.assertIs(histogram, client.get("unittest_histogram"))
+
+        lines = client.generate_latest().decode("utf-8").splitlines()
+        self.assertIn('unittest_histogram_bucket{le="1.0"} 0.0', lines)
+        self.assertIn('unittest_histogram_bucket{le="10.0"} 1.0', lines)
+
     def test_disabled_metrics_check_value(self):
         """Test streamlit.metrics.Client.toggle_metrics disabled check value."""
         with patch("streamlit.metrics.MockMetric", spec=True) as mock_metric:
             config.set_option("global.metrics", False)
             client = streamlit.metrics.Client.get_current()
             client._metrics = {}
+            num_default_metrics = len(client._raw_metrics)
 
             # yapf: disable
             client._raw_metrics = [
@@ -127,8 +151,8 @@ class MetricsTest(unittest.TestCase):
             client.get("unittest_gauge").set(42)
             client.get("unittest_gauge").dec()
 
-            calls = [
-                call(),  # Constructor
+            # The constructor creates each of the default metrics.
+            calls = [call()] * num_default_metrics + [
                 call(),  # unittest_counter
                 call(),  # unittest_counter_labels
                 call(),  # unittest_gauge
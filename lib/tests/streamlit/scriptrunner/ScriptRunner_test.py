@@ -21,11 +21,13 @@ from typing import List
 import os
 from parameterized import parameterized
 
+from streamlit import config
 from streamlit.Report import Report
 from streamlit.ReportQueue import ReportQueue
 from streamlit.ScriptRequestQueue import RerunData
 from streamlit.ScriptRequestQueue import ScriptRequest
 from streamlit.ScriptRequestQueue import ScriptRequestQueue
+from streamlit.ScriptRunScheduler import script_run_scheduler
 from streamlit.ScriptRunner import ScriptRunner
 from streamlit.ScriptRunner import ScriptRunnerEvent
 from streamlit.proto.Widget_pb2 import WidgetStates
@@ -196,6 +198,69 @@ class ScriptRunnerTest(unittest.TestCase):
         )
         self._assert_text_deltas(scriptrunner, ["loop_forever"])
 
+    @parameterized.expand([(True,), (False,)])
+    def test_async_interrupts(self, install_tracer):
+        """Tests that a script is stopped without enqueueing deltas, with
+        or without the tracer."""
+        old_install_tracer = config.get_option("runner.installTracer")
+        old_async_interrupts = config.get_option("runner.asyncInterrupts")
+        config._set_option("runner.installTracer", install_tracer, "test")
+        config._set_option("runner.asyncInterrupts", True, "test")
+        try:
+            scriptrunner = TestScriptRunner("busy_loop.py")
+            scriptrunner.enqueue_rerun()
+            scriptrunner.start()
+
+            time.sleep(0.1)
+            scriptrunner.enqueue_rerun()
+            time.sleep(0.1)
+            scriptrunner.enqueue_stop()
+            scriptrunner.join()
+        finally:
+            config._set_option("runner.installTracer", old_install_tracer, "test")
+            config._set_option("runner.asyncInterrupts", old_async_interrupts, "test")
+
+        self._assert_no_exceptions(scriptrunner)
+        self._assert_events(
+            scriptrunner,
+            [
+                ScriptRunnerEvent.SCRIPT_STARTED,
+                ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS,
+                ScriptRunnerEvent.SCRIPT_STARTED,
+                ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS,
+                ScriptRunnerEvent.SHUTDOWN,
+            ],
+        )
+        self._assert_text_deltas(scriptrunner, ["loop_forever"])
+
+    def test_swallowed_async_interrupt(self):
+        """Tests that a script that swallows an interrupt still handles the
+        request, the next time it enqueues a delta."""
+        old_async_interrupts = config.get_option("runner.asyncInterrupts")
+        config._set_option("runner.asyncInterrupts", True, "test")
+        try:
+            scriptrunner = TestScriptRunner("swallowed_interrupt.py")
+            scriptrunner.enqueue_rerun()
+            scriptrunner.start()
+
+            time.sleep(0.1)
+            scriptrunner.enqueue_stop()
+            scriptrunner.join()
+        finally:
+            config._set_option("runner.asyncInterrupts", old_async_interrupts, "test")
+
+        self._assert_no_exceptions(scriptrunner)
+        self._assert_events(
+            scriptrunner,
+            [
+                ScriptRunnerEvent.SCRIPT_STARTED,
+                ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS,
+                ScriptRunnerEvent.SHUTDOWN,
+            ],
+        )
+        self._assert_text_deltas(scriptrunner, ["swallowed"])
+        self.assertFalse(scriptrunner._interrupt_pending)
+
     def test_widgets(self):
         """Tests that widget values behave as expected."""
         scriptrunner = TestScriptRunner("widgets_script.py")
@@ -257,6 +322,64 @@ class ScriptRunnerTest(unittest.TestCase):
         )
         self._assert_text_deltas(scriptrunner, [text_utf])
 
+    def test_queued_rerun_superseded(self):
+        """Tests that a rerun requested while a run waits for the scheduler
+        supersedes it."""
+        max_runs = config.get_option("global.maxConcurrentScriptRuns")
+        config._set_option("global.maxConcurrentScriptRuns", 1, "test")
+        try:
+            other_run = script_run_scheduler.request_run("other session", True)
+
+            scriptrunner = TestScriptRunner("widgets_script.py")
+            scriptrunner.enqueue_rerun()
+            scriptrunner.start()
+            time.sleep(0.1)
+            self.assertEqual([], scriptrunner.events)
+
+            states = WidgetStates()
+            _create_widget("some widget", states).int_value = 1
+            scriptrunner.enqueue_rerun(widget_state=states)
+            script_run_scheduler.release(other_run)
+
+            require_widgets_deltas([scriptrunner])
+            scriptrunner.enqueue_shutdown()
+            scriptrunner.join()
+        finally:
+            config._set_option("global.maxConcurrentScriptRuns", max_runs, "test")
+
+        self._assert_no_exceptions(scriptrunner)
+        self._assert_events(
+            scriptrunner,
+            [
+                ScriptRunnerEvent.SCRIPT_STARTED,
+                ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS,
+                ScriptRunnerEvent.SHUTDOWN,
+            ],
+        )
+        self.assertEqual(states, scriptrunner.widget_states)
+
+    def test_queued_run_stopped(self):
+        """Tests that stopping a run that waits for the scheduler cancels
+        it."""
+        max_runs = config.get_option("global.maxConcurrentScriptRuns")
+        config._set_option("global.maxConcurrentScriptRuns", 1, "test")
+        try:
+            other_run = script_run_scheduler.request_run("other session", True)
+
+            scriptrunner = TestScriptRunner("good_script.py")
+            scriptrunner.enqueue_rerun()
+            scriptrunner.start()
+            time.sleep(0.1)
+            scriptrunner.enqueue_stop()
+            scriptrunner.join()
+            script_run_scheduler.release(other_run)
+        finally:
+            config._set_option("global.maxConcurrentScriptRuns", max_runs, "test")
+
+        self._assert_no_exceptions(scriptrunner)
+        self._assert_events(scriptrunner, [ScriptRunnerEvent.SHUTDOWN])
+        self.assertEqual(0, script_run_scheduler.get_stats()["num_waiting"])
+
     # TODO re-enable after flakyness is fixed
     def off_test_multiple_scriptrunners(self):
         """Tests that multiple scriptrunners can run simultaneously."""
@@ -402,7 +525,10 @@ class TestScriptRunner(ScriptRunner):
 
         def enqueue_fn(msg):
             self.report_queue.enqueue(msg)
-            self.maybe_handle_execution_control_request()
+            # Like ReportSession.enqueue, leave requests to the tracer if
+            # it's installed.
+            if not config.get_option("runner.installTracer"):
+                self.maybe_handle_execution_control_request()
 
         self.script_request_queue = ScriptRequestQueue()
         script_path = os.path.join(os.path.dirname(__file__), "test_data", script_name)
@@ -441,12 +567,15 @@ class TestScriptRunner(ScriptRunner):
         self.script_request_queue.enqueue(
             ScriptRequest.RERUN, RerunData(widget_state=widget_state)
         )
+        self.on_request_enqueued()
 
     def enqueue_stop(self):
         self.script_request_queue.enqueue(ScriptRequest.STOP)
+        self.on_request_enqueued()
 
     def enqueue_shutdown(self):
         self.script_request_queue.enqueue(ScriptRequest.SHUTDOWN)
+        self.on_request_enqueued()
 
     def _process_request_queue(self):
         try:
@@ -459,9 +588,10 @@ class TestScriptRunner(ScriptRunner):
         super(TestScriptRunner, self)._run_script(rerun_data)
 
     def join(self):
-        """Joins the run thread, if it was started"""
+        """Waits for the run thread to finish processing our requests, if
+        it was started"""
         if self._script_thread is not None:
-            self._script_thread.join()
+            self._finished.wait()
 
     def deltas(self):
         """Returns the delta messages in our ReportQueue"""
@@ -14,11 +14,14 @@
 
 """streamlit.LocalSourcesWatcher unit test."""
 
+import importlib
 import os
 import sys
+import tempfile
+import textwrap
 import unittest
 
-from mock import patch
+from mock import MagicMock, patch
 
 from streamlit import config
 from streamlit.Report import Report
@@ -46,6 +49,15 @@ def NOOP_CALLBACK():
 @patch("streamlit.file_util.file_in_pythonpath", return_value=False)
 class LocalSourcesWatcherTest(unittest.TestCase):
     def setUp(self):
+        # Each test gets its own registry, so that files watched by earlier
+        # tests' LocalSourcesWatchers don't count.
+        registry_patch = patch(
+            "streamlit.watcher.LocalSourcesWatcher.source_watch_registry",
+            LocalSourcesWatcher.SourceWatchRegistry(),
+        )
+        registry_patch.start()
+        self.addCleanup(registry_patch.stop)
+
         modules = [
             "DUMMY_MODULE_1",
             "DUMMY_MODULE_2",
@@ -156,6 +168,41 @@ class LocalSourcesWatcherTest(unittest.TestCase):
 
         fob.assert_called_once()
 
+    @patch("streamlit.watcher.LocalSourcesWatcher.FileWatcher")
+    def test_modules_examined_once(self, fob, _):
+        """Modules that were already loaded at the last update aren't
+        examined again."""
+        lso = LocalSourcesWatcher.LocalSourcesWatcher(REPORT, NOOP_CALLBACK)
+        lso.update_watched_modules()
+
+        sys.modules["DUMMY_MODULE_1"] = DUMMY_MODULE_1
+        with patch(
+            "streamlit.watcher.LocalSourcesWatcher.os.path.isfile",
+            wraps=os.path.isfile,
+        ) as isfile:
+            lso.update_watched_modules()
+            isfile.assert_called_once_with(DUMMY_MODULE_1_FILE)
+
+        self.assertIn(DUMMY_MODULE_1_FILE, lso._watched_modules)
+
+    @patch("streamlit.watcher.LocalSourcesWatcher.FileWatcher")
+    def test_unloaded_module(self, fob, _):
+        """A module's file stops being watched once it's unloaded."""
+        lso = LocalSourcesWatcher.LocalSourcesWatcher(REPORT, NOOP_CALLBACK)
+
+        sys.modules["DUMMY_MODULE_1"] = DUMMY_MODULE_1
+        lso.update_watched_modules()
+        self.assertIn(DUMMY_MODULE_1_FILE, lso._watched_modules)
+
+        del sys.modules["DUMMY_MODULE_1"]
+        lso.update_watched_modules()
+        self.assertNotIn(DUMMY_MODULE_1_FILE, lso._watched_modules)
+
+        # Reloading the module watches it again.
+        sys.modules["DUMMY_MODULE_1"] = DUMMY_MODULE_1
+        lso.update_watched_modules()
+        self.assertIn(DUMMY_MODULE_1_FILE, lso._watched_modules)
+
     @patch("streamlit.watcher.LocalSourcesWatcher.FileWatcher")
     def test_misbehaved_module(self, fob, _):
         lso = LocalSourcesWatcher.LocalSourcesWatcher(REPORT, NOOP_CALLBACK)
@@ -185,12 +232,139 @@ class LocalSourcesWatcherTest(unittest.TestCase):
             lso.update_watched_modules()
 
             # Simulate a change to the child module
-            lso.on_file_changed(NESTED_MODULE_CHILD_FILE)
+            _simulate_file_change(NESTED_MODULE_CHILD_FILE)
 
             # Assert that both the parent and child are unloaded, ready for reload
             self.assertNotIn("NESTED_MODULE_CHILD", sys.modules)
             self.assertNotIn("NESTED_MODULE_PARENT", sys.modules)
 
+    @patch("streamlit.watcher.LocalSourcesWatcher.FileWatcher")
+    def test_shared_watcher(self, fob, _):
+        """LocalSourcesWatchers watching the same file share a FileWatcher,
+        and each of them is told when the file changes."""
+        callback1 = MagicMock()
+        callback2 = MagicMock()
+        lso1 = LocalSourcesWatcher.LocalSourcesWatcher(REPORT, callback1)
+        lso2 = LocalSourcesWatcher.LocalSourcesWatcher(REPORT, callback2)
+
+        fob.assert_called_once()
+        self.assertEqual(
+            {"num_files": 1, "num_subscriptions": 2},
+            LocalSourcesWatcher.source_watch_registry.get_stats(),
+        )
+
+        # Simulate a change to the script.
+        on_file_changed = fob.call_args.args[1]
+        on_file_changed(REPORT_PATH)
+        callback1.assert_called_once()
+        callback2.assert_called_once()
+
+        lso1.close()
+        fob.return_value.close.assert_not_called()
+        on_file_changed(REPORT_PATH)
+        callback1.assert_called_once()
+        self.assertEqual(2, callback2.call_count)
+
+        lso2.close()
+        fob.return_value.close.assert_called_once()
+        self.assertEqual(
+            {"num_files": 0, "num_subscriptions": 0},
+            LocalSourcesWatcher.source_watch_registry.get_stats(),
+        )
+
+    @patch("streamlit.watcher.LocalSourcesWatcher.FileWatcher")
+    def test_unload_dependent_modules(self, fob, _):
+        """When a module changes, only it and the modules that depend on it
+        are unloaded."""
+        with _TempPackage() as package:
+            lso = LocalSourcesWatcher.LocalSourcesWatcher(package.report, NOOP_CALLBACK)
+            lso.update_watched_modules()
+
+            _simulate_file_change(package.get_path("helpers.py"))
+
+            self.assertNotIn("tmp_pkg.helpers", sys.modules)
+            self.assertNotIn("tmp_pkg.uses_helpers", sys.modules)
+            self.assertNotIn("tmp_pkg.uses_uses_helpers", sys.modules)
+            self.assertIn("tmp_pkg", sys.modules)
+            self.assertIn("tmp_pkg.other", sys.modules)
+
+            # The package doesn't hand out the old module.
+            self.assertFalse(hasattr(sys.modules["tmp_pkg"], "helpers"))
+
+    @patch("streamlit.watcher.LocalSourcesWatcher.FileWatcher")
+    def test_unload_once_for_all_sessions(self, fob, _):
+        """Stale modules are found and unloaded once per change, however
+        many sessions watch the file, before the sessions are told."""
+        with _TempPackage() as package:
+            callback1 = MagicMock()
+            callback2 = MagicMock()
+            lso1 = LocalSourcesWatcher.LocalSourcesWatcher(package.report, callback1)
+            lso2 = LocalSourcesWatcher.LocalSourcesWatcher(package.report, callback2)
+            lso1.update_watched_modules()
+            lso2.update_watched_modules()
+
+            def assert_unloaded():
+                self.assertNotIn("tmp_pkg.helpers", sys.modules)
+
+            callback1.side_effect = assert_unloaded
+            with patch(
+                "streamlit.watcher.LocalSourcesWatcher._get_modules_to_unload",
+                wraps=LocalSourcesWatcher._get_modules_to_unload,
+            ) as get_modules_to_unload:
+                _simulate_file_change(package.get_path("helpers.py"))
+
+            get_modules_to_unload.assert_called_once()
+            callback1.assert_called_once()
+            callback2.assert_called_once()
+
+    @patch("streamlit.watcher.LocalSourcesWatcher.FileWatcher")
+    def test_worker_modules(self, fob, _):
+        """Modules that script worker processes loaded are watched, and the
+        ones that a change makes stale are recorded for the workers to
+        unload."""
+        with _TempPackage() as package:
+            registry = LocalSourcesWatcher.source_watch_registry
+            worker_modules = []
+            for name in package.module_names:
+                module = sys.modules.pop(name)
+                worker_modules.append(
+                    (name, os.path.abspath(module.__file__), module.__spec__.parent)
+                )
+            registry.add_worker_modules(worker_modules)
+
+            lso = LocalSourcesWatcher.LocalSourcesWatcher(package.report, NOOP_CALLBACK)
+            lso.update_watched_modules()
+            self.assertIn(package.get_path("helpers.py"), lso._watched_modules)
+
+            _simulate_file_change(package.get_path("helpers.py"))
+
+            generation, names = registry.get_worker_modules_to_unload(0)
+            self.assertEqual(
+                [
+                    "tmp_pkg.helpers",
+                    "tmp_pkg.uses_helpers",
+                    "tmp_pkg.uses_uses_helpers",
+                ],
+                sorted(names),
+            )
+            self.assertEqual(
+                (generation, []), registry.get_worker_modules_to_unload(generation)
+            )
+            self.assertNotIn("tmp_pkg.helpers", registry.get_modules())
+            self.assertIn("tmp_pkg.other", registry.get_modules())
+
+    @patch("streamlit.watcher.LocalSourcesWatcher.FileWatcher")
+    def test_script_change_unloads_nothing(self, fob, _):
+        """When the script changes, no modules are unloaded."""
+        with _TempPackage() as package:
+            lso = LocalSourcesWatcher.LocalSourcesWatcher(package.report, NOOP_CALLBACK)
+            lso.update_watched_modules()
+
+            _simulate_file_change(package.report.script_path)
+
+            for name in package.module_names:
+                self.assertIn(name, sys.modules)
+
     @patch("streamlit.watcher.LocalSourcesWatcher.FileWatcher")
     def test_config_blacklist(self, fob, _):
         """Test server.folderWatchBlacklist"""
@@ -249,5 +423,53 @@ class LocalSourcesWatcherTest(unittest.TestCase):
             )
 
 
+class _TempPackage(object):
+    """A context that creates a package in a temporary folder, next to a
+    script, and imports all of its modules."""
+
+    FILES = {
+        "__init__.py": "",
+        "helpers.py": "CONSTANT = 1",
+        "uses_helpers.py": "from tmp_pkg.helpers import CONSTANT",
+        "uses_uses_helpers.py": "from . import uses_helpers",
+        "other.py": "import os",
+    }
+
+    def __enter__(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        os.mkdir(self.get_path())
+        for name, body in self.FILES.items():
+            with open(self.get_path(name), "w") as f:
+                f.write(textwrap.dedent(body))
+
+        script_path = os.path.join(self._tmpdir.name, "script.py")
+        with open(script_path, "w") as f:
+            f.write("import tmp_pkg.uses_uses_helpers")
+        self.report = Report(script_path, "test command line")
+
+        sys.path.insert(0, self._tmpdir.name)
+        self.module_names = ["tmp_pkg"] + [
+            "tmp_pkg." + name[:-3] for name in self.FILES if name != "__init__.py"
+        ]
+        for name in self.module_names:
+            importlib.import_module(name)
+        return self
+
+    def __exit__(self, *args):
+        sys.path.remove(self._tmpdir.name)
+        for name in self.module_names:
+            sys.modules.pop(name, None)
+        self._tmpdir.cleanup()
+
+    def get_path(self, *filename):
+        return os.path.abspath(os.path.join(self._tmpdir.name, "tmp_pkg", *filename))
+
+
+def _simulate_file_change(filepath):
+    """Tell the source_watch_registry that a file changed, like its
+    FileWatcher would."""
+    LocalSourcesWatcher.source_watch_registry._on_file_changed(filepath)
+
+
 def sort_args_list(args_list):
     return sorted(args_list, key=lambda args: args[0])
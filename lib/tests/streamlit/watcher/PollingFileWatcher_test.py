@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import mock
+import os
+import tempfile
 import time
 import unittest
 
@@ -186,8 +188,57 @@ class PollingFileWatcherTest(unittest.TestCase):
         self.assertEqual(cb2.call_count, 2)
 
 
+class PollingFileWatcherScanTest(unittest.TestCase):
+    """Test PollingFileWatcher with real files."""
+
+    def test_scan_folder(self):
+        """Folders with many watched files are scanned in one go, and only
+        the changed file's watcher is called."""
+        with tempfile.TemporaryDirectory() as folder:
+            callbacks = []
+            watchers = []
+            for i in range(PollingFileWatcher._MIN_FILES_TO_SCAN_FOLDER):
+                file_path = os.path.join(folder, "file%d.py" % i)
+                with open(file_path, "w") as f:
+                    f.write("x = 1")
+                callbacks.append(mock.Mock())
+                watchers.append(
+                    PollingFileWatcher.PollingFileWatcher(file_path, callbacks[i])
+                )
+
+            try:
+                changed_path = os.path.join(folder, "file1.py")
+                with open(changed_path, "w") as f:
+                    f.write("x = 12")
+
+                for _ in range(1000):
+                    if callbacks[1].called:
+                        break
+                    time.sleep(PollingFileWatcher._POLLING_PERIOD_SECS)
+
+                callbacks[1].assert_called_once_with(changed_path)
+                for i in (0, 2, 3):
+                    callbacks[i].assert_not_called()
+            finally:
+                for watcher in watchers:
+                    watcher.close()
+
+    def test_polling_period(self):
+        """The polling period grows with the number of watched files, up to
+        a limit."""
+        self.assertLess(
+            PollingFileWatcher._get_polling_period(1),
+            PollingFileWatcher._get_polling_period(1000),
+        )
+        self.assertEqual(
+            PollingFileWatcher._MAX_POLLING_PERIOD_SECS,
+            PollingFileWatcher._get_polling_period(10 ** 9),
+        )
+
+
 class FakeStat(object):
     """Emulates the output of os.stat()."""
 
-    def __init__(self, mtime):
+    def __init__(self, mtime, size=0):
         self.st_mtime = mtime
+        self.st_size = size
@@ -13,6 +13,8 @@
 # limitations under the License.
 
 from mock import patch, mock_open
+import os
+import tempfile
 import unittest
 
 from streamlit.watcher import util
@@ -31,3 +33,23 @@ class UtilTest(unittest.TestCase):
         with patch("streamlit.watcher.util.open", mock_open(read_data=b"hello")) as m:
             md5 = util.calc_md5_with_blocking_retries("foo")
             m.assert_called_once_with("foo", "rb")
+
+    def test_get_imported_module_names(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+            f.write(
+                "import a.b\n"
+                "from c import d\n"
+                "from . import e\n"
+                "from ..f import *\n"
+                "def g():\n"
+                "    import h\n"
+            )
+        try:
+            names = util.get_imported_module_names(f.name, "pkg.sub")
+        finally:
+            os.remove(f.name)
+
+        self.assertEqual(
+            {"a", "a.b", "c", "c.d", "pkg", "pkg.sub", "pkg.sub.e", "pkg.f", "h"},
+            names,
+        )
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# Copyright 2018-2020 Streamlit Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the ways a ScriptRunner can stop a running script:
+
+- "none": neither runner.installTracer nor runner.asyncInterrupts. The script
+  only stops when it next enqueues a delta.
+- "tracer": runner.installTracer. A tracer checks for requests on every line.
+- "async": runner.asyncInterrupts. An exception is raised in the script
+  thread when a request comes in.
+
+For each, it measures how long a script with a tight Python loop takes to
+run, and how long it takes to stop a script that loops forever without
+enqueueing deltas.
+"""
+
+import collections
+import os
+import tempfile
+import textwrap
+import threading
+import time
+
+import click
+
+from streamlit import config
+from streamlit.Report import Report
+from streamlit.ScriptRequestQueue import RerunData
+from streamlit.ScriptRequestQueue import ScriptRequest
+from streamlit.ScriptRequestQueue import ScriptRequestQueue
+from streamlit.ScriptRunner import ScriptRunner
+from streamlit.ScriptRunner import ScriptRunnerEvent
+from streamlit.proto.Widget_pb2 import WidgetStates
+
+# "none" goes last, because its infinite loop never stops.
+MODES = collections.OrderedDict(
+    [
+        ("tracer", {"runner.installTracer": True, "runner.asyncInterrupts": False}),
+        ("async", {"runner.installTracer": False, "runner.asyncInterrupts": True}),
+        ("none", {"runner.installTracer": False, "runner.asyncInterrupts": False}),
+    ]
+)
+
+LOOP_SCRIPT = """
+total = 0
+for i in range({iterations}):
+    total += i * i
+"""
+
+INFINITE_LOOP_SCRIPT = """
+while True:
+    pass
+"""
+
+# How long to wait for a script to stop before giving up.
+STOP_TIMEOUT = 5
+
+
+class _BenchmarkRunner(object):
+    """Runs a script on a ScriptRunner, and records when its runs start and
+    stop."""
+
+    def __init__(self, script_path):
+        self._request_queue = ScriptRequestQueue()
+        self._started = threading.Event()
+        self._stopped = threading.Event()
+        self.stopped_at = None
+
+        self._scriptrunner = ScriptRunner(
+            session_id="benchmark",
+            report=Report(script_path, "benchmark"),
+            enqueue_forward_msg=self._enqueue,
+            widget_states=WidgetStates(),
+            request_queue=self._request_queue,
+        )
+        self._scriptrunner.on_event.connect(self._on_event, weak=False)
+
+    def _enqueue(self, msg):
+        if not config.get_option("runner.installTracer"):
+            self._scriptrunner.maybe_handle_execution_control_request()
+
+    def _on_event(self, event, **kwargs):
+        if event == ScriptRunnerEvent.SCRIPT_STARTED:
+            self._started.set()
+        elif event == ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS:
+            self.stopped_at = time.perf_counter()
+            self._stopped.set()
+
+    def _enqueue_request(self, request, data=None):
+        self._request_queue.enqueue(request, data)
+        self._scriptrunner.on_request_enqueued()
+
+    def run(self):
+        """Run the script to completion, and return how long it took."""
+        self._enqueue_request(ScriptRequest.RERUN, RerunData(widget_state=None))
+        start_time = time.perf_counter()
+        self._scriptrunner.start()
+        self._stopped.wait()
+        return self.stopped_at - start_time
+
+    def run_and_stop(self, stop_after):
+        """Start the script, ask it to stop after the given number of
+        seconds, and return how long it took to stop, or None if it didn't
+        stop within STOP_TIMEOUT."""
+        self._enqueue_request(ScriptRequest.RERUN, RerunData(widget_state=None))
+        self._scriptrunner.start()
+        self._started.wait()
+        time.sleep(stop_after)
+
+        stop_time = time.perf_counter()
+        self._enqueue_request(ScriptRequest.STOP)
+        if not self._stopped.wait(STOP_TIMEOUT):
+            # The script keeps looping on its (daemon) thread.
+            return None
+        return self.stopped_at - stop_time
+
+
+def _write_script(directory, name, body):
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write(textwrap.dedent(body))
+    return path
+
+
+def _set_mode(mode):
+    for key, value in MODES[mode].items():
+        config._set_option(key, value, "benchmark")
+
+
+@click.command()
+@click.option(
+    "--iterations",
+    default=2000000,
+    help="Number of iterations of the tight loop script.",
+)
+@click.option("--repeat", default=3, help="Number of runs per measurement.")
+@click.option(
+    "--stop-after",
+    default=0.2,
+    help="Seconds to let the infinite loop run before stopping it.",
+)
+def main(iterations, repeat, stop_after):
+    config._set_option("runner.magicEnabled", False, "benchmark")
+
+    with tempfile.TemporaryDirectory() as directory:
+        loop_script = _write_script(
+            directory, "loop.py", LOOP_SCRIPT.format(iterations=iterations)
+        )
+        infinite_loop_script = _write_script(
+            directory, "infinite_loop.py", INFINITE_LOOP_SCRIPT
+        )
+
+        click.echo("%-8s %16s %16s" % ("mode", "loop time (s)", "stop latency (ms)"))
+        for mode in MODES:
+            _set_mode(mode)
+
+            loop_time = min(_BenchmarkRunner(loop_script).run() for _ in range(repeat))
+
+            latencies = [
+                _BenchmarkRunner(infinite_loop_script).run_and_stop(stop_after)
+                for _ in range(repeat)
+            ]
+            if None in latencies:
+                latency = "never"
+            else:
+                latency = "%.2f" % (max(latencies) * 1000)
+
+            click.echo("%-8s %16.3f %16s" % (mode, loop_time, latency))
+
+
+if __name__ == "__main__":
+    main()